@@ -0,0 +1,158 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+# Gerador de dados falsos com a mesma cara dos dados reais da Pacto e da planilha de marketing.
+# Tudo sai de um random.Random(semente), então a mesma escala e semente geram sempre os mesmos dados.
+
+PRIMEIROS_NOMES = [
+    "ANA", "MARIA", "JOAO", "JOSE", "PEDRO", "PAULO", "LUCAS", "GABRIEL", "RAFAEL", "MATEUS",
+    "JULIANA", "FERNANDA", "PATRICIA", "ALINE", "CAMILA", "AMANDA", "BRUNA", "LETICIA", "LARISSA",
+    "BEATRIZ", "MARCOS", "CARLOS", "EDUARDO", "FELIPE", "GUSTAVO", "RODRIGO", "THIAGO", "BRUNO",
+    "DANIEL", "DIEGO", "VINICIUS", "LEONARDO", "GUILHERME", "ANDRE", "RICARDO", "FABIO", "MARCIA",
+    "SANDRA", "SIMONE", "VANESSA", "CRISTIANE", "ADRIANA", "LUCIANA", "RENATA", "TATIANE",
+    "JESSICA", "NATALIA", "MARIANA", "CAROLINA", "ISABELA", "LAURA", "HELENA", "ANTONIO",
+    "FRANCISCO", "RAIMUNDO", "SEBASTIAO", "MANOEL", "LUIZ", "OTAVIO", "HEITOR", "ENZO",
+]
+SOBRENOMES = [
+    "SILVA", "SANTOS", "OLIVEIRA", "SOUZA", "RODRIGUES", "FERREIRA", "ALVES", "PEREIRA", "LIMA",
+    "GOMES", "COSTA", "RIBEIRO", "MARTINS", "CARVALHO", "ALMEIDA", "LOPES", "SOARES", "FERNANDES",
+    "VIEIRA", "BARBOSA", "ROCHA", "DIAS", "NASCIMENTO", "ANDRADE", "MOREIRA", "NUNES", "MARQUES",
+    "MACHADO", "MENDES", "FREITAS", "CARDOSO", "RAMOS", "GONCALVES", "SANTANA", "TEIXEIRA",
+    "ARAUJO", "PINTO", "CORREIA", "MONTEIRO", "MOURA", "CAVALCANTI", "CAMPOS", "BATISTA",
+    "MIRANDA", "DUARTE", "MEDEIROS", "XAVIER", "BORGES", "AZEVEDO", "PIRES", "REIS", "TAVARES",
+]
+PARTICULAS = ["DA", "DE", "DOS", "DAS", "DO"]
+
+EVENTOS_FILTRADOS = ["Aula Experimental", "Primeiro Treino sem A.E", "Primeiro Treino com A.E"]
+OUTROS_EVENTOS = ["Avaliação Física", "Reavaliação", "Treino Livre"]
+PLANOS = ["MENSAL", "TRIMESTRAL", "SEMESTRAL", "ANUAL", "RECORRENTE", "PLANO FAMILIA"]
+ORIGENS = ["Instagram", "Facebook", "Google", "Indicação", "Passante", "WhatsApp", "Site"]
+MESES = ["Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho", "Julho", "Agosto",
+         "Setembro", "Outubro", "Novembro", "Dezembro"]
+
+# Cabeçalho da aba "Diária", com as colunas repetidas e as que o pipeline não usa
+CABECALHO_DIARIA = [
+    "Data", "Mês", "Origem", "Origem", "Nomes agendados (Daniela Dalla)",
+    "Nomes agendados (Daniela Teixeira)", "Observações", "Total do dia", "Meta",
+]
+
+def nome_completo(rnd):
+    partes = [rnd.choice(PRIMEIROS_NOMES)]
+    if rnd.random() < 0.3:
+        partes.append(rnd.choice(PRIMEIROS_NOMES))
+    for _ in range(rnd.choice([1, 2, 2, 3])):
+        if rnd.random() < 0.25:
+            partes.append(rnd.choice(PARTICULAS))
+        partes.append(rnd.choice(SOBRENOMES))
+    return " ".join(partes)
+
+def _erro_digitacao(rnd, palavra):
+    if len(palavra) < 4:
+        return palavra
+    i = rnd.randrange(1, len(palavra) - 1)
+    tipo = rnd.random()
+    if tipo < 0.35:
+        return palavra[:i] + palavra[i + 1] + palavra[i] + palavra[i + 2:]
+    if tipo < 0.7:
+        return palavra[:i] + palavra[i + 1:]
+    return palavra[:i] + rnd.choice("AEIOU") + palavra[i + 1:]
+
+# Como o nome costuma aparecer digitado na planilha de marketing: sobrenome do meio
+# abreviado ou cortado, um erro de digitação, caixa misturada, data junto do nome
+def variacao_marketing(rnd, nome):
+    partes = nome.split()
+    if len(partes) > 2 and rnd.random() < 0.3:
+        meio = rnd.randrange(1, len(partes) - 1)
+        partes[meio] = partes[meio][0] + "." if rnd.random() < 0.5 else ""
+        partes = [p for p in partes if p]
+    if rnd.random() < 0.2:
+        i = rnd.randrange(len(partes))
+        partes[i] = _erro_digitacao(rnd, partes[i])
+    if len(partes) > 2 and rnd.random() < 0.2:
+        partes = partes[:2]
+    texto = " ".join(partes)
+    if rnd.random() < 0.3:
+        texto = texto.title()
+    if rnd.random() < 0.15:
+        texto += f" {rnd.randint(1, 28):02d}/{rnd.randint(1, 12):02d}"
+    elif rnd.random() < 0.05:
+        texto += " - remarcou"
+    return texto
+
+# Dados de uma escala: 'escala' agendamentos, escala/2 contratos, escala/10 linhas na "Diária"
+class DadosSinteticos:
+
+    def __init__(self, escala, semente=42):
+        rnd = random.Random(semente)
+        self.escala = escala
+        agora = datetime(2026, 3, 15, 12, 0, 0)
+
+        total_pessoas = max(10, escala)
+        self.pessoas = [nome_completo(rnd) for _ in range(total_pessoas)]
+
+        # Agendamentos (só uma parte é dos eventos filtrados, como na API real)
+        self.agendamentos = []
+        for i in range(escala):
+            pessoa = rnd.randrange(total_pessoas)
+            inicio = agora - timedelta(minutes=rnd.randrange(0, 90 * 24 * 60))
+            self.agendamentos.append({
+                "id": i + 1,
+                "matricula": 100000 + pessoa,
+                "nomeAluno": self.pessoas[pessoa],
+                "evento": rnd.choice(EVENTOS_FILTRADOS) if rnd.random() < 0.7 else rnd.choice(OUTROS_EVENTOS),
+                "inicio": inicio.strftime("%Y-%m-%dT%H:%M:%S"),
+                "professor": {"id": 1, "nome": "PROFESSOR"},
+                "situacao": "EXECUTADO",
+            })
+
+        # Contratos ativos: metade das pessoas comprou
+        compradores = rnd.sample(range(total_pessoas), max(1, escala // 2))
+        self.contratos = []
+        self.horarios = {}
+        for pessoa in compradores:
+            data = agora - timedelta(days=rnd.randrange(0, 120), minutes=rnd.randrange(6 * 60, 23 * 60))
+            matricula = 100000 + pessoa
+            self.contratos.append({
+                "id": pessoa,
+                "nome": self.pessoas[pessoa],
+                "matriculaZW": matricula,
+                "dataMatriculaZW": int(data.timestamp() * 1000),
+                "planoZW": {"nome": rnd.choice(PLANOS)},
+                "situacao": "AT",
+            })
+            if rnd.random() < 0.9:
+                utc = (data + timedelta(hours=3)).replace(tzinfo=timezone.utc)
+                self.horarios[matricula] = utc.strftime("%Y-%m-%dT%H:%M:%SZ")
+        self.contratos.sort(key=lambda c: -c["id"])
+
+        # Aba "Diária": uma linha por dia/origem, com 0 a 3 nomes por vendedora
+        self.diaria = [list(CABECALHO_DIARIA)]
+        for _ in range(max(1, escala // 10)):
+            dia = agora - timedelta(days=rnd.randrange(0, 365))
+            celulas = []
+            for _ in range(2):
+                nomes = []
+                for _ in range(rnd.choice([0, 1, 1, 2, 3])):
+                    pessoa = rnd.randrange(total_pessoas)
+                    nomes.append(variacao_marketing(rnd, self.pessoas[pessoa]))
+                celulas.append("\n".join(nomes))
+            self.diaria.append([
+                dia.strftime("%d/%m/%Y"), MESES[dia.month - 1], rnd.choice(ORIGENS), rnd.choice(ORIGENS),
+                celulas[0], celulas[1], "", str(rnd.randint(0, 20)), "15",
+            ])
+
+        # Agendamentos de quem faltou (um terço da escala), com outro Random para não mudar os dados acima
+        rnd_faltas = random.Random(semente + 1)
+        self.faltaram = []
+        for i in range(escala // 3):
+            pessoa = rnd_faltas.randrange(total_pessoas)
+            inicio = agora - timedelta(minutes=rnd_faltas.randrange(0, 90 * 24 * 60))
+            self.faltaram.append({
+                "id": escala + i + 1,
+                "matricula": 100000 + pessoa,
+                "nomeAluno": self.pessoas[pessoa],
+                "evento": rnd_faltas.choice(EVENTOS_FILTRADOS) if rnd_faltas.random() < 0.7 else rnd_faltas.choice(OUTROS_EVENTOS),
+                "inicio": inicio.strftime("%Y-%m-%dT%H:%M:%S"),
+                "professor": {"id": 1, "nome": "PROFESSOR"},
+                "situacao": "FALTOU",
+            })
@@ -0,0 +1,254 @@
+import argparse
+import io
+import json
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from pathlib import Path
+
+import pandas as pd
+
+from data__pipeline import config
+from data__pipeline import extract
+from data__pipeline import transform
+from data__pipeline import load
+from data__pipeline import metricas
+from data__pipeline import pacto
+from data__pipeline.estado import HistoricoAgendamentos, HistoricoLeads
+from data__pipeline.armazem import ArmazemSQLite
+from data__pipeline.sheets import SessaoGoogleSheets
+
+from .dados_sinteticos import DadosSinteticos
+from .servidor_pacto import ServidorPacto
+from .planilha_falsa import ClienteFalso
+
+# Benchmark do pipeline com dados sintéticos, sem rede: a Pacto é o servidor_pacto (HTTP local
+# com latência fixa) e o Google Sheets é a planilha_falsa (em memória). Mede cada etapa de
+# extract, transform e load em várias escalas e mostra uma tabela etapa x escala.
+# Com --saida o resultado vai para um JSON; com --base, compara com um JSON anterior.
+#
+#   python -m benchmarks.executar --escalas 1000 10000 --saida antes.json
+#   python -m benchmarks.executar --escalas 1000 10000 --base antes.json
+
+CHAVE_BANCO = "banco-benchmark"
+CHAVE_MKT = "mkt-benchmark"
+
+ETAPAS = [
+    "extract.agendamentos",
+    "extract.agendamentos_incremental",
+    "extract.agendamentos_com_faltas",
+    "extract.contratos",
+    "extract.leads",
+    "extract.leads_incremental",
+    "extract.horarios",
+    "transform.agendamentos",
+    "transform.leads",
+    "transform.vendas",
+    "transform.consolidar",
+    "load.completo",
+    "load.delta",
+    "load.clone",
+    "load.armazem_completo",
+    "load.armazem_delta",
+]
+
+class Medidor:
+
+    def __init__(self, servidor, cliente, memoria=False):
+        self.servidor = servidor
+        self.cliente = cliente
+        self.memoria = memoria
+        self.resultados = {}
+
+    # Roda funcao() sem o print do pipeline e guarda tempo, chamadas à Pacto e ao Sheets
+    # (e o pico de memória, com --memoria)
+    def medir(self, nome, funcao):
+        http, sheets = self.servidor.requisicoes, self.cliente.chamadas
+        if self.memoria:
+            tracemalloc.start()
+        inicio = time.perf_counter()
+        try:
+            with redirect_stdout(io.StringIO()):
+                retorno = funcao()
+        finally:
+            duracao = time.perf_counter() - inicio
+            pico = tracemalloc.get_traced_memory()[1] if self.memoria else None
+            if self.memoria:
+                tracemalloc.stop()
+        self.resultados[nome] = {
+            'segundos': round(duracao, 4),
+            'http': self.servidor.requisicoes - http,
+            'sheets': self.cliente.chamadas - sheets,
+            'linhas': len(retorno) if hasattr(retorno, '__len__') else None,
+        }
+        if pico is not None:
+            self.resultados[nome]['pico_mb'] = round(pico / 1024 / 1024, 2)
+        return retorno
+
+# 1% das linhas com a hora mudada e 1% de linhas novas, para o modo delta do load
+def _alterar_um_por_cento(df):
+    df = df.copy()
+    quantidade = max(1, len(df) // 100)
+    alteradas = df.index[:quantidade]
+    df.loc[alteradas, 'HORA'] = df.loc[alteradas, 'HORA'].dt.normalize() + pd.Timedelta(hours=23, minutes=59)
+    novas = df.iloc[:quantidade].copy()
+    novas['MATRICULA'] = [f"9{m}" for m in novas['MATRICULA']]
+    return pd.concat([df, novas], ignore_index=True)
+
+def rodar_escala(escala, latencia, latencia_sheets, memoria=False, taxa_pacto=0, limite_pacto=0):
+    dados = DadosSinteticos(escala)
+    cliente = ClienteFalso(latencia=latencia_sheets)
+    cliente.criar_planilha(CHAVE_BANCO)
+    cliente.criar_planilha(CHAVE_MKT).criar_aba("Diária", dados.diaria)
+
+    config.TP_ACADEMIA_DB_ID = CHAVE_BANCO
+    config.GOOGLE_SHEETS_MKT = CHAVE_MKT
+    config.PACTO_TAXA_MAXIMA = taxa_pacto
+    metricas.reiniciar()
+    # O cliente compartilhado da Pacto é recriado com a taxa desta execução
+    pacto.fechar()
+
+    with ServidorPacto(dados, latencia=latencia, limite_por_segundo=limite_pacto) as servidor, tempfile.TemporaryDirectory() as pasta:
+        config.URL_BASE = servidor.url
+        medidor = Medidor(servidor, cliente, memoria)
+        sessao = SessaoGoogleSheets(cliente=cliente)
+
+        # Extract
+        agendamentos = medidor.medir("extract.agendamentos", extract.getAgendamentosFiltrados)
+        historico = HistoricoAgendamentos(caminho=Path(pasta) / "estado.sqlite3")
+        historico.registrar(agendamentos, substituir=True)
+        medidor.medir("extract.agendamentos_incremental", lambda: extract.getAgendamentosFiltrados(historico))
+        historico.fechar()
+
+        # Executados e faltaram paginados ao mesmo tempo (config.AGENDAMENTOS_INCLUIR_FALTAS)
+        def agendamentos_com_faltas():
+            incluir_faltas = config.AGENDAMENTOS_INCLUIR_FALTAS
+            config.AGENDAMENTOS_INCLUIR_FALTAS = True
+            try:
+                return extract.getAgendamentosFiltrados()
+            finally:
+                config.AGENDAMENTOS_INCLUIR_FALTAS = incluir_faltas
+        medidor.medir("extract.agendamentos_com_faltas", agendamentos_com_faltas)
+
+        contratos = medidor.medir("extract.contratos", extract.get_todos_contratos_ativos)
+        leads = medidor.medir("extract.leads", lambda: extract.get_leads(sessao, colunas=transform.COLUNAS_LEADS))
+        historico_leads = HistoricoLeads(caminho=Path(pasta) / "estado.sqlite3")
+        with redirect_stdout(io.StringIO()):
+            extract.get_leads(sessao, colunas=transform.COLUNAS_LEADS, historico=historico_leads)
+        medidor.medir("extract.leads_incremental", lambda: extract.get_leads(
+            sessao, colunas=transform.COLUNAS_LEADS, historico=historico_leads))
+        historico_leads.fechar()
+
+        # Transform, com os horários respondidos da memória (a busca na Pacto é medida à parte)
+        pedidas = []
+        def busca_horas(matriculas):
+            pedidas.extend(matriculas)
+            return {m: dados.horarios.get(int(m)) for m in matriculas}
+
+        df_filtrado = medidor.medir("transform.agendamentos", lambda: transform.getAgendamentosLimpos(agendamentos))
+        df_mkt = medidor.medir("transform.leads", lambda: transform.process_leads_marketing(leads))
+        df_vendas = medidor.medir("transform.vendas", lambda: transform.validar_vendas_com_lista(df_mkt, contratos, busca_horas=busca_horas))
+        df_final = medidor.medir("transform.consolidar", lambda: transform.consolidar_dados(df_filtrado, df_vendas, contratos, busca_horas=busca_horas))
+
+        medidor.medir("extract.horarios", lambda: extract.get_horarios_matriculas(pedidas, usar_cache=False))
+
+        # Load: abas vazias (regravação completa), depois só 1% alterado (delta) e o clone do marketing
+        def carga_completa():
+            for df, aba in [(df_filtrado, "HISTORICO"), (df_vendas, "VENDAS_MKT"), (df_final, "RELATORIO_FINAL")]:
+                load.save_in_database(df, nome_da_aba=aba, sessao=sessao)
+            return sessao.enviar()
+        medidor.medir("load.completo", carga_completa)
+
+        df_alterado = _alterar_um_por_cento(df_filtrado)
+        def carga_delta():
+            load.save_in_database(df_alterado, nome_da_aba="HISTORICO", sessao=sessao)
+            return sessao.enviar()
+        medidor.medir("load.delta", carga_delta)
+
+        def clone():
+            load.clone_in_database(CHAVE_MKT, "Diária", sessao=sessao)
+            return sessao.enviar()
+        medidor.medir("load.clone", clone)
+
+        # Mesmas cargas pelo armazém local (LOAD_BACKEND=sqlite), exportando para as abas
+        destino = load.DestinoArmazem(ArmazemSQLite(Path(pasta) / "armazem.sqlite3"), sessao)
+        def armazem_completo():
+            for df, aba in [(df_filtrado, "HISTORICO"), (df_vendas, "VENDAS_MKT"), (df_final, "RELATORIO_FINAL")]:
+                destino.gravar(df, aba)
+            return destino.finalizar()
+        medidor.medir("load.armazem_completo", armazem_completo)
+        medidor.medir("load.armazem_delta", lambda: destino.gravar(df_alterado, "HISTORICO") and destino.finalizar())
+        destino.fechar()
+
+    return medidor.resultados
+
+def _tabela(resultados, campo, formato, base=None):
+    escalas = list(resultados)
+    linhas = [["etapa"] + [f"{int(e):,}".replace(",", ".") for e in escalas]]
+    for etapa in ETAPAS:
+        linha = [etapa]
+        for escala in escalas:
+            medida = resultados[escala].get(etapa, {}).get(campo)
+            texto = "-" if medida is None else formato(medida)
+            anterior = ((base or {}).get(escala) or {}).get(etapa, {}).get(campo)
+            if medida is not None and anterior:
+                texto += f" ({(medida - anterior) / anterior:+.0%})"
+            linha.append(texto)
+        linhas.append(linha)
+    larguras = [max(len(l[i]) for l in linhas) for i in range(len(linhas[0]))]
+    return "\n".join(
+        "  ".join(celula.ljust(larguras[i]) if i == 0 else celula.rjust(larguras[i]) for i, celula in enumerate(linha))
+        for linha in linhas
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline com dados sintéticos")
+    parser.add_argument("--escalas", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="quantidade de agendamentos de cada escala (contratos = metade, linhas da 'Diária' = 1/10)")
+    parser.add_argument("--latencia-ms", type=float, default=20,
+                        help="latência de cada requisição ao servidor falso da Pacto")
+    parser.add_argument("--latencia-sheets-ms", type=float, default=50,
+                        help="latência de cada chamada à planilha falsa do Google")
+    parser.add_argument("--taxa-pacto", type=float, default=0,
+                        help="limite de requisições por segundo do cliente da Pacto (0 = sem limite)")
+    parser.add_argument("--limite-pacto", type=int, default=0,
+                        help="requisições por segundo aceitas pelo servidor falso antes de responder 429 (0 = sem limite)")
+    parser.add_argument("--memoria", action="store_true",
+                        help="mede o pico de memória de cada etapa (tracemalloc, deixa tudo mais lento)")
+    parser.add_argument("--saida", help="grava o resultado em JSON")
+    parser.add_argument("--base", help="JSON de uma execução anterior para comparar")
+    args = parser.parse_args()
+
+    base = None
+    if args.base:
+        with open(args.base, encoding="utf-8") as arquivo:
+            base = json.load(arquivo)['escalas']
+
+    resultados = {}
+    for escala in args.escalas:
+        print(f"Escala {escala}...")
+        resultados[str(escala)] = rodar_escala(escala, args.latencia_ms / 1000, args.latencia_sheets_ms / 1000,
+                                               args.memoria, args.taxa_pacto, args.limite_pacto)
+
+    print("\nTempo (s)" + (" e variação em relação à base" if base else ""))
+    print(_tabela(resultados, 'segundos', lambda s: f"{s:.2f}", base))
+    print("\nRequisições à Pacto")
+    print(_tabela(resultados, 'http', str))
+    print("\nChamadas ao Google Sheets")
+    print(_tabela(resultados, 'sheets', str))
+    if args.memoria:
+        print("\nPico de memória (MB)")
+        print(_tabela(resultados, 'pico_mb', lambda m: f"{m:.1f}", base))
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            json.dump({
+                'latencia_ms': args.latencia_ms,
+                'latencia_sheets_ms': args.latencia_sheets_ms,
+                'escalas': resultados,
+            }, arquivo, indent=2)
+        print(f"\nResultado gravado em {args.saida}")
+
+if __name__ == "__main__":
+    main()
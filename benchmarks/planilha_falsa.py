@@ -0,0 +1,227 @@
+import threading
+import time
+
+import gspread
+from gspread.utils import a1_range_to_grid_range
+
+# Google Sheets em memória, com a mesma interface do gspread nas partes que o pipeline usa
+# (sheets.SessaoGoogleSheets, extract.get_leads e load). Cada chamada "à API" conta em
+# 'chamadas' e espera a 'latencia', para comparar quantas idas ao Google cada etapa faz.
+# Como a API de verdade, recusa escrever fora do tamanho (linhas x colunas) da aba.
+
+class ErroPlanilhaFalsa(gspread.exceptions.GSpreadException):
+    pass
+
+def _separar_intervalo(intervalo):
+    if "!" not in intervalo:
+        return None, intervalo
+    titulo, celulas = intervalo.rsplit("!", 1)
+    if titulo.startswith("'") and titulo.endswith("'"):
+        titulo = titulo[1:-1].replace("''", "'")
+    return titulo, celulas
+
+
+class AbaFalsa:
+
+    def __init__(self, planilha, id, title, rows, cols):
+        self.planilha = planilha
+        self.id = id
+        self.title = title
+        self.row_count = rows
+        self.col_count = cols
+        self.celulas = []
+
+    def _api(self):
+        self.planilha.cliente._api()
+
+    # Linhas preenchidas, sem as linhas vazias do fim
+    def _linhas_usadas(self):
+        total = len(self.celulas)
+        while total and not any(self.celulas[total - 1]):
+            total -= 1
+        return total
+
+    def escrever(self, linha, coluna, valores):
+        if not valores:
+            return
+        largura = max(len(v) for v in valores)
+        if linha + len(valores) > self.row_count or coluna + largura > self.col_count:
+            raise ErroPlanilhaFalsa(
+                f"Range ({self.title}!{linha + 1}:{linha + len(valores)}) exceeds grid limits. "
+                f"Max rows: {self.row_count}, max columns: {self.col_count}"
+            )
+        while len(self.celulas) < linha + len(valores):
+            self.celulas.append([])
+        for i, valores_linha in enumerate(valores):
+            atual = self.celulas[linha + i]
+            if len(atual) < coluna + len(valores_linha):
+                atual.extend([''] * (coluna + len(valores_linha) - len(atual)))
+            atual[coluna:coluna + len(valores_linha)] = ['' if v is None else str(v) for v in valores_linha]
+
+    def limpar(self):
+        self.celulas = []
+
+    def anexar(self, linhas):
+        inicio = self._linhas_usadas()
+        if inicio + len(linhas) > self.row_count:
+            self.row_count = inicio + len(linhas)
+        self.escrever(inicio, 0, linhas)
+
+    def row_values(self, linha):
+        self._api()
+        if linha > len(self.celulas):
+            return []
+        valores = list(self.celulas[linha - 1])
+        while valores and valores[-1] == '':
+            valores.pop()
+        return valores
+
+    def get_all_values(self):
+        self._api()
+        linhas = [list(l) for l in self.celulas[:self._linhas_usadas()]]
+        largura = max((len(l) for l in linhas), default=0)
+        return [l + [''] * (largura - len(l)) for l in linhas]
+
+    def _ler(self, intervalo):
+        grade = a1_range_to_grid_range(_separar_intervalo(intervalo)[1])
+        linha_inicial = grade.get('startRowIndex', 0)
+        linha_final = grade.get('endRowIndex', self._linhas_usadas())
+        coluna_inicial = grade.get('startColumnIndex', 0)
+        coluna_final = grade.get('endColumnIndex', self.col_count)
+        linhas = []
+        for linha in self.celulas[linha_inicial:linha_final]:
+            valores = list(linha[coluna_inicial:coluna_final])
+            while valores and valores[-1] == '':
+                valores.pop()
+            linhas.append(valores)
+        while linhas and not linhas[-1]:
+            linhas.pop()
+        return linhas
+
+    def batch_get(self, intervalos, **kwargs):
+        self._api()
+        return [self._ler(intervalo) for intervalo in intervalos]
+
+    def copy_to(self, chave_destino):
+        self._api()
+        destino = self.planilha.cliente.planilhas[chave_destino]
+        copia = destino._nova_aba(f"Cópia de {self.title}", self.row_count, self.col_count)
+        copia.celulas = [list(linha) for linha in self.celulas]
+        return {
+            'sheetId': copia.id,
+            'title': copia.title,
+            'gridProperties': {'rowCount': copia.row_count, 'columnCount': copia.col_count},
+        }
+
+
+class PlanilhaFalsa:
+
+    def __init__(self, cliente, chave):
+        self.cliente = cliente
+        self.id = chave
+        self.abas = {}
+
+    def _nova_aba(self, titulo, linhas, colunas):
+        aba = AbaFalsa(self, self.cliente._proximo_id(), titulo, linhas, colunas)
+        self.abas[titulo] = aba
+        return aba
+
+    def _por_id(self, id):
+        for aba in self.abas.values():
+            if aba.id == id:
+                return aba
+        raise ErroPlanilhaFalsa(f"No grid with id: {id}")
+
+    # Aba já preenchida, para montar o cenário antes do benchmark (não conta como chamada)
+    def criar_aba(self, titulo, valores, colunas=None):
+        colunas = colunas or max((len(l) for l in valores), default=1)
+        aba = self._nova_aba(titulo, max(len(valores), 1), colunas)
+        aba.escrever(0, 0, valores)
+        return aba
+
+    def worksheet(self, titulo):
+        self.cliente._api()
+        if titulo not in self.abas:
+            raise gspread.WorksheetNotFound(titulo)
+        return self.abas[titulo]
+
+    def add_worksheet(self, title, rows, cols, **kwargs):
+        self.cliente._api()
+        return self._nova_aba(title, rows, cols)
+
+    def _aplicar(self, requisicao):
+        tipo, corpo = next(iter(requisicao.items()))
+        if tipo == 'updateCells':
+            self._por_id(corpo['range']['sheetId']).limpar()
+        elif tipo == 'updateSheetProperties':
+            propriedades = corpo['properties']
+            aba = self._por_id(propriedades['sheetId'])
+            grade = propriedades.get('gridProperties', {})
+            aba.row_count = grade.get('rowCount', aba.row_count)
+            aba.col_count = grade.get('columnCount', aba.col_count)
+        elif tipo == 'appendCells':
+            linhas = [[celula['userEnteredValue']['stringValue'] for celula in linha['values']] for linha in corpo['rows']]
+            self._por_id(corpo['sheetId']).anexar(linhas)
+        elif tipo == 'copyPaste':
+            # As células da planilha falsa só têm valores: PASTE_NORMAL e PASTE_VALUES dão no mesmo
+            origem = self._por_id(corpo['source']['sheetId'])
+            self._por_id(corpo['destination']['sheetId']).escrever(0, 0, [list(l) for l in origem.celulas])
+        elif tipo == 'deleteSheet':
+            aba = self._por_id(corpo['sheetId'])
+            del self.abas[aba.title]
+        else:
+            raise ErroPlanilhaFalsa(f"Requisição não suportada: {tipo}")
+
+    def batch_update(self, corpo):
+        self.cliente._api()
+        for requisicao in corpo['requests']:
+            self._aplicar(requisicao)
+        return {'replies': [{} for _ in corpo['requests']]}
+
+    def _escrever_intervalo(self, intervalo, valores):
+        titulo, celulas = _separar_intervalo(intervalo)
+        grade = a1_range_to_grid_range(celulas)
+        self.abas[titulo].escrever(grade.get('startRowIndex', 0), grade.get('startColumnIndex', 0), valores)
+
+    def values_batch_update(self, corpo):
+        self.cliente._api()
+        for dados in corpo['data']:
+            self._escrever_intervalo(dados['range'], dados['values'])
+        return {}
+
+    def values_update(self, intervalo, params=None, body=None):
+        self.cliente._api()
+        self._escrever_intervalo(intervalo, body['values'])
+        return {}
+
+
+class ClienteFalso:
+
+    def __init__(self, latencia=0.0):
+        self.latencia = latencia
+        self.planilhas = {}
+        self.chamadas = 0
+        self._ids = 0
+        self._trava = threading.Lock()
+
+    def _api(self):
+        with self._trava:
+            self.chamadas += 1
+        if self.latencia:
+            time.sleep(self.latencia)
+
+    def _proximo_id(self):
+        with self._trava:
+            self._ids += 1
+            return self._ids
+
+    # Cria a planilha vazia (não conta como chamada)
+    def criar_planilha(self, chave):
+        self.planilhas[chave] = PlanilhaFalsa(self, chave)
+        return self.planilhas[chave]
+
+    def open_by_key(self, chave):
+        self._api()
+        if chave not in self.planilhas:
+            raise gspread.SpreadsheetNotFound(chave)
+        return self.planilhas[chave]
@@ -0,0 +1,132 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Servidor HTTP local que responde como a API da Pacto, com os dados de um DadosSinteticos
+# e uma latência fixa por requisição (para simular a rede sem depender dela).
+# Com 'limite_por_segundo', responde 429 (com Retry-After) como o gateway quando passa do limite.
+# 'falhas' ({caminho: {páginas}}) faz essas páginas responderem 500, para simular o gateway instável.
+# Só os endpoints usados pelo extract.py: agendamentos executados/faltaram, alunos ativos
+# (/psec/alunos/v2) e horário de matrícula (/v1/cliente).
+class ServidorPacto:
+
+    def __init__(self, dados, latencia=0.02, porta=0, limite_por_segundo=0):
+        self.dados = dados
+        self.latencia = latencia
+        self.limite_por_segundo = limite_por_segundo
+        self.falhas = {}
+        self.requisicoes = 0
+        self.limitadas = 0
+        self._janela = (0, 0)
+        self._trava = threading.Lock()
+
+        # A API ordena pelo 'sort' pedido; as duas ordens usadas pelo pipeline ficam prontas
+        self._agendamentos = {
+            'inicio,desc': sorted(dados.agendamentos, key=lambda a: a['inicio'], reverse=True),
+            'nome,asc': sorted(dados.agendamentos, key=lambda a: a['nomeAluno']),
+        }
+        self._faltaram = {
+            'inicio,desc': sorted(dados.faltaram, key=lambda a: a['inicio'], reverse=True),
+            'nome,asc': sorted(dados.faltaram, key=lambda a: a['nomeAluno']),
+        }
+        self._clientes = {str(m): dia for m, dia in dados.horarios.items()}
+
+        servidor = self
+
+        class Tratador(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Cabeçalho e corpo saem em dois write(); sem isso o delayed ACK soma ~40ms por resposta
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                limitada = servidor._contar()
+                if servidor.latencia:
+                    time.sleep(servidor.latencia)
+                url = urlparse(self.path)
+                params = {chave: valores[0] for chave, valores in parse_qs(url.query).items()}
+                if limitada:
+                    status, corpo = 429, {'erro': 'Too Many Requests'}
+                else:
+                    status, corpo = servidor.responder(url.path, params)
+                dados = json.dumps(corpo).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                if limitada:
+                    self.send_header("Retry-After", "1")
+                self.send_header("Content-Length", str(len(dados)))
+                self.end_headers()
+                self.wfile.write(dados)
+
+            def log_message(self, formato, *args):
+                pass
+
+        self._http = ThreadingHTTPServer(("127.0.0.1", porta), Tratador)
+        self._http.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, porta = self._http.server_address[:2]
+        return f"http://{host}:{porta}"
+
+    # Conta a requisição e diz se ela passou do limite por segundo
+    def _contar(self):
+        with self._trava:
+            self.requisicoes += 1
+            if not self.limite_por_segundo:
+                return False
+            segundo = int(time.monotonic())
+            inicio, quantidade = self._janela
+            quantidade = quantidade + 1 if inicio == segundo else 1
+            self._janela = (segundo, quantidade)
+            if quantidade > self.limite_por_segundo:
+                self.limitadas += 1
+                return True
+            return False
+
+    def _pagina(self, itens, params):
+        pagina = int(params.get('page', 0))
+        tamanho = int(params.get('size', 100))
+        total_paginas = -(-len(itens) // tamanho)
+        return {
+            'content': itens[pagina * tamanho:(pagina + 1) * tamanho],
+            'totalPages': total_paginas,
+            'totalElements': len(itens),
+            'number': pagina,
+            'last': pagina + 1 >= total_paginas,
+        }
+
+    # Devolve (status, corpo) da requisição, como a Pacto responderia
+    def responder(self, caminho, params):
+        if int(params.get('page', 0)) in self.falhas.get(caminho, ()):
+            return 500, {'erro': 'Internal Server Error'}
+        if caminho == "/psec/treino-bi/agendamento-executaram":
+            ordem = self._agendamentos.get(params.get('sort', 'nome,asc'), self._agendamentos['nome,asc'])
+            return 200, self._pagina(ordem, params)
+        if caminho == "/psec/treino-bi/agendamento-faltaram":
+            ordem = self._faltaram.get(params.get('sort', 'nome,asc'), self._faltaram['nome,asc'])
+            return 200, self._pagina(ordem, params)
+        if caminho == "/psec/alunos/v2":
+            return 200, self._pagina(self.dados.contratos, params)
+        if caminho == "/v1/cliente":
+            dia = self._clientes.get(params.get('matricula'))
+            conteudo = [] if dia is None else [{'clienteSintetico': {'dia': dia}}]
+            return 200, {'content': conteudo, 'totalPages': 1}
+        return 404, {'erro': f"caminho desconhecido: {caminho}"}
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._http.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._http.shutdown()
+        self._http.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *args):
+        self.parar()
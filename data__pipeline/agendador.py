@@ -0,0 +1,94 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from . import config
+from . import metricas
+
+# Uma etapa do pipeline: 'funcao' recebe, na ordem, os resultados das etapas de 'entradas'
+class Etapa:
+
+    def __init__(self, nome, funcao, entradas=()):
+        self.nome = nome
+        self.funcao = funcao
+        self.entradas = tuple(entradas)
+
+    def __repr__(self):
+        return f"Etapa({self.nome!r}, entradas={list(self.entradas)})"
+
+# Confere se todas as entradas existem e se não tem ciclo; devolve as etapas por nome
+def _validar(etapas):
+    por_nome = {}
+    for etapa in etapas:
+        if etapa.nome in por_nome:
+            raise ValueError(f"Etapa repetida: '{etapa.nome}'")
+        por_nome[etapa.nome] = etapa
+
+    for etapa in etapas:
+        for entrada in etapa.entradas:
+            if entrada not in por_nome:
+                raise ValueError(f"A etapa '{etapa.nome}' depende de '{entrada}', que não existe")
+
+    visitando, prontas = set(), set()
+    def visitar(nome):
+        if nome in prontas:
+            return
+        if nome in visitando:
+            raise ValueError(f"Ciclo entre as etapas passando por '{nome}'")
+        visitando.add(nome)
+        for entrada in por_nome[nome].entradas:
+            visitar(entrada)
+        visitando.discard(nome)
+        prontas.add(nome)
+    for etapa in etapas:
+        visitar(etapa.nome)
+
+    return por_nome
+
+# Roda as etapas num pool de threads: cada uma começa assim que todas as suas entradas
+# terminaram, então ramos independentes (ex.: Pacto e planilha de marketing) andam juntos.
+# Se uma etapa falha, só as que dependem dela (direta ou indiretamente) são canceladas;
+# o resto do pipeline continua. O tempo de cada etapa vai para o metricas.
+# 'envolver', se vier, recebe (nome, funcao) e devolve a função que vai rodar no lugar
+# (ex.: perfil.PerfilEtapas.envolver).
+# Retorna (resultados, falhas): resultado de cada etapa que terminou e, para as que não
+# terminaram, a exceção que deu ou o nome da etapa que a cancelou.
+def executar_etapas(etapas, max_workers=None, envolver=None):
+    por_nome = _validar(etapas)
+    max_workers = max_workers or config.ETAPAS_MAX_WORKERS
+
+    resultados = {}
+    falhas = {}
+    pendentes = list(por_nome)
+    em_execucao = {}
+
+    def cancelar_dependentes(nome_falha):
+        for nome in list(pendentes):
+            if nome in pendentes and nome_falha in por_nome[nome].entradas:
+                pendentes.remove(nome)
+                falhas[nome] = f"cancelada (depende de '{nome_falha}')"
+                print(f"   Etapa '{nome}' cancelada: depende de '{nome_falha}', que não terminou.")
+                cancelar_dependentes(nome)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pendentes or em_execucao:
+            for nome in list(pendentes):
+                etapa = por_nome[nome]
+                if all(entrada in resultados for entrada in etapa.entradas):
+                    pendentes.remove(nome)
+                    argumentos = [resultados[entrada] for entrada in etapa.entradas]
+                    funcao = envolver(nome, etapa.funcao) if envolver else etapa.funcao
+                    em_execucao[executor.submit(metricas.medir(nome)(funcao), *argumentos)] = nome
+
+            if not em_execucao:
+                break
+
+            concluidas, _ = wait(em_execucao, return_when=FIRST_COMPLETED)
+            for futuro in concluidas:
+                nome = em_execucao.pop(futuro)
+                try:
+                    resultados[nome] = futuro.result()
+                except Exception as e:
+                    print(f"   ERRO na etapa '{nome}': {e}")
+                    falhas[nome] = e
+                    cancelar_dependentes(nome)
+
+    return resultados, falhas
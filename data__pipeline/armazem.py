@@ -0,0 +1,175 @@
+import json
+import sqlite3
+import threading
+
+import pandas as pd
+
+from . import config
+
+def _nome(identificador):
+    return '"' + str(identificador).replace('"', '""') + '"'
+
+# Armazém local (SQLite) com as tabelas finais do pipeline, uma tabela por aba.
+# Abas com chave de dedup (load.CHAVES_POR_ABA) têm índice único nas chaves e são gravadas
+# com INSERT ... ON CONFLICT, então cada gravação custa o número de linhas que chegaram,
+# não o tamanho do histórico. Abas sem chave são substituídas inteiras.
+# Tudo é guardado como texto, igual na planilha. '_linha' é a linha da aba no Google
+# (a 1 é o cabeçalho): linhas novas vão para o fim e as alteradas ficam no lugar,
+# o que permite exportar para a planilha só o que mudou.
+class ArmazemSQLite:
+
+    def __init__(self, caminho=None):
+        self.caminho = caminho or config.ARMAZEM_DB_PATH
+        # As gravações de cada aba rodam em etapas (threads) diferentes
+        self.conexao = sqlite3.connect(str(self.caminho), check_same_thread=False)
+        self._trava = threading.RLock()
+        self.conexao.execute("""
+            CREATE TABLE IF NOT EXISTS armazem_abas (
+                aba TEXT PRIMARY KEY,
+                chaves TEXT,
+                exportada INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self.conexao.commit()
+
+    # Colunas da aba na ordem da planilha (lista vazia se a aba ainda não existe)
+    def colunas(self, aba):
+        with self._trava:
+            linhas = self.conexao.execute(f"PRAGMA table_info({_nome(aba)})").fetchall()
+        return [linha[1] for linha in linhas if linha[1] != '_linha']
+
+    # Cria a tabela (com os índices) ou acrescenta as colunas que faltam.
+    # Se a estrutura mudou, a aba precisa ser exportada inteira de novo.
+    def _preparar_tabela(self, aba, colunas, chaves):
+        existentes = self.colunas(aba)
+        tabela = _nome(aba)
+        if not existentes:
+            definicao = ", ".join(["_linha INTEGER NOT NULL"] + [f"{_nome(c)} TEXT NOT NULL DEFAULT ''" for c in colunas])
+            self.conexao.execute(f"CREATE TABLE {tabela} ({definicao})")
+            self.conexao.execute(f"CREATE INDEX {_nome('idx_' + aba + '_linha')} ON {tabela} (_linha)")
+            if chaves:
+                self.conexao.execute(
+                    f"CREATE UNIQUE INDEX {_nome('ux_' + aba + '_chaves')} ON {tabela} ({', '.join(_nome(c) for c in chaves)})"
+                )
+            self.conexao.execute(
+                "INSERT OR REPLACE INTO armazem_abas (aba, chaves, exportada) VALUES (?, ?, 0)",
+                (aba, json.dumps(chaves or []))
+            )
+            return
+        novas = [c for c in colunas if c not in existentes]
+        for coluna in novas:
+            self.conexao.execute(f"ALTER TABLE {tabela} ADD COLUMN {_nome(coluna)} TEXT NOT NULL DEFAULT ''")
+        if novas:
+            self.conexao.execute("UPDATE armazem_abas SET exportada = 0 WHERE aba = ?", (aba,))
+        # Chaves diferentes (ex.: a aba ganhou a coluna UNIDADE): o índice único é refeito nas novas
+        linha = self.conexao.execute("SELECT chaves FROM armazem_abas WHERE aba = ?", (aba,)).fetchone()
+        if chaves and linha and json.loads(linha[0] or "[]") != list(chaves):
+            indice = _nome('ux_' + aba + '_chaves')
+            self.conexao.execute(f"DROP INDEX IF EXISTS {indice}")
+            self.conexao.execute(f"CREATE UNIQUE INDEX {indice} ON {tabela} ({', '.join(_nome(c) for c in chaves)})")
+            self.conexao.execute("UPDATE armazem_abas SET chaves = ? WHERE aba = ?", (json.dumps(list(chaves)), aba))
+
+    def _linhas(self, aba, onde="", parametros=()):
+        colunas = self.colunas(aba)
+        selecao = ", ".join(["_linha"] + [_nome(c) for c in colunas])
+        linhas = self.conexao.execute(
+            f"SELECT {selecao} FROM {_nome(aba)} {onde} ORDER BY _linha", parametros
+        ).fetchall()
+        return pd.DataFrame(linhas, columns=['_linha'] + colunas)
+
+    # Grava o df na aba pelas chaves (upsert). Chave repetida no df fica com a última linha.
+    # Retorna (mudancas, qtd_novas, qtd_alteradas): 'mudancas' tem as linhas novas e as
+    # alteradas como ficaram no armazém, com a coluna '_linha'. Linhas iguais não contam.
+    def gravar(self, aba, df, chaves):
+        colunas = df.columns.values.tolist()
+        df_texto = df.fillna('').astype(str).drop_duplicates(subset=chaves, keep='last')
+        tabela = _nome(aba)
+        lista = ", ".join(_nome(c) for c in colunas)
+        lista_entrada = ", ".join(f"e.{_nome(c)}" for c in colunas)
+        junta = " AND ".join(f"t.{_nome(c)} = e.{_nome(c)}" for c in chaves)
+        outras = [c for c in colunas if c not in chaves]
+
+        with self._trava, self.conexao:
+            self._preparar_tabela(aba, colunas, chaves)
+            self.conexao.execute("DROP TABLE IF EXISTS temp.entrada")
+            self.conexao.execute(f"CREATE TEMP TABLE entrada ({lista})")
+            self.conexao.executemany(
+                f"INSERT INTO temp.entrada ({lista}) VALUES ({', '.join('?' * len(colunas))})",
+                df_texto.values.tolist()
+            )
+
+            # Linhas que já existem e vão mudar (antes do upsert, para saber quais são)
+            alteradas = []
+            if outras:
+                difere = " OR ".join(f"t.{_nome(c)} IS NOT e.{_nome(c)}" for c in outras)
+                alteradas = [linha for (linha,) in self.conexao.execute(
+                    f"SELECT t._linha FROM temp.entrada e JOIN {tabela} t ON {junta} WHERE {difere}"
+                )]
+
+            # Chaves novas vão para o fim, na ordem do df
+            ultima = self.conexao.execute(f"SELECT COALESCE(MAX(_linha), 1) FROM {tabela}").fetchone()[0]
+            qtd_novas = self.conexao.execute(
+                f"""INSERT INTO {tabela} (_linha, {lista})
+                    SELECT ? + ROW_NUMBER() OVER (ORDER BY e.rowid), {lista_entrada}
+                    FROM temp.entrada e
+                    WHERE NOT EXISTS (SELECT 1 FROM {tabela} t WHERE {junta})""",
+                (ultima,)
+            ).rowcount
+
+            # As demais já existem: o upsert só regrava as que têm algum valor diferente
+            if alteradas:
+                atribuicoes = ", ".join(f"{_nome(c)} = excluded.{_nome(c)}" for c in outras)
+                difere = " OR ".join(f"{tabela}.{_nome(c)} IS NOT excluded.{_nome(c)}" for c in outras)
+                self.conexao.execute(
+                    f"""INSERT INTO {tabela} (_linha, {lista})
+                        SELECT 0, {lista} FROM temp.entrada WHERE true
+                        ON CONFLICT ({', '.join(_nome(c) for c in chaves)})
+                        DO UPDATE SET {atribuicoes} WHERE {difere}"""
+                )
+            self.conexao.execute("DROP TABLE temp.entrada")
+
+            mudancas = self._linhas(
+                aba, "WHERE _linha > ? OR _linha IN (SELECT value FROM json_each(?))",
+                (ultima, json.dumps(alteradas))
+            )
+        return mudancas, qtd_novas, len(alteradas)
+
+    # Troca todo o conteúdo da aba pelo df (abas sem chave)
+    def substituir(self, aba, df):
+        colunas = df.columns.values.tolist()
+        lista = ", ".join(_nome(c) for c in colunas)
+        with self._trava, self.conexao:
+            if self.colunas(aba) and set(colunas) != set(self.colunas(aba)):
+                self.conexao.execute(f"DROP TABLE {_nome(aba)}")
+            self._preparar_tabela(aba, colunas, None)
+            self.conexao.execute(f"DELETE FROM {_nome(aba)}")
+            self.conexao.executemany(
+                f"INSERT INTO {_nome(aba)} (_linha, {lista}) VALUES ({', '.join('?' * (len(colunas) + 1))})",
+                [[i + 2] + linha for i, linha in enumerate(df.fillna('').astype(str).values.tolist())]
+            )
+
+    # A aba inteira, na ordem da planilha (sem a coluna '_linha')
+    def ler(self, aba):
+        with self._trava:
+            if not self.colunas(aba):
+                return pd.DataFrame()
+            return self._linhas(aba).drop(columns=['_linha'])
+
+    # Consulta livre no histórico, sem baixar a planilha. Ex.:
+    #   armazem.consultar('SELECT "TIPO DE TREINO", COUNT(*) FROM HISTORICO GROUP BY 1')
+    def consultar(self, sql, parametros=()):
+        with self._trava:
+            return pd.read_sql_query(sql, self.conexao, params=parametros)
+
+    # Se a aba do Google está igual ao armazém (última exportação confirmada)
+    def exportada(self, aba):
+        with self._trava:
+            linha = self.conexao.execute("SELECT exportada FROM armazem_abas WHERE aba = ?", (aba,)).fetchone()
+        return bool(linha and linha[0])
+
+    def marcar_exportada(self, aba, exportada=True):
+        with self._trava, self.conexao:
+            self.conexao.execute("UPDATE armazem_abas SET exportada = ? WHERE aba = ?", (int(exportada), aba))
+
+    def fechar(self):
+        self.conexao.close()
@@ -0,0 +1,123 @@
+import sqlite3
+import time
+
+from . import config
+from . import metricas
+
+# Chave única para a matrícula, já que ela pode chegar como int, float (123.0) ou texto
+def _chave(matricula):
+    if isinstance(matricula, float) and matricula.is_integer():
+        matricula = int(matricula)
+    return str(matricula).strip()
+
+# Com várias unidades, a mesma matrícula pode ser de alunos diferentes em cada uma: a chave do
+# horário leva a unidade junto ("unidade:matricula"). Com uma unidade só, é a própria matrícula
+# (como texto, igual à chave do cache). Aplicada numa chave pronta, devolve a mesma chave.
+def chave_horario(matricula, unidade=None):
+    if unidade is None or str(unidade) == '':
+        return _chave(matricula)
+    return f"{unidade}:{_chave(matricula)}"
+
+# Desfaz a chave_horario: (unidade, matricula), com unidade None quando a chave é só a matrícula
+def separar_chave_horario(chave):
+    if isinstance(chave, str) and ':' in chave:
+        unidade, matricula = chave.split(':', 1)
+        return unidade, matricula
+    return None, chave
+
+# Cache em disco (SQLite na raiz do projeto) para matrícula (chave_horario) -> clienteSintetico.dia.
+# O horário de um contrato fechado não muda, então os acertos ficam guardados para sempre.
+# Matrículas sem horário (negativos) expiram depois do TTL, porque o contrato pode ser fechado depois.
+class CacheHorarios:
+
+    def __init__(self, caminho=None, ttl_negativo_horas=None, max_entradas=None):
+        self.caminho = caminho or config.CACHE_DB_PATH
+        self.ttl_negativo = (config.CACHE_TTL_NEGATIVO_HORAS if ttl_negativo_horas is None else ttl_negativo_horas) * 3600
+        self.max_entradas = config.CACHE_MAX_ENTRADAS if max_entradas is None else max_entradas
+        self.acertos = 0
+        self.falhas = 0
+
+        self.conexao = sqlite3.connect(str(self.caminho))
+        self.conexao.execute("""
+            CREATE TABLE IF NOT EXISTS horario_matricula (
+                matricula TEXT PRIMARY KEY,
+                dia TEXT,
+                gravado_em REAL NOT NULL,
+                acessado_em REAL NOT NULL
+            )
+        """)
+        self.conexao.execute("CREATE INDEX IF NOT EXISTS idx_horario_acessado ON horario_matricula (acessado_em)")
+        self.conexao.commit()
+
+    # Retorna {matricula: dia} só com o que está válido no cache (dia pode ser None, no caso de negativo).
+    # Quem não aparece no retorno precisa ser consultado na API.
+    def buscar(self, matriculas):
+        agora = time.time()
+        chaves = {_chave(m): m for m in matriculas}
+        encontrados = {}
+
+        lista_chaves = list(chaves)
+        # Consulta em blocos para não estourar o limite de parâmetros do SQLite
+        for i in range(0, len(lista_chaves), 500):
+            bloco = lista_chaves[i:i + 500]
+            marcadores = ",".join("?" * len(bloco))
+            linhas = self.conexao.execute(
+                f"SELECT matricula, dia, gravado_em FROM horario_matricula WHERE matricula IN ({marcadores})",
+                bloco
+            ).fetchall()
+
+            for chave, dia, gravado_em in linhas:
+                if dia is None and agora - gravado_em > self.ttl_negativo:
+                    continue
+                encontrados[chaves[chave]] = dia
+
+        if encontrados:
+            self.conexao.executemany(
+                "UPDATE horario_matricula SET acessado_em = ? WHERE matricula = ?",
+                [(agora, _chave(m)) for m in encontrados]
+            )
+            self.conexao.commit()
+
+        self.acertos += len(encontrados)
+        self.falhas += len(chaves) - len(encontrados)
+        metricas.contar_cache("horario_matricula", len(encontrados), len(chaves) - len(encontrados))
+        return encontrados
+
+    # Grava o resultado das consultas na API ({matricula: dia ou None})
+    def gravar(self, horarios):
+        if not horarios:
+            return
+
+        agora = time.time()
+        self.conexao.executemany(
+            "INSERT OR REPLACE INTO horario_matricula (matricula, dia, gravado_em, acessado_em) VALUES (?, ?, ?, ?)",
+            [(_chave(m), dia, agora, agora) for m, dia in horarios.items()]
+        )
+        self._despejar(agora)
+        self.conexao.commit()
+
+    # Remove os negativos vencidos e, se ainda passar do limite, os menos acessados
+    def _despejar(self, agora):
+        self.conexao.execute(
+            "DELETE FROM horario_matricula WHERE dia IS NULL AND gravado_em < ?",
+            (agora - self.ttl_negativo,)
+        )
+        total = self.conexao.execute("SELECT COUNT(*) FROM horario_matricula").fetchone()[0]
+        excesso = total - self.max_entradas
+
+        if excesso > 0:
+            self.conexao.execute(
+                """DELETE FROM horario_matricula WHERE matricula IN (
+                       SELECT matricula FROM horario_matricula ORDER BY acessado_em ASC LIMIT ?
+                   )""",
+                (excesso,)
+            )
+            print(f"   [Cache] {excesso} matrículas antigas removidas (limite de {self.max_entradas}).")
+
+    def resumo(self):
+        total = self.acertos + self.falhas
+        taxa = (self.acertos / total * 100) if total else 0.0
+        return f"   [Cache] {self.acertos} acertos, {self.falhas} falhas ({taxa:.1f}% de acerto)"
+
+    def fechar(self):
+        self.conexao.close()
@@ -7,7 +7,8 @@ load_dotenv()
 # Variáveis de ambiente
 TOKEN = os.getenv("TOKEN")
 EMPRESA_ID = os.getenv("EMPRESA_ID")
-URL_BASE = "https://apigw.pactosolucoes.com.br"
+# Pode apontar para outro servidor (ex.: o servidor falso dos benchmarks)
+URL_BASE = os.getenv("PACTO_URL_BASE", "https://apigw.pactosolucoes.com.br")
 
 # Headers padrão da pacto
 HEADERS = {
@@ -16,6 +17,17 @@ HEADERS = {
     "empresaId": EMPRESA_ID
 }
 
+# Unidades (empresaId) e professores consultados, separados por vírgula. Sem EMPRESA_IDS vale
+# só a EMPRESA_ID. Cada par unidade/professor é buscado em paralelo; com mais de uma unidade
+# os agendamentos levam a unidade junto e as tabelas ganham a coluna UNIDADE.
+EMPRESA_IDS = [e.strip() for e in os.getenv("EMPRESA_IDS", "").split(",") if e.strip()] or [EMPRESA_ID]
+PROFESSOR_IDS = [int(p) if p.strip().isdigit() else p.strip() for p in os.getenv("PROFESSOR_IDS", "1").split(",") if p.strip()]
+# Quantos pares unidade/professor são buscados ao mesmo tempo
+PACTO_UNIDADES_EM_PARALELO = int(os.getenv("PACTO_UNIDADES_EM_PARALELO", "4"))
+# Busca também os agendamentos de quem faltou (agendamento-faltaram), junto com os executados.
+# O HISTORICO ganha a coluna STATUS (EXECUTOU/FALTOU); o relatório final continua só com quem foi.
+AGENDAMENTOS_INCLUIR_FALTAS = os.getenv("AGENDAMENTOS_INCLUIR_FALTAS", "0") not in ("0", "false", "False", "")
+
 TP_ACADEMIA_DB_ID = os.getenv("TP_ACADEMIA_DB_ID")
 GOOGLE_JSON_FILE = os.getenv("GOOGLE_JSON_FILE", "service_account.json")
 GOOGLE_SHEETS_MKT = os.getenv("GOOGLE_SHEETS_MKT")
@@ -25,4 +37,82 @@ ROOT_DIR = Path(__file__).resolve().parent.parent
 
 # Caminho para a credencial do Google
 _json_file_name = os.getenv("GOOGLE_JSON_FILE", "service_account.json")
-GOOGLE_CREDENTIALS_PATH = ROOT_DIR / _json_file_name
\ No newline at end of file
+GOOGLE_CREDENTIALS_PATH = ROOT_DIR / _json_file_name
+
+# Quantidade máxima de requisições simultâneas para a API da Pacto
+PACTO_MAX_WORKERS = int(os.getenv("PACTO_MAX_WORKERS", "8"))
+
+# Cache local (SQLite) dos horários de matrícula da Pacto
+CACHE_DB_PATH = ROOT_DIR / os.getenv("CACHE_DB_FILE", "tp_academia_cache.sqlite3")
+# Matrícula sem horário na Pacto é consultada de novo depois desse tempo
+CACHE_TTL_NEGATIVO_HORAS = float(os.getenv("CACHE_TTL_NEGATIVO_HORAS", "12"))
+# Limite de matrículas guardadas; as acessadas há mais tempo são removidas primeiro
+CACHE_MAX_ENTRADAS = int(os.getenv("CACHE_MAX_ENTRADAS", "50000"))
+
+# Quantas páginas de agendamentos ficam sendo buscadas ao mesmo tempo
+PACTO_PAGINAS_EM_VOO = int(os.getenv("PACTO_PAGINAS_EM_VOO", "4"))
+
+# Cliente HTTP compartilhado da Pacto (pacto.py): conexões mantidas abertas no pool,
+# tentativas em 429/5xx/falha de rede e limite de requisições por segundo. O limite começa
+# em PACTO_TAXA_MAXIMA, cai pela metade quando o gateway responde 429 e volta a subir aos
+# poucos (nunca abaixo de PACTO_TAXA_MINIMA). PACTO_TAXA_MAXIMA=0 desliga o limite.
+# PACTO_POOL_CONEXOES=0 (padrão) calcula o pool pelas requisições que o pipeline abre ao mesmo
+# tempo (pacto.conexoes_simultaneas), a partir das configurações de paralelismo acima.
+PACTO_POOL_CONEXOES = int(os.getenv("PACTO_POOL_CONEXOES", "0"))
+PACTO_TENTATIVAS = int(os.getenv("PACTO_TENTATIVAS", "4"))
+PACTO_TAXA_MAXIMA = float(os.getenv("PACTO_TAXA_MAXIMA", "25"))
+PACTO_TAXA_MINIMA = float(os.getenv("PACTO_TAXA_MINIMA", "1"))
+
+# Cada execução grava os dados brutos (Pacto e marketing) em SNAPSHOTS_DIR/AAAAMMDD-HHMMSS,
+# para refazer o transform depois com main.py --replay, sem chamar as APIs.
+# Só os SNAPSHOTS_MANTER mais recentes ficam guardados (0 guarda todos).
+SNAPSHOTS_DIR = ROOT_DIR / os.getenv("SNAPSHOTS_DIR", "snapshots")
+SNAPSHOTS_MANTER = int(os.getenv("SNAPSHOTS_MANTER", "10"))
+
+# Relatório JSON de cada execução (tempos, linhas, HTTP, cache) e textfile do Prometheus
+# para o textfile collector do node exporter
+METRICAS_DIR = ROOT_DIR / os.getenv("METRICAS_DIR", "metricas")
+METRICAS_PROMETHEUS_ARQUIVO = Path(os.getenv("METRICAS_PROMETHEUS_ARQUIVO", str(METRICAS_DIR / "tp_academia.prom")))
+
+# Arquivos do main.py --profile (.pstats de cada etapa e resumo.txt)
+PERFIL_DIR = ROOT_DIR / os.getenv("PERFIL_DIR", "perfil")
+
+# Quantas etapas do pipeline (extrações, transformações, gravações) rodam ao mesmo tempo
+ETAPAS_MAX_WORKERS = int(os.getenv("ETAPAS_MAX_WORKERS", "4"))
+
+# Estado local das extrações incrementais (watermark dos agendamentos).
+# Fica separado do cache: apagar o cache não obriga a baixar o histórico inteiro de novo.
+ESTADO_DB_PATH = ROOT_DIR / os.getenv("ESTADO_DB_FILE", "tp_academia_estado.sqlite3")
+
+# Leitura incremental da aba "Diária" do marketing: além das linhas novas, as últimas
+# linhas já lidas são baixadas de novo, porque a equipe continua preenchendo os nomes nelas
+LEADS_LINHAS_REVISAO = int(os.getenv("LEADS_LINHAS_REVISAO", "200"))
+
+# Abas regravadas inteiras são enviadas ao Google Sheets em blocos com esse número de linhas,
+# convertidos para texto só na hora do envio (memória não cresce com o tamanho da aba)
+SHEETS_LINHAS_POR_BLOCO = int(os.getenv("SHEETS_LINHAS_POR_BLOCO", "5000"))
+
+# Índice de nomes do fuzzy matching: compara cada nome só com os candidatos que
+# dividem algum sobrenome/primeiro nome ou som parecido. Com 0, volta a comparar com todos.
+MATCH_USAR_INDICE = os.getenv("MATCH_USAR_INDICE", "1") not in ("0", "false", "False", "")
+# Baldes do índice com mais que essa fração da lista (tokens comuns como SILVA e MARIA) são
+# descartados: quase não filtram e deixam a comparação perto da varredura completa
+MATCH_BALDE_MAXIMO = float(os.getenv("MATCH_BALDE_MAXIMO", "0.05"))
+
+# Para onde o load grava as tabelas finais: 'sheets' (direto nas abas do Google) ou 'sqlite'
+# (armazém local em ARMAZEM_DB_PATH, com upsert pelas chaves de cada aba). No 'sqlite' as abas
+# do Google viram uma exportação do armazém, só do que mudou; com ARMAZEM_EXPORTAR_SHEETS=0
+# nada é enviado ao Google.
+LOAD_BACKEND = os.getenv("LOAD_BACKEND", "sheets")
+ARMAZEM_DB_PATH = ROOT_DIR / os.getenv("ARMAZEM_DB_FILE", "tp_academia_armazem.sqlite3")
+ARMAZEM_EXPORTAR_SHEETS = os.getenv("ARMAZEM_EXPORTAR_SHEETS", "1") not in ("0", "false", "False", "")
+
+# Escala das vendedoras, usada para descobrir quem fechou a venda pelo horário da matrícula.
+# Segunda a sexta: (início, fim) de cada turno, com o fim fora do turno.
+ESCALA_SEMANA = [
+    ("06:00", "14:30", "Daniela Teixeira"),
+    ("14:30", "23:00", "Daniela Dalla"),
+]
+# Sábado: revezamento semanal, começando pela primeira da lista no sábado de referência
+ESCALA_SABADO_REFERENCIA = "14/03/2026"
+ESCALA_SABADO_REVEZAMENTO = ["Daniela Dalla", "Daniela Teixeira"]
@@ -0,0 +1,304 @@
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+from . import config
+
+# Converte um 'inicio' da Pacto para comparar datas (NaT se vier algo inválido).
+# A API manda ISO ("2026-03-15T09:38:00"), que o fromisoformat lê bem mais rápido
+# que o pd.to_datetime; ele fica só para o que vier fora desse formato.
+def converter_inicio(valor):
+    if isinstance(valor, str):
+        try:
+            return datetime.fromisoformat(valor)
+        except ValueError:
+            pass
+    return pd.to_datetime(valor, errors='coerce')
+
+def _inicio(agendamento):
+    return converter_inicio(agendamento.get('inicio'))
+
+# Só quem roda com mais de uma unidade tem a 'unidade' nos agendamentos; com uma só ela fica ''
+def _unidade(agendamento):
+    unidade = agendamento.get('unidade')
+    return '' if unidade is None or pd.isna(unidade) else str(unidade)
+
+# 'status' só existe quando os que faltaram também são coletados (config.AGENDAMENTOS_INCLUIR_FALTAS).
+# Quem compareceu vale mais que quem faltou: uma falta nunca substitui um treino executado.
+def _status(agendamento):
+    status = agendamento.get('status')
+    return None if status is None or pd.isna(status) else str(status)
+
+def _prioridade(status):
+    return 0 if status == 'FALTOU' else 1
+
+def _chave(agendamento):
+    return (_unidade(agendamento), str(agendamento.get('matricula')), str(agendamento.get('evento')))
+
+def _nome_watermark(unidade):
+    return 'agendamentos_inicio' if not unidade else f'agendamentos_inicio:{unidade}'
+
+# Guarda localmente (SQLite) os agendamentos já processados, para a extração incremental.
+# O watermark é o maior 'inicio' já gravado (um por unidade); além dele fica guardado o último
+# 'inicio' de cada (unidade, matricula, evento), que é a mesma chave usada para remover
+# duplicados no HISTORICO. Só os campos usados no transform são guardados, o que permite
+# remontar o histórico completo sem pedir tudo de novo para a API.
+class HistoricoAgendamentos:
+
+    def __init__(self, caminho=None):
+        self.caminho = caminho or config.ESTADO_DB_PATH
+        # As etapas do pipeline usam o histórico em threads diferentes, e algumas rodam ao
+        # mesmo tempo (ex.: carga_historico e agendamentos_completos): a conexão é uma só,
+        # então todo uso dela passa pela trava
+        self.conexao = sqlite3.connect(str(self.caminho), check_same_thread=False)
+        self._trava = threading.RLock()
+        self._migrar_unidade()
+        self.conexao.execute("""
+            CREATE TABLE IF NOT EXISTS agendamentos_processados (
+                unidade TEXT NOT NULL DEFAULT '',
+                matricula TEXT NOT NULL,
+                evento TEXT NOT NULL,
+                nome_aluno TEXT,
+                inicio TEXT,
+                status TEXT,
+                PRIMARY KEY (unidade, matricula, evento)
+            )
+        """)
+        # Estados anteriores à coleta dos que faltaram: tudo o que já estava lá foi executado
+        colunas = [linha[1] for linha in self.conexao.execute("PRAGMA table_info(agendamentos_processados)")]
+        if 'status' not in colunas:
+            self.conexao.execute("ALTER TABLE agendamentos_processados ADD COLUMN status TEXT")
+        self.conexao.execute("""
+            CREATE TABLE IF NOT EXISTS watermark (
+                nome TEXT PRIMARY KEY,
+                valor TEXT
+            )
+        """)
+        self.conexao.commit()
+
+    # Estados gravados antes das várias unidades tinham a chave só (matricula, evento):
+    # a tabela é recriada com a coluna 'unidade' ('' para tudo o que já estava lá)
+    def _migrar_unidade(self):
+        colunas = [linha[1] for linha in self.conexao.execute("PRAGMA table_info(agendamentos_processados)")]
+        if not colunas or 'unidade' in colunas:
+            return
+        with self.conexao:
+            self.conexao.execute("ALTER TABLE agendamentos_processados RENAME TO agendamentos_processados_antigo")
+            self.conexao.execute("""
+                CREATE TABLE agendamentos_processados (
+                    unidade TEXT NOT NULL DEFAULT '',
+                    matricula TEXT NOT NULL,
+                    evento TEXT NOT NULL,
+                    nome_aluno TEXT,
+                    inicio TEXT,
+                    PRIMARY KEY (unidade, matricula, evento)
+                )
+            """)
+            self.conexao.execute("""
+                INSERT INTO agendamentos_processados (unidade, matricula, evento, nome_aluno, inicio)
+                SELECT '', matricula, evento, nome_aluno, inicio FROM agendamentos_processados_antigo
+            """)
+            self.conexao.execute("DROP TABLE agendamentos_processados_antigo")
+
+    # Maior 'inicio' já processado da unidade, ou None se ela nunca rodou
+    # (ou rodou só com full refresh vazio)
+    def watermark(self, unidade=None):
+        with self._trava:
+            linha = self.conexao.execute(
+                "SELECT valor FROM watermark WHERE nome = ?", (_nome_watermark(unidade),)
+            ).fetchone()
+        if not linha or linha[0] is None:
+            return None
+        valor = pd.to_datetime(linha[0], errors='coerce')
+        return None if pd.isna(valor) else valor
+
+    # Se alguma unidade já tem watermark (ou seja, dá para rodar incremental)
+    def possui_watermark(self):
+        with self._trava:
+            return self.conexao.execute(
+                "SELECT 1 FROM watermark WHERE nome LIKE 'agendamentos_inicio%' AND valor IS NOT NULL LIMIT 1"
+            ).fetchone() is not None
+
+    # Último 'inicio' e status guardados, só das chaves que chegaram agora: as chaves vão
+    # para uma tabela temporária e o JOIN usa a chave primária, então o custo acompanha
+    # o que veio da API e não o tamanho do histórico.
+    def _inicios_conhecidos(self, agendamentos):
+        chaves = {_chave(agendamento) for agendamento in agendamentos}
+        if not chaves:
+            return {}
+        with self._trava, self.conexao:
+            self.conexao.execute("DROP TABLE IF EXISTS temp.chaves")
+            self.conexao.execute("CREATE TEMP TABLE chaves (unidade TEXT, matricula TEXT, evento TEXT)")
+            self.conexao.executemany("INSERT INTO temp.chaves VALUES (?, ?, ?)", chaves)
+            linhas = self.conexao.execute("""
+                SELECT p.unidade, p.matricula, p.evento, p.inicio, p.status
+                FROM temp.chaves c
+                JOIN agendamentos_processados p
+                  ON p.unidade = c.unidade AND p.matricula = c.matricula AND p.evento = c.evento
+            """).fetchall()
+            self.conexao.execute("DROP TABLE temp.chaves")
+        return {
+            (unidade, matricula, evento): (converter_inicio(inicio), status)
+            for unidade, matricula, evento, inicio, status in linhas
+        }
+
+    # Fica só com o que ainda não foi processado: chave nova ou um 'inicio' mais recente
+    # para uma chave conhecida (o HISTORICO mantém sempre o mais recente), sem deixar
+    # uma falta passar por cima de um treino executado.
+    def filtrar_novos(self, agendamentos):
+        conhecidos = self._inicios_conhecidos(agendamentos)
+        novos = []
+        for agendamento in agendamentos:
+            conhecido = conhecidos.get(_chave(agendamento))
+            if conhecido is None:
+                novos.append(agendamento)
+                continue
+            inicio_anterior, status_anterior = conhecido
+            prioridade, prioridade_anterior = _prioridade(_status(agendamento)), _prioridade(status_anterior)
+            if prioridade != prioridade_anterior:
+                if prioridade > prioridade_anterior:
+                    novos.append(agendamento)
+            elif pd.isna(inicio_anterior) or _inicio(agendamento) > inicio_anterior:
+                novos.append(agendamento)
+        return novos
+
+    # Quantos dos agendamentos são atualizações de chaves que já estão no HISTORICO
+    def contar_atualizacoes(self, agendamentos):
+        conhecidos = self._inicios_conhecidos(agendamentos)
+        return sum(1 for agendamento in agendamentos if _chave(agendamento) in conhecidos)
+
+    # Grava os agendamentos processados e avança o watermark.
+    # Com substituir=True (full refresh) o estado anterior é descartado.
+    def registrar(self, agendamentos, substituir=False):
+        with self._trava:
+            if substituir:
+                self.conexao.execute("DELETE FROM agendamentos_processados")
+                self.conexao.execute("DELETE FROM watermark")
+
+            self.conexao.executemany(
+                """INSERT INTO agendamentos_processados (unidade, matricula, evento, nome_aluno, inicio, status)
+                   VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (unidade, matricula, evento) DO UPDATE SET
+                       nome_aluno = excluded.nome_aluno,
+                       inicio = excluded.inicio,
+                       status = excluded.status
+                   WHERE NOT (excluded.status IS 'FALTOU' AND agendamentos_processados.status IS NOT 'FALTOU')""",
+                [(*_chave(a), a.get('nomeAluno'), a.get('inicio'), _status(a)) for a in agendamentos]
+            )
+
+            # Maior 'inicio' de cada unidade
+            maiores = {}
+            for agendamento in agendamentos:
+                inicio = _inicio(agendamento)
+                if pd.isna(inicio):
+                    continue
+                unidade = _unidade(agendamento)
+                if unidade not in maiores or inicio > maiores[unidade][0]:
+                    maiores[unidade] = (inicio, agendamento.get('inicio'))
+
+            for unidade, (maior, maior_bruto) in maiores.items():
+                atual = self.watermark(unidade)
+                if atual is None or maior > atual:
+                    self.conexao.execute(
+                        "INSERT OR REPLACE INTO watermark (nome, valor) VALUES (?, ?)",
+                        (_nome_watermark(unidade), maior_bruto)
+                    )
+            self.conexao.commit()
+
+    # Remonta todos os agendamentos já processados, no mesmo formato que vem da API
+    # (com a 'unidade' só quando tem mais de uma, e o 'status' só quando foi coletado).
+    # 'pendentes' são agendamentos ainda não registrados (ex.: esperando a gravação na
+    # planilha) que entram por cima dos guardados, como se já tivessem sido registrados.
+    def listar(self, pendentes=None):
+        with self._trava:
+            linhas = self.conexao.execute(
+                "SELECT unidade, matricula, evento, nome_aluno, inicio, status FROM agendamentos_processados"
+            ).fetchall()
+        por_chave = {}
+        for unidade, matricula, evento, nome_aluno, inicio, status in linhas:
+            por_chave[(unidade, matricula, evento)] = {
+                'matricula': matricula, 'nomeAluno': nome_aluno, 'evento': evento, 'inicio': inicio, 'status': status
+            }
+        for agendamento in pendentes or []:
+            unidade, matricula, evento = _chave(agendamento)
+            anterior = por_chave.get((unidade, matricula, evento))
+            if anterior and _prioridade(_status(agendamento)) < _prioridade(anterior['status']):
+                continue
+            por_chave[(unidade, matricula, evento)] = {
+                'matricula': matricula, 'nomeAluno': agendamento.get('nomeAluno'),
+                'evento': evento, 'inicio': agendamento.get('inicio'), 'status': _status(agendamento)
+            }
+        for (unidade, _, _), agendamento in por_chave.items():
+            if unidade:
+                agendamento['unidade'] = unidade
+            if agendamento['status'] is None:
+                del agendamento['status']
+        return list(por_chave.values())
+
+    def fechar(self):
+        with self._trava:
+            self.conexao.close()
+
+# Cópia local das linhas já lidas da aba "Diária" (só as colunas usadas no transform),
+# para a leitura incremental dos leads: cada execução baixa só as linhas novas e uma
+# janela das últimas linhas, que ainda podem estar sendo editadas na planilha.
+# 'linha' é o número da linha na planilha (a 1 é o cabeçalho).
+class HistoricoLeads:
+
+    def __init__(self, caminho=None):
+        self.caminho = caminho or config.ESTADO_DB_PATH
+        self.conexao = sqlite3.connect(str(self.caminho))
+        self.conexao.execute("""
+            CREATE TABLE IF NOT EXISTS leads_linhas (
+                linha INTEGER PRIMARY KEY,
+                valores TEXT NOT NULL
+            )
+        """)
+        self.conexao.execute("""
+            CREATE TABLE IF NOT EXISTS leads_info (
+                nome TEXT PRIMARY KEY,
+                valor TEXT
+            )
+        """)
+        self.conexao.commit()
+
+    # Cabeçalho (colunas) das linhas guardadas, ou None se ainda não tem nada
+    def cabecalho(self):
+        linha = self.conexao.execute("SELECT valor FROM leads_info WHERE nome = 'cabecalho'").fetchone()
+        return json.loads(linha[0]) if linha else None
+
+    # Número da última linha guardada (1 se só tem o cabeçalho ou nada)
+    def ultima_linha(self):
+        linha = self.conexao.execute("SELECT MAX(linha) FROM leads_linhas").fetchone()
+        return linha[0] if linha and linha[0] is not None else 1
+
+    def linha(self, numero):
+        linha = self.conexao.execute("SELECT valores FROM leads_linhas WHERE linha = ?", (numero,)).fetchone()
+        return json.loads(linha[0]) if linha else None
+
+    # Troca tudo a partir da linha 'inicio' pelas 'linhas' lidas agora.
+    # Se o cabeçalho mudou, as linhas guardadas não servem mais e são apagadas.
+    def substituir(self, cabecalho, inicio, linhas):
+        if self.cabecalho() != cabecalho:
+            self.conexao.execute("DELETE FROM leads_linhas")
+            self.conexao.execute(
+                "INSERT OR REPLACE INTO leads_info (nome, valor) VALUES ('cabecalho', ?)",
+                (json.dumps(cabecalho),)
+            )
+        self.conexao.execute("DELETE FROM leads_linhas WHERE linha >= ?", (inicio,))
+        self.conexao.executemany(
+            "INSERT INTO leads_linhas (linha, valores) VALUES (?, ?)",
+            [(inicio + i, json.dumps(valores)) for i, valores in enumerate(linhas)]
+        )
+        self.conexao.commit()
+
+    # Todas as linhas guardadas, na ordem da planilha
+    def listar(self):
+        linhas = self.conexao.execute("SELECT valores FROM leads_linhas ORDER BY linha").fetchall()
+        return [json.loads(valores) for (valores,) in linhas]
+
+    def fechar(self):
+        self.conexao.close()
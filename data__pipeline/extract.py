@@ -1,20 +1,26 @@
 # Imports principais do projeto
 import requests
 import json
-import gspread
+import queue
+import threading
 import pandas as pd
-from pathlib import Path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from gspread.utils import rowcol_to_a1
 
 
 from . import config
+from .cache import CacheHorarios, separar_chave_horario
+from .estado import converter_inicio
+from .sheets import SessaoGoogleSheets
+from . import metricas
+from . import pacto
 
 # Função para buscar os dados da empresa cadastrada no sistema
 # Não faz sentido criar uma função para listar todas as empresas,
 # porque só queremos consultar a empresa atual mesmo.
 def getEmpresa():
-    url_empresas = f"{config.URL_BASE}/v1/empresa/{config.EMPRESA_ID}"
-
-    response = requests.get(url_empresas, headers=config.HEADERS)
+    response = pacto.cliente().get(f"/v1/empresa/{config.EMPRESA_ID}")
 
     if response.status_code == 200:
         data = response.json()
@@ -27,9 +33,9 @@ def getEmpresa():
 
 # Função genérica para consultar qualquer endpoint de agendamentos da Pacto.
 # Isso evita repetição de código, já que 'executados' e 'faltaram' seguem o mesmo padrão.
-def getAgendamentos(path, professor_id=1, page=0, size=100, sort="nome,asc"):
-
-    url = f"{config.URL_BASE}{path}"
+# Todas as chamadas à Pacto passam pelo cliente compartilhado (pacto.py).
+# 'empresa_id' troca a unidade consultada (header empresaId); sem ele vale a do config.HEADERS.
+def getAgendamentos(path, professor_id=1, page=0, size=100, sort="nome,asc", empresa_id=None):
 
     # Parâmetros aceitos pelo endpoint (todos opcionais, exceto empresaId que vai no header)
     params = {
@@ -40,7 +46,8 @@ def getAgendamentos(path, professor_id=1, page=0, size=100, sort="nome,asc"):
         "filters": json.dumps({"professorId": professor_id})
     }
 
-    response = requests.get(url, headers=config.HEADERS, params=params)
+    headers = {"empresaId": str(empresa_id)} if empresa_id is not None else None
+    response = pacto.cliente().get(path, params=params, headers=headers)
 
     if response.status_code == 200:
         print("A requisição funcionou!")
@@ -54,146 +61,471 @@ def getAgendamentos(path, professor_id=1, page=0, size=100, sort="nome,asc"):
 
 
 # Função que busca os agendamentos EXECUTADOS
-def getAgendamentosExecutados(professor_id=1, page=0, size=100, sort="nome,asc"):
+def getAgendamentosExecutados(professor_id=1, page=0, size=100, sort="nome,asc", empresa_id=None):
     return getAgendamentos(
         path="/psec/treino-bi/agendamento-executaram",
         professor_id=professor_id,
         page=page,
         size=size,
-        sort=sort
+        sort=sort,
+        empresa_id=empresa_id
     )
 
 
 # Função que busca os agendamentos que FALTARAM
-def getAgendamentosFaltaram(professor_id=1, page=0, size=100, sort="nome,asc"):
+def getAgendamentosFaltaram(professor_id=1, page=0, size=100, sort="nome,asc", empresa_id=None):
     return getAgendamentos(
         path="/psec/treino-bi/agendamento-faltaram",
         professor_id=professor_id,
         page=page,
         size=size,
-        sort=sort
+        sort=sort,
+        empresa_id=empresa_id
     )
+# A coleta paginada parou no meio: uma página falhou mesmo depois das novas tentativas do cliente
+class ColetaIncompleta(Exception):
+    pass
+
 # Função geradora que busca dados de uma função de API paginada.
 # api_agendamentos: A função que busca os dados (ex: getAgendamentosExecutados).
-def getDadosPaginados(api_agendamentos, professor_id=1):
-    
-    pagina_atual = 0
-    
-    while True:
-        print(f"Buscando página {pagina_atual}...")
-        dados = api_agendamentos(professor_id=professor_id, page=pagina_atual)
+# Enquanto as páginas já recebidas são entregues, as próximas já estão sendo buscadas:
+# até 'paginas_em_voo' requisições ficam abertas ao mesmo tempo (no cliente compartilhado).
+# Os agendamentos continuam saindo na ordem das páginas.
+# Quando a API informa 'totalPages'/'last', a coleta para na última página sem pedir uma página vazia.
+# Se uma página falha, levanta ColetaIncompleta em vez de parar em silêncio: com o resto da coleta
+# o watermark passaria por cima das páginas que faltaram, e elas nunca mais seriam buscadas.
+@metricas.medir()
+def getDadosPaginados(api_agendamentos, professor_id=1, paginas_em_voo=None, **parametros):
+
+    paginas_em_voo = paginas_em_voo or config.PACTO_PAGINAS_EM_VOO
+    executor = ThreadPoolExecutor(max_workers=paginas_em_voo)
+
+    def buscar(pagina):
+        print(f"Buscando página {pagina}...")
+        return api_agendamentos(professor_id=professor_id, page=pagina, **parametros)
+
+    pendentes = deque()
+    try:
+        pagina_atual = 0
+        proxima_pagina = 1
+        dados = buscar(pagina_atual)
+
+        while True:
+            if dados is None:
+                print("Erro na conexão ou resposta inesperada da API PACTO")
+                raise ColetaIncompleta(f"a página {pagina_atual} não veio da API da Pacto")
+
+            content = dados.get('content', [])
+
+            for agendamento in content:
+                yield agendamento
+
+            # A coleta para quando a API diz que essa é a última página,
+            # ou (se ela não informar) quando não retorna mais conteúdo na lista 'content'.
+            total_paginas = dados.get('totalPages')
+            if not content or dados.get('last') is True or (total_paginas is not None and pagina_atual + 1 >= total_paginas):
+                print("Fim da coleta de dados na API.")
+                break
+
+            # Completa a janela de páginas em voo (sem passar do total, quando ele é conhecido)
+            while len(pendentes) < paginas_em_voo and (total_paginas is None or proxima_pagina < total_paginas):
+                pendentes.append(executor.submit(buscar, proxima_pagina))
+                proxima_pagina += 1
+
+            dados = pendentes.popleft().result()
+            pagina_atual += 1
+    finally:
+        # Se a coleta parar antes (fim, erro ou quem consome desistiu), descarta o que ainda não saiu
+        for futuro in pendentes:
+            futuro.cancel()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+# Consome os agendamentos ordenados do mais novo para o mais antigo e para
+# assim que passar do watermark, sem buscar as páginas do histórico antigo.
+# Se a API não respeitar a ordenação, desiste do corte e lê tudo (o filtro de novos resolve).
+def _agendamentos_desde(agendamentos, watermark):
+    anterior = None
+    ordenado = True
+
+    for agendamento in agendamentos:
+        inicio = converter_inicio(agendamento.get('inicio'))
+
+        if ordenado and not pd.isna(inicio):
+            if anterior is not None and inicio > anterior:
+                print("   [Aviso] A API não devolveu os agendamentos ordenados por data, lendo o histórico completo.")
+                ordenado = False
+            elif inicio < watermark:
+                break
+            else:
+                anterior = inicio
+
+        yield agendamento
+
+EVENTOS_FILTRADOS = ["Aula Experimental", "Primeiro Treino sem A.E", "Primeiro Treino com A.E"]
 
-        if dados is None:
-            print("Erro na conexão ou resposta inesperada da API PACTO")
-            break
+# Valores da coluna 'status' quando os que faltaram também são coletados
+STATUS_EXECUTOU = "EXECUTOU"
+STATUS_FALTOU = "FALTOU"
 
-        content = dados.get('content', [])
+_FIM = object()
 
-        for agendamento in content:
-            yield agendamento
+# Junta várias fontes de agendamentos numa só, lendo todas ao mesmo tempo (uma thread cada).
+# 'fontes' é {status: iterável}; cada agendamento sai com o 'status' da fonte, na ordem em que
+# as páginas chegam. O 'filtro' é aplicado dentro de cada thread, então o que não passa nele
+# não chega a ser juntado. Se uma fonte levantar exceção, ela é repassada para quem consome.
+def _intercalar(fontes, filtro=None):
+    fila = queue.Queue()
+    parar = threading.Event()
+
+    def bombear(status, fonte):
+        try:
+            for agendamento in fonte:
+                if parar.is_set():
+                    break
+                if filtro is None or filtro(agendamento):
+                    fila.put({**agendamento, 'status': status})
+        except Exception as e:
+            fila.put(e)
+        finally:
+            # Fecha o gerador na thread dele (cancela as páginas que estavam em voo)
+            if hasattr(fonte, 'close'):
+                fonte.close()
+            fila.put(_FIM)
+
+    executor = ThreadPoolExecutor(max_workers=len(fontes))
+    try:
+        for status, fonte in fontes.items():
+            executor.submit(bombear, status, fonte)
+        abertas = len(fontes)
+        while abertas:
+            item = fila.get()
+            if item is _FIM:
+                abertas -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        parar.set()
+        executor.shutdown(wait=True)
+
+# Pares (unidade, professor) consultados, de config.EMPRESA_IDS x config.PROFESSOR_IDS
+def _unidades_professores():
+    return [(empresa_id, professor_id) for empresa_id in config.EMPRESA_IDS for professor_id in config.PROFESSOR_IDS]
+
+def _evento_filtrado(agendamento):
+    return agendamento.get('evento') in EVENTOS_FILTRADOS
+
+# Coleta os agendamentos filtrados de um professor numa unidade. 'unidade' (só quando há
+# mais de uma) vai junto de cada agendamento, para não misturar matrículas de unidades diferentes.
+# Com config.AGENDAMENTOS_INCLUIR_FALTAS, os que executaram e os que faltaram são paginados
+# ao mesmo tempo (_intercalar) e cada agendamento leva o 'status'.
+def _coletar_agendamentos(empresa_id, professor_id, unidade, historico):
+    watermark = historico.watermark(unidade) if historico is not None else None
+    parametros = {"professor_id": professor_id, "empresa_id": empresa_id}
+
+    if watermark is not None:
+        print(f"Coleta incremental a partir de {watermark} (unidade {empresa_id}, professor {professor_id})...")
+
+    def fonte(api_agendamentos):
+        if watermark is None:
+            return getDadosPaginados(api_agendamentos, **parametros)
+        return _agendamentos_desde(getDadosPaginados(api_agendamentos, sort="inicio,desc", **parametros), watermark)
+
+    if config.AGENDAMENTOS_INCLUIR_FALTAS:
+        agendamentos_filtrados = _intercalar({
+            STATUS_EXECUTOU: fonte(getAgendamentosExecutados),
+            STATUS_FALTOU: fonte(getAgendamentosFaltaram),
+        }, filtro=_evento_filtrado)
+    else:
+        agendamentos_filtrados = filter(_evento_filtrado, fonte(getAgendamentosExecutados))
+
+    agendamentos = []
+    for agendamento in agendamentos_filtrados:
+        if unidade is not None:
+            agendamento = {**agendamento, 'unidade': unidade}
+        agendamentos.append(agendamento)
+    return agendamentos, watermark is not None
 
-        # A coleta para quando a API não retorna mais conteúdo na lista 'content'.
-        if not content:
-            print("Fim da coleta de dados na API.")
-            break
-            
-        pagina_atual += 1
 #Função pra pegar os agendamentos filtrados por eventos         
-def getAgendamentosFiltrados():
-    eventos_filtros = ["Aula Experimental", "Primeiro Treino sem A.E", "Primeiro Treino com A.E"]
+# Com um HistoricoAgendamentos (estado.py) que já tem watermark, a coleta é incremental:
+# só as páginas com agendamentos a partir do último 'inicio' processado são buscadas,
+# e só os (matricula, evento) novos ou mais recentes são devolvidos.
+# Com várias unidades/professores (config.EMPRESA_IDS e PROFESSOR_IDS), cada par é coletado
+# em paralelo, e o resultado é uma lista só, na ordem do config. O tempo total fica perto
+# do da unidade mais lenta, e não da soma de todas.
+@metricas.medir()
+def getAgendamentosFiltrados(historico=None):
+    pares = _unidades_professores()
+    varias_unidades = len(config.EMPRESA_IDS) > 1
+
+    def coletar(par):
+        empresa_id, professor_id = par
+        unidade = str(empresa_id) if varias_unidades else None
+        return _coletar_agendamentos(empresa_id, professor_id, unidade, historico)
+
+    if len(pares) == 1:
+        resultados = [coletar(pares[0])]
+    else:
+        print(f"Coletando {len(pares)} pares de unidade/professor em paralelo...")
+        with ThreadPoolExecutor(max_workers=min(len(pares), config.PACTO_UNIDADES_EM_PARALELO)) as executor:
+            resultados = list(executor.map(coletar, pares))
 
-    agendamentos_filtrados = [ 
-                          agendamento for agendamento in getDadosPaginados(getAgendamentosExecutados)
-                          if agendamento.get('evento') in eventos_filtros
-                          ]
+    agendamentos_filtrados = [agendamento for agendamentos, _ in resultados for agendamento in agendamentos]
     print(f"Coleta finalizada! Total bruto coletado: {len(agendamentos_filtrados)}")
+
+    if any(incremental for _, incremental in resultados):
+        agendamentos_filtrados = historico.filtrar_novos(agendamentos_filtrados)
+        print(f"   {len(agendamentos_filtrados)} agendamentos novos desde a última execução.")
+
     return agendamentos_filtrados
 
 #Função pra conectar com a planilha de mkt
 #Retorna um DF bruto, lógica de limpeza será feita no transform
-def get_leads():
+# Tratamento de Cabeçalhos Duplicados (ex: 'Origem' e 'Origem' viram 'Origem' e 'Origem_2')
+def _cabecalhos_unicos(headers):
+    new_headers = []
+    seen_headers = {}
+    
+    for h in headers:
+        if h in seen_headers:
+            seen_headers[h] += 1
+            new_headers.append(f"{h}_{seen_headers[h]}")
+        else:
+            seen_headers[h] = 1
+            new_headers.append(h)
+    return new_headers
+
+# Baixa as colunas (posições 0..n-1) da linha 'inicio' até o fim da aba, num batch_get só,
+# e junta de volta em linhas. Colunas mais curtas (células vazias no fim) são completadas com ''.
+def _ler_colunas(worksheet, posicoes, inicio):
+    intervalos = []
+    for posicao in posicoes:
+        letra = rowcol_to_a1(1, posicao + 1)[:-1]
+        intervalos.append(f"{letra}{inicio}:{letra}")
+    respostas = worksheet.batch_get(intervalos)
+    colunas = [[celulas[0] if celulas else '' for celulas in resposta] for resposta in respostas]
+    total = max((len(coluna) for coluna in colunas), default=0)
+    colunas = [coluna + [''] * (total - len(coluna)) for coluna in colunas]
+    return [list(linha) for linha in zip(*colunas)]
+
+# Com 'sessao' (SessaoGoogleSheets) reaproveita a autenticação do resto do pipeline.
+# Com 'colunas', só essas colunas são baixadas (pelos nomes, já sem duplicados).
+# Com 'historico' (estado.HistoricoLeads) e incremental=True, só as linhas novas e as
+# últimas LEADS_LINHAS_REVISAO linhas já lidas são baixadas; o resto vem do estado local.
+@metricas.medir()
+def get_leads(sessao=None, colunas=None, historico=None, incremental=True):
 
     print(" Conectando a planilha de mkt...")
     
-    caminho_credenciais = Path(__file__).parent.parent / config.GOOGLE_JSON_FILE
+    if sessao is None:
+        sessao = SessaoGoogleSheets()
     
     try:
-        gc = gspread.service_account(filename=str(caminho_credenciais))
-        sh = gc.open_by_key(config.GOOGLE_SHEETS_MKT)
-        worksheet = sh.worksheet("Diária")
+        worksheet, _ = sessao.aba(config.GOOGLE_SHEETS_MKT, "Diária")
+        if worksheet is None:
+            return pd.DataFrame()
         
-        # Leitura bruta (Lista de Listas)
-        rows = worksheet.get_all_values()
+        headers = worksheet.row_values(1)
         
-        if not rows:
+        if not headers:
             print(" Erro: Planilha vazia.")
             return pd.DataFrame()
 
-        # Tratamento de Cabeçalhos Duplicados (ex: 'Origem' e 'Origem')
-        headers = rows[0]
-        new_headers = []
-        seen_headers = {}
+        new_headers = _cabecalhos_unicos(headers)
+        posicoes = [i for i, h in enumerate(new_headers) if colunas is None or h in colunas]
+        cabecalho = [new_headers[i] for i in posicoes]
         
-        for h in headers:
-            if h in seen_headers:
-                seen_headers[h] += 1
-                new_headers.append(f"{h}_{seen_headers[h]}")
-            else:
-                seen_headers[h] = 1
-                new_headers.append(h)
+        inicio = 2
+        if historico is not None and incremental and historico.cabecalho() == cabecalho:
+            inicio = max(2, historico.ultima_linha() - config.LEADS_LINHAS_REVISAO + 1)
+        
+        rows = _ler_colunas(worksheet, posicoes, inicio)
+        
+        # A primeira linha da janela tem que bater com a guardada; se não bate, linhas
+        # foram apagadas/inseridas mais acima e a cópia local não vale mais
+        if inicio > 2 and (not rows or rows[0] != historico.linha(inicio)):
+            print(" Aviso: linhas antigas da planilha de mkt mudaram, baixando a aba inteira.")
+            inicio = 2
+            rows = _ler_colunas(worksheet, posicoes, inicio)
+        
+        if historico is None:
+            return pd.DataFrame(rows, columns=cabecalho)
+        
+        print(f" {len(rows)} linhas lidas da planilha de mkt a partir da linha {inicio}.")
+        historico.substituir(cabecalho, inicio, rows)
         
         # Retorna o DataFrame Bruto
-        return pd.DataFrame(rows[1:], columns=new_headers)
+        return pd.DataFrame(historico.listar(), columns=cabecalho)
 
     except Exception as e:
         print(f" Erro ao ler planilha: {e}")
         return pd.DataFrame()
     
-#Busca todos os alunos ativos  
-def get_todos_contratos_ativos():
-    
-    url = f"{config.URL_BASE}/psec/alunos/v2"
-    headers = config.HEADERS.copy()
-    headers["empresaId"] = (config.EMPRESA_ID)
-    
+# Converte uma lista de inteiros (com possíveis None) para o tipo inteiro do pandas,
+# mantendo a lista original se a API mandar algo que não seja número
+def _coluna_inteira(valores):
+    try:
+        return pd.array(valores, dtype="Int64")
+    except (TypeError, ValueError):
+        return valores
+
+# Busca uma página de alunos ativos. Levanta exceção se a API não responder 200.
+def _buscar_pagina_contratos(pagina, tamanho_pagina, empresa_id=None):
     filtro_json = json.dumps({"situacoesEnuns": ["AT"]})
     params = {
         "filters": filtro_json,
-        "page": 0,
-        "size": 1000, 
+        "page": pagina,
+        "size": tamanho_pagina, 
         "sort": "id,DESC", 
         "incluirAutorizado": "false"
     }
     
-    try:
-        resp = requests.get(url, headers=headers, params=params, timeout=20)
-        if resp.status_code == 200:
-            dados = resp.json().get('content', [])
-            print(f" Sucesso! {len(dados)} contratos encontrados.")
-            return dados
+    headers = {"empresaId": str(empresa_id)} if empresa_id is not None else None
+    resp = pacto.cliente().get("/psec/alunos/v2", params=params, headers=headers)
+    if resp.status_code != 200:
+        raise requests.HTTPError(f"Erro na API: {resp.status_code} (página {pagina})")
+    return resp.json()
+
+#Busca todos os alunos ativos, página por página.
+# A primeira página diz quantas páginas existem (totalPages), e as outras são buscadas em paralelo.
+# Com várias unidades (config.EMPRESA_IDS), os alunos de cada uma são buscados ao mesmo tempo
+# e juntados na ordem do config.
+# Retorna um DataFrame só com as colunas usadas no transform (nome, plano, dataMatriculaZW, matriculaZW),
+# em vez de guardar o JSON completo de cada aluno. Com várias unidades vem também a 'empresaId'
+# de cada contrato, para buscar o horário de matrícula na unidade certa.
+@metricas.medir()
+def get_todos_contratos_ativos(tamanho_pagina=1000, max_workers=config.PACTO_MAX_WORKERS):
+
+    nomes_colunas = ["nome", "plano", "dataMatriculaZW", "matriculaZW"]
+
+    def coletar_unidade(empresa_id):
+        colunas = {coluna: [] for coluna in nomes_colunas}
+        colunas["empresaId"] = []
+
+        # Cada página é convertida para colunas assim que chega, e o JSON dela pode ser descartado
+        def acumular(pagina):
+            for c in pagina.get('content', []):
+                colunas["nome"].append(c.get('nome'))
+                colunas["plano"].append((c.get('planoZW') or {}).get('nome'))
+                colunas["dataMatriculaZW"].append(c.get('dataMatriculaZW'))
+                colunas["matriculaZW"].append(c.get('matriculaZW'))
+                colunas["empresaId"].append(empresa_id)
+            return len(pagina.get('content', []))
+
+        primeira = _buscar_pagina_contratos(0, tamanho_pagina, empresa_id)
+        recebidos = acumular(primeira)
+
+        total_paginas = primeira.get('totalPages')
+        if total_paginas is None and primeira.get('totalElements') is not None:
+            total_paginas = -(-primeira['totalElements'] // tamanho_pagina)
+
+        if total_paginas is not None:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # O map devolve as páginas na ordem, então a ordenação "id,DESC" é mantida
+                paginas = executor.map(
+                    lambda p: _buscar_pagina_contratos(p, tamanho_pagina, empresa_id),
+                    range(1, total_paginas)
+                )
+                for pagina in paginas:
+                    acumular(pagina)
         else:
-            print(f" Erro na API: {resp.status_code}")
-            return []
+            # Sem totalPages na resposta, segue página por página até vir uma incompleta
+            pagina_atual = 0
+            while recebidos == tamanho_pagina and not primeira.get('last', False):
+                pagina_atual += 1
+                primeira = _buscar_pagina_contratos(pagina_atual, tamanho_pagina, empresa_id)
+                recebidos = acumular(primeira)
+        return colunas
+
+    try:
+        unidades = config.EMPRESA_IDS if len(config.EMPRESA_IDS) > 1 else [None]
+        with ThreadPoolExecutor(max_workers=min(len(unidades), config.PACTO_UNIDADES_EM_PARALELO)) as executor:
+            por_unidade = list(executor.map(coletar_unidade, unidades))
+
     except Exception as e:
+        # Melhor não devolver nada do que uma lista pela metade, que marcaria vendas como 'NÃO'
         print(f" Erro crítico na extração de contratos: {e}")
-        return []
- #Busca o horario de fechamento de um contrato com base na matricula   
-def get_horario_matricula(matricula):
-    url = f"{config.URL_BASE}/v1/cliente"
-    headers = config.HEADERS.copy()
-    headers["empresaId"] = (config.EMPRESA_ID) 
+        return pd.DataFrame(columns=nomes_colunas)
 
+    colunas = {coluna: [valor for unidade in por_unidade for valor in unidade[coluna]] for coluna in nomes_colunas}
+
+    df_contratos = pd.DataFrame({
+        "nome": colunas["nome"],
+        "plano": pd.Categorical(colunas["plano"]),
+        "dataMatriculaZW": pd.to_numeric(pd.Series(colunas["dataMatriculaZW"], dtype=object), errors="coerce"),
+        "matriculaZW": _coluna_inteira(colunas["matriculaZW"]),
+    })
+    if len(unidades) > 1:
+        df_contratos["empresaId"] = pd.Categorical([valor for unidade in por_unidade for valor in unidade["empresaId"]])
+    print(f" Sucesso! {len(df_contratos)} contratos encontrados.")
+    return df_contratos
+
+ #Busca o horario de fechamento de um contrato com base na matricula   
+# Levanta exceção em caso de falha, para quem chama saber diferenciar erro de "sem horário"
+# 'empresa_id' consulta a matrícula nessa unidade (header empresaId); sem ele vale a do config.HEADERS.
+def _consultar_horario_matricula(matricula, empresa_id=None):
     params = {
         "matricula": matricula,
         "page": 0,
         "size": 10
     }
+    headers = {"empresaId": str(empresa_id)} if empresa_id is not None else None
+    response = pacto.cliente().get("/v1/cliente", params=params, headers=headers)
+    if response.status_code != 200:
+        raise requests.HTTPError(f"status {response.status_code}")
+
+    conteudo = response.json().get('content', [])
+    if conteudo:
+        return conteudo[0].get('clienteSintetico', {}).get('dia')
+    return None
+
+@metricas.medir()
+def get_horario_matricula(matricula):
     try:
-        response = requests.get(url, headers=headers, params=params, timeout=10)
-        if response.status_code == 200:
-            conteudo = response.json().get('content', [])
-            if conteudo:
-                return conteudo[0].get('clienteSintetico', {}).get('dia')
+        return _consultar_horario_matricula(matricula)
     except Exception as e:
         print(f"   [Aviso] Falha ao buscar hora para matrícula {matricula}: {e}")
-    return None
\ No newline at end of file
+    return None
+
+# Versão em lote do get_horario_matricula: remove as matrículas repetidas/vazias,
+# olha primeiro o cache local e consulta só o que faltar em paralelo,
+# com um número limitado de threads (no cliente compartilhado da Pacto).
+# As matrículas podem vir como cache.chave_horario ("unidade:matricula"), e aí a consulta é
+# feita na unidade do contrato.
+# Retorna um dict {matricula: dia}, com None para quem não teve horário encontrado.
+@metricas.medir()
+def get_horarios_matriculas(matriculas, max_workers=config.PACTO_MAX_WORKERS, usar_cache=True):
+    unicas = list(dict.fromkeys(m for m in matriculas if not pd.isna(m)))
+
+    if not unicas:
+        return {}
+
+    cache_horarios = CacheHorarios() if usar_cache else None
+    horarios = cache_horarios.buscar(unicas) if cache_horarios else {}
+    faltantes = [m for m in unicas if m not in horarios]
+
+    if faltantes:
+        print(f"Buscando horário de fechamento de {len(faltantes)} matrículas em paralelo...")
+
+        # Erros não vão para o cache, só as respostas de verdade da API (inclusive "sem horário")
+        def consultar(matricula):
+            try:
+                unidade, numero = separar_chave_horario(matricula)
+                return matricula, _consultar_horario_matricula(numero, unidade), True
+            except Exception as e:
+                print(f"   [Aviso] Falha ao buscar hora para matrícula {matricula}: {e}")
+                return matricula, None, False
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            resultados = list(executor.map(consultar, faltantes))
+
+        horarios.update({m: dia for m, dia, _ in resultados})
+        if cache_horarios:
+            cache_horarios.gravar({m: dia for m, dia, sucesso in resultados if sucesso})
+
+    if cache_horarios:
+        print(cache_horarios.resumo())
+        cache_horarios.fechar()
+
+    return horarios
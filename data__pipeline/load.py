@@ -1,6 +1,9 @@
 import gspread
 import pandas as pd
 from . import config
+from .sheets import SessaoGoogleSheets
+from .armazem import ArmazemSQLite
+from . import metricas
 
 def connect_google_sheets():
     try:
@@ -9,63 +12,384 @@ def connect_google_sheets():
         print(f"ERRO: Falha na autenticação do Google: {e}")
         return None
   
-def save_in_database(df, nome_da_aba="Historico"):
+# Chaves de dedup de cada aba. Abas fora daqui (ex.: MKT_CLONE) são sempre regravadas inteiras.
+CHAVES_POR_ABA = {
+    'VENDAS_MKT': ['ALUNO'],
+    'RELATORIO_FINAL': ['ALUNO'],
+    'HISTORICO': ['MATRICULA', 'TIPO DE TREINO'],
+}
+
+# Chaves da aba para este df: com a coluna UNIDADE (várias unidades), a mesma matrícula
+# pode aparecer em mais de uma unidade, então a unidade entra na chave
+def _chaves(nome_da_aba, df):
+    chaves = CHAVES_POR_ABA.get(nome_da_aba)
+    if chaves and 'UNIDADE' in df.columns and 'UNIDADE' not in chaves:
+        return ['UNIDADE'] + chaves
+    return chaves
+
+# Converte o número da coluna (1, 2, ... 27) para a letra da planilha (A, B, ... AA)
+def _letra_coluna(numero):
+    letras = ""
+    while numero > 0:
+        numero, resto = divmod(numero - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+# Formato de texto das colunas de data/hora, que o transform entrega como datetime
+FORMATOS_TEXTO = {
+    'DATA': '%d/%m/%Y',
+    'HORA': '%H:%M',
+}
+
+# Tabela como vai para a planilha: tudo texto, vazio no lugar de nulo. As datas só viram
+# texto aqui, e as categóricas voltam a ser texto antes do fillna (que não aceitaria o '').
+def _em_texto(df):
+    convertidas = {}
+    for coluna in df.columns:
+        serie = df[coluna]
+        if coluna in FORMATOS_TEXTO and pd.api.types.is_datetime64_any_dtype(serie):
+            convertidas[coluna] = serie.dt.strftime(FORMATOS_TEXTO[coluna])
+        elif isinstance(serie.dtype, pd.CategoricalDtype):
+            convertidas[coluna] = serie.astype(object)
+    if convertidas:
+        df = df.assign(**convertidas)
+    return df.fillna('').astype(str)
+
+# Gera a tabela em texto, 'tamanho_bloco' linhas por vez, para enviar sem montar uma
+# cópia da aba inteira (nem em texto, nem em listas do Python)
+def _blocos_de_linhas(df, tamanho_bloco=None):
+    tamanho_bloco = tamanho_bloco or config.SHEETS_LINHAS_POR_BLOCO
+    for inicio in range(0, len(df), tamanho_bloco):
+        yield _em_texto(df.iloc[inicio:inicio + tamanho_bloco]).values.tolist()
+
+# Compara o df com o que já está na aba pelas chaves e devolve as atualizações em lote:
+# linhas com chave nova vão para o fim da aba, linhas com chave existente e algum valor
+# diferente são regravadas no lugar. Linhas iguais não geram escrita.
+def _calcular_delta(valores, df_limpo, chaves):
+    colunas = df_limpo.columns.values.tolist()
+    ultima_coluna = _letra_coluna(len(colunas))
+
+    df_existente = pd.DataFrame(valores[1:], columns=valores[0])
+    df_existente['_LINHA'] = range(2, len(df_existente) + 2)
+    df_existente = df_existente.drop_duplicates(subset=chaves, keep='last')
+
+    df_entrada = df_limpo.drop_duplicates(subset=chaves, keep='last')
+    juntos = df_entrada.merge(df_existente, on=chaves, how='left', suffixes=('', '_ATUAL'), indicator=True)
+
+    novos = juntos[juntos['_merge'] == 'left_only']
+    comuns = juntos[juntos['_merge'] == 'both']
+    mudou = pd.Series(False, index=comuns.index)
+    for coluna in colunas:
+        if coluna not in chaves:
+            mudou |= comuns[coluna] != comuns[coluna + '_ATUAL']
+    alterados = comuns[mudou]
+
+    atualizacoes = []
+    for linha, valores_linha in zip(alterados['_LINHA'].astype(int), alterados[colunas].values.tolist()):
+        atualizacoes.append({'range': f"A{linha}:{ultima_coluna}{linha}", 'values': [valores_linha]})
+
+    ultima_linha = len(valores)
+    if not novos.empty:
+        inicio = ultima_linha + 1
+        ultima_linha += len(novos)
+        atualizacoes.append({'range': f"A{inicio}:{ultima_coluna}{ultima_linha}", 'values': novos[colunas].values.tolist()})
+
+    return atualizacoes, len(novos), len(alterados), ultima_linha
+
+# ALTERAÇÃO 3: Limpa a planilha de qualquer lixo antes de enviar
+# A aba é redimensionada antes; em abas grandes só o cabeçalho vai junto das outras escritas
+# e as linhas vão em blocos de SHEETS_LINHAS_POR_BLOCO
+def _preparar_regravacao(sessao, chave, worksheet, df):
+    colunas = df.columns.values.tolist()
+    sessao.preparar_limpeza(chave, worksheet)
+    sessao.preparar_linhas(chave, worksheet, len(df) + 1, len(colunas))
+    if len(df) <= config.SHEETS_LINHAS_POR_BLOCO:
+        # Aba pequena cabe num bloco só: vai junto das escritas das outras abas
+        sessao.preparar_valores(chave, worksheet, 'A1', [colunas] + _em_texto(df).values.tolist())
+    else:
+        sessao.preparar_valores(chave, worksheet, 'A1', [colunas])
+        sessao.preparar_blocos(chave, worksheet, 2, _blocos_de_linhas(df))
+
+# modo='delta': compara com a aba pelas chaves de CHAVES_POR_ABA e só escreve as linhas
+#   novas (no fim) e as alteradas (no lugar), num único envio em lote (padrão).
+#   Abas sem chave, ou com colunas diferentes do df, caem no modo completo.
+# modo='completo': lê a aba, junta com o que já existe e regrava tudo.
+# modo='anexar': só acrescenta as linhas no final da aba, sem baixar o que já existe.
+#   Usado na extração incremental, quando todas as linhas são novas.
+# Com 'sessao' (SessaoGoogleSheets) as escritas ficam preparadas na sessão e só vão
+# para a planilha no sessao.enviar(), junto com as das outras abas; o retorno então
+# indica só se a preparação deu certo. Sem sessão, grava na hora como antes.
+# Retorna True se a gravação deu certo.
+@metricas.medir()
+def save_in_database(df, nome_da_aba="Historico", modo="delta", sessao=None):
   if df is None or df.empty:
     print("O df chegou vazio, nada será enviado ao banco de dados.")
-    return
+    return False
   print(f"Conectando ao 'GS', para salvar {len(df)} linhas...")
-  
-  client = connect_google_sheets()
-  
-  if not client:
-    return
-  
+
+  envio_imediato = sessao is None
+  if envio_imediato:
+    sessao = SessaoGoogleSheets()
+
+  if not sessao.cliente():
+    return False
+
+  chave = config.TP_ACADEMIA_DB_ID
+
   try:
-    
-    sheet = client.open_by_key(config.TP_ACADEMIA_DB_ID)
-    
-    try:
-        worksheet = sheet.worksheet(nome_da_aba)
-        valores = worksheet.get_all_values()
-        if valores:
-            df_existente = pd.DataFrame(valores[1:], columns=valores[0])
-        else:
-            df_existente = pd.DataFrame()
-    except gspread.WorksheetNotFound:
-      print(f"Aba '{nome_da_aba}', não encontrada... Criando uma nova!")
-      worksheet = sheet.add_worksheet(title=nome_da_aba, rows=1000, cols=20)
-      df_existente = pd.DataFrame()
-      
-    df_limpo = df.fillna('')
-    df_limpo = df_limpo.astype(str)
-    
-    df_limpo = df.fillna('')
-    df_limpo = df_limpo.astype(str)
+
+    worksheet, aba_nova = sessao.aba(chave, nome_da_aba, criar=True)
+
+    colunas = df.columns.values.tolist()
+
+    if modo == 'anexar':
+        df_limpo = _em_texto(df)
+        cabecalho = [] if aba_nova else worksheet.row_values(1)
+        if not cabecalho:
+            sessao.preparar_anexo(chave, worksheet, [colunas] + df_limpo.values.tolist())
+            return sessao.enviar() if envio_imediato else True
+        if cabecalho == colunas:
+            print(f"Anexando {len(df_limpo)} linhas novas na aba '{nome_da_aba}'...")
+            sessao.preparar_anexo(chave, worksheet, df_limpo.values.tolist())
+            return sessao.enviar() if envio_imediato else True
+        # Se as colunas mudaram, não dá pra só anexar
+        print(f"Colunas da aba '{nome_da_aba}' diferentes do df, regravando a aba completa.")
+
+    # O MKT_CLONE é sempre substituído, não precisa baixar o que já está lá
+    valores = [] if aba_nova or nome_da_aba == 'MKT_CLONE' else worksheet.get_all_values()
+    chaves = _chaves(nome_da_aba, df)
+
+    if modo == 'delta' and chaves and valores:
+        if valores[0] == colunas:
+            df_limpo = _em_texto(df)
+            atualizacoes, qtd_novas, qtd_alteradas, ultima_linha = _calcular_delta(valores, df_limpo, chaves)
+            if not atualizacoes:
+                print(f"Aba '{nome_da_aba}' já está atualizada, nada para enviar.")
+                return sessao.enviar() if envio_imediato else True
+            sessao.preparar_linhas(chave, worksheet, ultima_linha)
+            print(f"Aba '{nome_da_aba}': {qtd_novas} linhas novas e {qtd_alteradas} alteradas.")
+            for atualizacao in atualizacoes:
+                sessao.preparar_valores(chave, worksheet, atualizacao['range'], atualizacao['values'])
+            return sessao.enviar() if envio_imediato else True
+        print(f"Colunas da aba '{nome_da_aba}' diferentes do df, regravando a aba completa.")
+
+    if valores:
+        df_existente = pd.DataFrame(valores[1:], columns=valores[0])
+    else:
+        df_existente = pd.DataFrame()
     
     # Só concatena se a aba NÃO for o MKT_CLONE
     if not df_existente.empty and nome_da_aba != 'MKT_CLONE':
-        df_existente = df_existente.reindex(columns=df_limpo.columns).fillna('').astype(str)
-        df_combinado = pd.concat([df_existente, df_limpo], ignore_index=True)
+        df_existente = df_existente.reindex(columns=colunas).fillna('').astype(str)
+        df_combinado = pd.concat([df_existente, _em_texto(df)], ignore_index=True)
+        del df_existente
         
         # Aproveitei e criei subsets seguros para as outras abas não incharem também!
-        if nome_da_aba == 'VENDAS_MKT':
-            df_combinado = df_combinado.drop_duplicates(subset=['ALUNO'], keep='last')
-        elif nome_da_aba == 'RELATORIO_FINAL':
-            df_combinado = df_combinado.drop_duplicates(subset=['ALUNO'], keep='last')
-        elif nome_da_aba == 'HISTORICO':
-            df_combinado = df_combinado.drop_duplicates(subset=['MATRICULA', 'TIPO DE TREINO'], keep='last')
+        if chaves:
+            df_combinado = df_combinado.drop_duplicates(subset=chaves, keep='last')
         else:
             df_combinado = df_combinado.drop_duplicates(keep='last')
     else:
         # Se for MKT_CLONE, ignora o histórico e apenas clona a versão mais recente!
-        df_combinado = df_limpo
-        
-    dados_para_enviar = [df_combinado.columns.values.tolist()] + df_combinado.values.tolist()
-            
-    # ALTERAÇÃO 3: Limpa a planilha de qualquer lixo antes de enviar
-    worksheet.clear()
-    worksheet.update(range_name='A1', values=dados_para_enviar)
+        # (a conversão para texto fica para cada bloco, na hora do envio)
+        df_combinado = df
+    del valores
+
+    _preparar_regravacao(sessao, chave, worksheet, df_combinado)
+    return sessao.enviar() if envio_imediato else True
       
   except Exception as e:
     print(f"ERRO ao salvar a planilha: {e}")
-    
+    return False
+
+# Clona a aba 'nome_origem' da planilha 'chave_origem' (ex.: a "Diária" do marketing) na aba
+# 'nome_da_aba' do banco, direto no Google, sem passar os dados pelo pipeline.
+# Com 'sessao' a cópia vai junto do sessao.enviar(), como no save_in_database.
+@metricas.medir()
+def clone_in_database(chave_origem, nome_origem, nome_da_aba="MKT_CLONE", sessao=None):
+  envio_imediato = sessao is None
+  if envio_imediato:
+    sessao = SessaoGoogleSheets()
+
+  if not sessao.cliente():
+    return False
+
+  try:
+    origem, _ = sessao.aba(chave_origem, nome_origem)
+    destino, _ = sessao.aba(config.TP_ACADEMIA_DB_ID, nome_da_aba, criar=True)
+    print(f"Clonando a aba '{nome_origem}' em '{nome_da_aba}'...")
+    sessao.preparar_copia(config.TP_ACADEMIA_DB_ID, origem, destino)
+    return sessao.enviar() if envio_imediato else True
+
+  except Exception as e:
+    print(f"ERRO ao clonar a aba: {e}")
+    return False
+
+# Agrupa as linhas da planilha em sequências contínuas, para gravar cada sequência num intervalo só
+def _sequencias(linhas):
+    sequencias = []
+    for posicao, linha in enumerate(linhas):
+        if sequencias and linha == sequencias[-1][1] + 1:
+            sequencias[-1][1] = linha
+            sequencias[-1][2].append(posicao)
+        else:
+            sequencias.append([linha, linha, [posicao]])
+    return sequencias
+
+# Primeira gravação de uma aba no armazém: se a aba do Google já tem dados (ex.: instalação que
+# vinha usando LOAD_BACKEND=sheets), eles entram antes no armazém, na ordem da planilha, para a
+# exportação não apagar o histórico. Se a aba tinha chaves repetidas as linhas do armazém não
+# batem mais com as da planilha, e a aba fica para ser regravada inteira (já com o histórico).
+def _semear_armazem(sessao, armazem, nome_da_aba, chaves):
+    worksheet, aba_nova = sessao.aba(config.TP_ACADEMIA_DB_ID, nome_da_aba, criar=True)
+    valores = [] if aba_nova else worksheet.get_all_values()
+    if len(valores) < 2:
+        return
+    cabecalho = valores[0]
+    if len(set(cabecalho)) != len(cabecalho):
+        raise ValueError(f"a aba '{nome_da_aba}' tem colunas repetidas no cabeçalho")
+    existente = pd.DataFrame(valores[1:], columns=cabecalho)
+    # Chave que a aba ainda não tinha (ex.: UNIDADE) fica vazia nas linhas antigas
+    for coluna in chaves:
+        if coluna not in existente.columns:
+            existente[coluna] = ''
+    _, qtd_novas, _ = armazem.gravar(nome_da_aba, existente, chaves)
+    armazem.marcar_exportada(nome_da_aba, qtd_novas == len(existente) and list(existente.columns) == cabecalho)
+    print(f"Armazém '{nome_da_aba}': {qtd_novas} linhas trazidas da aba do Google.")
+
+# Leva para a aba do Google o que mudou no armazém. A aba é regravada inteira (sem baixar
+# nada) quando é nova, quando não tem chave, no modo 'completo' ou quando a última exportação
+# não foi confirmada; senão só as linhas de 'mudancas' são gravadas, cada uma na sua '_linha'.
+# A aba fica marcada como não exportada até o DestinoArmazem confirmar o envio.
+def _exportar_do_armazem(sessao, armazem, nome_da_aba, mudancas, completo=False):
+  chave = config.TP_ACADEMIA_DB_ID
+  worksheet, aba_nova = sessao.aba(chave, nome_da_aba, criar=True)
+  regravar = mudancas is None or completo or aba_nova or not armazem.exportada(nome_da_aba)
+  armazem.marcar_exportada(nome_da_aba, False)
+
+  if regravar:
+    df = armazem.ler(nome_da_aba)
+    print(f"Exportando a aba '{nome_da_aba}' inteira do armazém ({len(df)} linhas)...")
+    _preparar_regravacao(sessao, chave, worksheet, df)
+    return
+
+  if mudancas.empty:
+    print(f"Aba '{nome_da_aba}' já está igual ao armazém, nada para exportar.")
+    return
+
+  colunas = [c for c in mudancas.columns if c != '_linha']
+  ultima_coluna = _letra_coluna(len(colunas))
+  valores = _em_texto(mudancas[colunas]).values.tolist()
+  sessao.preparar_linhas(chave, worksheet, int(mudancas['_linha'].max()))
+  for inicio, fim, posicoes in _sequencias(mudancas['_linha'].astype(int).tolist()):
+    sessao.preparar_valores(chave, worksheet, f"A{inicio}:{ultima_coluna}{fim}", [valores[p] for p in posicoes])
+
+# Grava o df na tabela 'nome_da_aba' do armazém local (armazem.ArmazemSQLite): abas com chave
+# em CHAVES_POR_ABA recebem upsert (só as linhas novas e alteradas são escritas) e as demais
+# são substituídas. Os modos 'delta', 'anexar' e 'completo' dão no mesmo no armazém; o
+# 'completo' só obriga a exportação a regravar a aba inteira.
+# Com 'sessao', a aba do Google é preparada como exportação do armazém (vai no sessao.enviar()).
+# Retorna True se a gravação deu certo.
+@metricas.medir()
+def save_in_armazem(df, nome_da_aba="Historico", modo="delta", armazem=None, sessao=None):
+  if df is None or df.empty:
+    print("O df chegou vazio, nada será gravado no armazém.")
+    return False
+
+  armazem_proprio = armazem is None
+  if armazem_proprio:
+    armazem = ArmazemSQLite()
+
+  try:
+    chaves = _chaves(nome_da_aba, df)
+    df = _em_texto(df)
+    if chaves and sessao is not None and not armazem.colunas(nome_da_aba):
+      try:
+        _semear_armazem(sessao, armazem, nome_da_aba, chaves)
+      except Exception as e:
+        # Sem o histórico da aba no armazém, a exportação apagaria o que já está no Google
+        print(f"ERRO ao trazer a aba '{nome_da_aba}' do Google para o armazém: {e}")
+        return False
+    try:
+      if chaves:
+        mudancas, qtd_novas, qtd_alteradas = armazem.gravar(nome_da_aba, df, chaves)
+        print(f"Armazém '{nome_da_aba}': {qtd_novas} linhas novas e {qtd_alteradas} alteradas.")
+      else:
+        armazem.substituir(nome_da_aba, df)
+        mudancas = None
+        print(f"Armazém '{nome_da_aba}': {len(df)} linhas gravadas.")
+    except Exception as e:
+      print(f"ERRO ao gravar no armazém: {e}")
+      return False
+
+    if sessao is not None:
+      try:
+        _exportar_do_armazem(sessao, armazem, nome_da_aba, mudancas, completo=modo == 'completo')
+      except Exception as e:
+        # Os dados já estão no armazém; a aba fica para ser regravada inteira na próxima exportação
+        print(f"ERRO ao preparar a exportação da aba '{nome_da_aba}': {e}")
+        return False
+    return True
+
+  finally:
+    if armazem_proprio:
+      armazem.fechar()
+
+# Destinos do load, escolhidos pelo LOAD_BACKEND (criar_destino). Os dois têm a mesma interface:
+# gravar(df, nome_da_aba, modo) prepara a gravação de uma aba, finalizar() manda o que ficou
+# pendente e diz se os dados estão gravados, e fechar() libera o que estiver aberto.
+# 'exporta_sheets' diz se alguma coisa vai para o Google (ex.: o MKT_CLONE só faz sentido assim).
+class DestinoSheets:
+
+    exporta_sheets = True
+
+    def __init__(self, sessao):
+        self.sessao = sessao
+
+    def gravar(self, df, nome_da_aba, modo="delta"):
+        return save_in_database(df, nome_da_aba=nome_da_aba, modo=modo, sessao=self.sessao)
+
+    def finalizar(self):
+        return self.sessao.enviar()
+
+    def fechar(self):
+        pass
+
+# O armazém é a fonte da verdade: finalizar() dá certo mesmo se a exportação para o Google
+# falhar, e as abas que não foram confirmadas são regravadas inteiras na próxima exportação.
+class DestinoArmazem:
+
+    def __init__(self, armazem, sessao=None):
+        self.armazem = armazem
+        self.sessao = sessao
+        self.exporta_sheets = sessao is not None
+        self._exportadas = []
+
+    def gravar(self, df, nome_da_aba, modo="delta"):
+        gravado = save_in_armazem(df, nome_da_aba=nome_da_aba, modo=modo, armazem=self.armazem, sessao=self.sessao)
+        if gravado and self.sessao is not None:
+            self._exportadas.append(nome_da_aba)
+        return gravado
+
+    def finalizar(self):
+        if self.sessao is None:
+            return True
+        if self.sessao.enviar():
+            for nome_da_aba in self._exportadas:
+                self.armazem.marcar_exportada(nome_da_aba)
+        else:
+            print("Aviso: a exportação para o Google Sheets falhou; os dados estão no armazém local.")
+        self._exportadas = []
+        return True
+
+    def fechar(self):
+        self.armazem.fechar()
+
+def criar_destino(sessao=None, backend=None):
+    backend = backend or config.LOAD_BACKEND
+    if backend == 'sheets':
+        return DestinoSheets(sessao or SessaoGoogleSheets())
+    if backend == 'sqlite':
+        exportar = config.ARMAZEM_EXPORTAR_SHEETS
+        return DestinoArmazem(ArmazemSQLite(), (sessao or SessaoGoogleSheets()) if exportar else None)
+    raise ValueError(f"LOAD_BACKEND desconhecido: '{backend}' (use 'sheets' ou 'sqlite')")
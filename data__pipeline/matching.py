@@ -0,0 +1,315 @@
+import re
+import unicodedata
+
+import numpy as np
+from rapidfuzz import process, fuzz
+
+from . import config
+
+# Limite de células da matriz de scores calculada de uma vez (float32 -> ~80MB).
+# Acima disso as consultas são divididas em blocos de linhas.
+_MAX_CELULAS_MATRIZ = 20_000_000
+
+# Baldes com até esse número de nomes nunca são descartados pelo MATCH_BALDE_MAXIMO
+# (em listas pequenas a varredura é barata de qualquer jeito)
+_BALDE_MINIMO = 200
+
+# Mesma padronização usada no cruzamento: maiúsculo e sem espaços nas pontas
+def normalizar_nomes(nomes):
+    return [str(nome).upper().strip() for nome in nomes]
+
+# Calcula de uma vez (process.cdist, usando todos os núcleos) o score de todas as
+# consultas contra todas as escolhas e devolve, para cada consulta, o índice da
+# melhor escolha com score >= corte (-1 quando não tem) e o score dela.
+# Em caso de empate fica a primeira escolha, igual ao process.extractOne.
+def melhores_matches(consultas, escolhas, corte=85, scorer=fuzz.token_set_ratio, processor=None):
+    indices = np.full(len(consultas), -1, dtype=np.int64)
+    scores = np.zeros(len(consultas), dtype=np.float64)
+
+    if not len(consultas) or not len(escolhas):
+        return indices, scores
+
+    linhas_por_bloco = max(1, _MAX_CELULAS_MATRIZ // len(escolhas))
+
+    for inicio in range(0, len(consultas), linhas_por_bloco):
+        bloco = consultas[inicio:inicio + linhas_por_bloco]
+        matriz = process.cdist(
+            bloco, escolhas,
+            scorer=scorer, processor=processor,
+            score_cutoff=corte, dtype=np.float32, workers=-1
+        )
+
+        melhores = matriz.argmax(axis=1)
+        melhor_score = matriz[np.arange(len(bloco)), melhores]
+        # Scores abaixo do corte voltam como 0 do cdist
+        achou = (melhor_score >= corte) & (melhor_score > 0)
+
+        fim = inicio + len(bloco)
+        indices[inicio:fim] = np.where(achou, melhores, -1)
+        scores[inicio:fim] = np.where(achou, melhor_score, 0.0)
+
+    return indices, scores
+
+
+# Para cada consulta, as k melhores escolhas com score >= corte, em ordem de score
+# (empates pela posição, igual ao process.extract). Tudo sai de uma matriz do cdist:
+# índices (n, k) com -1 onde não tem candidato suficiente, e os scores correspondentes.
+def top_k_matches(consultas, escolhas, k=3, corte=85, scorer=fuzz.token_set_ratio, processor=None):
+    indices = np.full((len(consultas), k), -1, dtype=np.int64)
+    scores = np.zeros((len(consultas), k), dtype=np.float64)
+
+    if not len(consultas) or not len(escolhas):
+        return indices, scores
+
+    linhas_por_bloco = max(1, _MAX_CELULAS_MATRIZ // len(escolhas))
+
+    for inicio in range(0, len(consultas), linhas_por_bloco):
+        bloco = consultas[inicio:inicio + linhas_por_bloco]
+        matriz = process.cdist(
+            bloco, escolhas,
+            scorer=scorer, processor=processor,
+            score_cutoff=corte, dtype=np.float32, workers=-1
+        )
+
+        # Só interessam os pares acima do corte (o resto volta como 0 do cdist)
+        linhas, colunas = np.nonzero((matriz >= corte) & (matriz > 0))
+        _preencher_top_k(indices, scores, linhas, colunas, matriz[linhas, colunas], primeira=inicio)
+
+    return indices, scores
+
+# Grava em indices/scores (n, k), a partir da linha 'primeira', as k melhores colunas de cada
+# linha entre os pares (linha, coluna, score), em ordem de score e, no empate, de coluna
+# (igual ao process.extract)
+def _preencher_top_k(indices, scores, linhas, colunas, valores, primeira=0):
+    ordem = np.lexsort((colunas, -valores, linhas))
+    linhas, colunas, valores = linhas[ordem], colunas[ordem], valores[ordem]
+    inicio_linha = np.searchsorted(linhas, linhas, side='left')
+    rank = np.arange(len(linhas)) - inicio_linha
+    dentro = rank < indices.shape[1]
+
+    indices[primeira + linhas[dentro], rank[dentro]] = colunas[dentro]
+    scores[primeira + linhas[dentro], rank[dentro]] = valores[dentro]
+
+# Palavras que não ajudam a separar nomes (aparecem em quase todos)
+_PARTICULAS = {"DA", "DE", "DO", "DAS", "DOS", "DI", "DU", "E"}
+
+# Regras de som para nomes em português, aplicadas em ordem (depois de tirar os acentos).
+# Ex: CAMILA/KAMILA, LUÍS/LUIZ, GONÇALVES/GONSALVES, MARCIA/MARSIA, THAIS/TAIS caem na mesma chave.
+_REGRAS_FONETICAS = [
+    (re.compile(r"PH"), "F"),
+    (re.compile(r"TH"), "T"),
+    (re.compile(r"[CS]H"), "X"),
+    (re.compile(r"LH"), "L"),
+    (re.compile(r"NH"), "N"),
+    (re.compile(r"SC(?=[EI])"), "S"),
+    (re.compile(r"QU(?=[EI])"), "K"),
+    (re.compile(r"GU(?=[EI])"), "G"),
+    (re.compile(r"G(?=[EI])"), "J"),
+    (re.compile(r"C(?=[EI])"), "S"),
+    (re.compile(r"[CQ]"), "K"),
+    (re.compile(r"Z"), "S"),
+    (re.compile(r"Y"), "I"),
+    (re.compile(r"W"), "V"),
+    (re.compile(r"H"), ""),
+    (re.compile(r"N$"), "M"),
+    (re.compile(r"(.)\1+"), r"\1"),
+]
+
+def _sem_acentos(texto):
+    # O Ç vira S antes, senão viraria C (e depois K)
+    texto = str(texto).upper().replace("Ç", "S")
+    return "".join(c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c))
+
+# Tokens de um nome que servem para agrupar: sem acento, sem partículas e sem iniciais soltas
+def tokens_nome(nome):
+    return [t for t in re.findall(r"[A-Z0-9]+", _sem_acentos(nome)) if len(t) > 1 and t not in _PARTICULAS]
+
+# Chave fonética simplificada de uma palavra (pensada para nomes em português)
+def chave_fonetica(token):
+    for padrao, troca in _REGRAS_FONETICAS:
+        token = padrao.sub(troca, token)
+    return token
+
+# Baldes de um token: a chave fonética (que já junta todos os nomes com o mesmo token)
+# e o começo da palavra, para erros de digitação no fim (ALMEIDA/ALMEIAA)
+def _chaves_token(token):
+    chaves = ["#" + chave_fonetica(token)]
+    if len(token) > 4:
+        chaves.append("^" + token[:4])
+    return chaves
+
+def _chaves_bloco(nome):
+    return {chave for token in tokens_nome(nome) for chave in _chaves_token(token)}
+
+# Índice de nomes para o fuzzy matching. Cada nome entra nos "baldes" das chaves fonéticas
+# e do começo (4 letras) dos seus tokens (primeiro nome, sobrenomes). Uma consulta só é comparada
+# com os nomes que dividem algum balde com ela, em vez da lista inteira.
+# Baldes de tokens muito comuns (SILVA, MARIA), com mais de MATCH_BALDE_MAXIMO da lista,
+# quase não filtram nada e são descartados.
+# Quem não divide balde com ninguém é comparado com a lista toda (fallback), e com
+# usar_blocos=False (ou MATCH_USAR_INDICE=0) tudo volta a ser varredura completa.
+# Os índices devolvidos são sempre posições na lista original de escolhas.
+class IndiceNomes:
+
+    def __init__(self, escolhas, usar_blocos=None, balde_maximo=None):
+        self.escolhas = list(escolhas)
+        self.usar_blocos = config.MATCH_USAR_INDICE if usar_blocos is None else usar_blocos
+        fracao = config.MATCH_BALDE_MAXIMO if balde_maximo is None else balde_maximo
+        self.balde_maximo = max(_BALDE_MINIMO, int(len(self.escolhas) * fracao))
+
+        baldes = {}
+        for posicao, nome in enumerate(self.escolhas):
+            for chave in _chaves_bloco(nome):
+                baldes.setdefault(chave, []).append(posicao)
+        self.baldes = {
+            chave: np.array(posicoes, dtype=np.int64)
+            for chave, posicoes in baldes.items() if len(posicoes) <= self.balde_maximo
+        }
+        self._colunas_por_token = {}
+
+    def __len__(self):
+        return len(self.escolhas)
+
+    # Posições (em ordem crescente) dos nomes que dividem algum balde com a consulta
+    def candidatos(self, consulta):
+        grupos = [self.baldes[chave] for chave in _chaves_bloco(consulta) if chave in self.baldes]
+        if not grupos:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(grupos))
+
+    # Posições dos nomes que dividem algum balde com o token (guardadas por token)
+    def _colunas_token(self, token):
+        colunas = self._colunas_por_token.get(token)
+        if colunas is None:
+            grupos = [self.baldes[chave] for chave in _chaves_token(token) if chave in self.baldes]
+            colunas = np.unique(np.concatenate(grupos)) if grupos else np.empty(0, dtype=np.int64)
+            self._colunas_por_token[token] = colunas
+        return colunas
+
+    # Todos os pares (consulta, escolha, score) com score >= corte entre as consultas e os seus
+    # candidatos. As consultas são agrupadas por token, e cada grupo é comparado de uma vez
+    # (process.cdist, em todos os núcleos) com os nomes dos baldes do token; um par que divide
+    # mais de um token aparece em mais de um grupo, com o mesmo score, e fica uma vez só.
+    # Retorna (linhas, colunas, scores) e as consultas sem nenhum candidato.
+    def _pares(self, consultas, corte, scorer, processor):
+        por_token = {}
+        sem_candidatos = []
+        for i, consulta in enumerate(consultas):
+            tokens = [t for t in set(tokens_nome(consulta)) if len(self._colunas_token(t))]
+            if not tokens:
+                sem_candidatos.append(i)
+            for token in tokens:
+                por_token.setdefault(token, []).append(i)
+
+        linhas, colunas, valores = [], [], []
+        for token, linhas_token in por_token.items():
+            colunas_token = self._colunas_token(token)
+            escolhas_token = [self.escolhas[p] for p in colunas_token]
+            linhas_por_bloco = max(1, _MAX_CELULAS_MATRIZ // len(colunas_token))
+            for inicio in range(0, len(linhas_token), linhas_por_bloco):
+                bloco = linhas_token[inicio:inicio + linhas_por_bloco]
+                matriz = process.cdist(
+                    [consultas[i] for i in bloco], escolhas_token,
+                    scorer=scorer, processor=processor,
+                    score_cutoff=corte, dtype=np.float32, workers=-1
+                )
+                # Só interessam os pares acima do corte (o resto volta como 0 do cdist)
+                l, c = np.nonzero((matriz >= corte) & (matriz > 0))
+                linhas.append(np.asarray(bloco, dtype=np.int64)[l])
+                colunas.append(colunas_token[c])
+                valores.append(matriz[l, c])
+
+        if not linhas:
+            vazio = np.empty(0, dtype=np.int64)
+            return vazio, vazio, np.empty(0, dtype=np.float32), sem_candidatos
+
+        linhas, colunas, valores = np.concatenate(linhas), np.concatenate(colunas), np.concatenate(valores)
+        _, unicos = np.unique(linhas * len(self.escolhas) + colunas, return_index=True)
+        return linhas[unicos], colunas[unicos], valores[unicos], sem_candidatos
+
+    # Igual ao process.extract(consulta, escolhas, limit=limite), só que olhando os candidatos
+    def extrair(self, consulta, limite=3, scorer=fuzz.token_set_ratio, processor=None, score_cutoff=None):
+        if not self.usar_blocos:
+            return process.extract(consulta, self.escolhas, scorer=scorer, processor=processor,
+                                   limit=limite, score_cutoff=score_cutoff)
+
+        posicoes = self.candidatos(consulta)
+        if not len(posicoes):
+            return process.extract(consulta, self.escolhas, scorer=scorer, processor=processor,
+                                   limit=limite, score_cutoff=score_cutoff)
+
+        resultado = process.extract(consulta, [self.escolhas[p] for p in posicoes], scorer=scorer,
+                                    processor=processor, limit=limite, score_cutoff=score_cutoff)
+        return [(nome, score, int(posicoes[i])) for nome, score, i in resultado]
+
+    # Igual ao process.extractOne(consulta, escolhas, score_cutoff=...), só que olhando os candidatos
+    def extrair_um(self, consulta, scorer=fuzz.token_set_ratio, processor=None, score_cutoff=None):
+        resultado = self.extrair(consulta, limite=1, scorer=scorer, processor=processor, score_cutoff=score_cutoff)
+        return resultado[0] if resultado else None
+
+    # As k melhores escolhas de cada consulta entre os candidatos dela (mesmo retorno do
+    # top_k_matches). Nomes repetidos nas consultas (o mesmo aluno em vários treinos) são
+    # comparados uma vez só, e quem não caiu em nenhum balde vai para a lista toda, de uma vez.
+    def _top_k(self, consultas, k, corte, scorer, processor):
+        unicas, linha_unica = np.unique(np.asarray(consultas, dtype=object), return_inverse=True)
+        unicas = unicas.tolist()
+
+        indices = np.full((len(unicas), k), -1, dtype=np.int64)
+        scores = np.zeros((len(unicas), k), dtype=np.float64)
+        linhas, colunas, valores, sem_candidatos = self._pares(unicas, corte, scorer, processor)
+        _preencher_top_k(indices, scores, linhas, colunas, valores)
+
+        if sem_candidatos:
+            idx_fallback, sc_fallback = top_k_matches([unicas[i] for i in sem_candidatos], self.escolhas,
+                                                      k=k, corte=corte, scorer=scorer, processor=processor)
+            indices[sem_candidatos] = idx_fallback
+            scores[sem_candidatos] = sc_fallback
+
+        return indices[linha_unica], scores[linha_unica]
+
+    # Versão do melhores_matches que usa o índice (mesmo retorno: índices e scores).
+    # Continua sendo uma comparação em lote (cdist): o índice só limita as colunas de cada grupo de consultas.
+    def melhores(self, consultas, corte=85, scorer=fuzz.token_set_ratio, processor=None):
+        consultas = list(consultas)
+        if not self.usar_blocos:
+            return melhores_matches(consultas, self.escolhas, corte=corte, scorer=scorer, processor=processor)
+        if not consultas:
+            return np.full(0, -1, dtype=np.int64), np.zeros(0, dtype=np.float64)
+
+        indices, scores = self._top_k(consultas, 1, corte, scorer, processor)
+        return indices[:, 0], scores[:, 0]
+
+    # Versão do top_k_matches que usa o índice (mesmo retorno), com a mesma comparação em lote
+    def melhores_k(self, consultas, k=3, corte=85, scorer=fuzz.token_set_ratio, processor=None):
+        consultas = list(consultas)
+        if not self.usar_blocos:
+            return top_k_matches(consultas, self.escolhas, k=k, corte=corte, scorer=scorer, processor=processor)
+        if not consultas:
+            return np.full((0, k), -1, dtype=np.int64), np.zeros((0, k), dtype=np.float64)
+
+        return self._top_k(consultas, k, corte, scorer, processor)
+
+    # Mede quantos dos matches da varredura completa o índice também encontra
+    # (recall), para conferir que os baldes não estão perdendo vendas.
+    def medir_recall(self, consultas, corte=85, scorer=fuzz.token_set_ratio, processor=None):
+        consultas = list(consultas)
+        idx_completo, sc_completo = melhores_matches(consultas, self.escolhas, corte=corte, scorer=scorer, processor=processor)
+
+        usar_blocos = self.usar_blocos
+        self.usar_blocos = True
+        try:
+            idx_indice, sc_indice = self.melhores(consultas, corte=corte, scorer=scorer, processor=processor)
+        finally:
+            self.usar_blocos = usar_blocos
+
+        esperados = idx_completo >= 0
+        # Conta como recuperado quem achou um nome com o mesmo score (em empate o nome pode ser outro)
+        recuperados = esperados & (idx_indice >= 0) & np.isclose(sc_indice, sc_completo, atol=1e-3)
+        total = int(esperados.sum())
+
+        return {
+            "consultas": len(consultas),
+            "matches_varredura": total,
+            "matches_indice": int((idx_indice >= 0).sum()),
+            "recall": (int(recuperados.sum()) / total) if total else 1.0,
+        }
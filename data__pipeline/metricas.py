@@ -0,0 +1,249 @@
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from . import config
+
+# Limites (em segundos) do histograma de latência das requisições HTTP
+LIMITES_LATENCIA = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+_trava = threading.RLock()
+_etapas = {}
+_http = {}
+_caches = {}
+_inicio_execucao = [time.time()]
+
+# Zera tudo o que foi medido; chamado no começo de cada execução do pipeline
+def reiniciar():
+    with _trava:
+        _etapas.clear()
+        _http.clear()
+        _caches.clear()
+        _inicio_execucao[0] = time.time()
+
+def _tamanho(valor):
+    if isinstance(valor, (str, bytes)) or not hasattr(valor, '__len__'):
+        return None
+    try:
+        return len(valor)
+    except TypeError:
+        return None
+
+def _registrar_etapa(nome, duracao, linhas_entrada=None, linhas_saida=None, erro=False):
+    with _trava:
+        etapa = _etapas.setdefault(nome, {
+            'chamadas': 0, 'erros': 0, 'tempo_total': 0.0, 'tempo_max': 0.0,
+            'linhas_entrada': 0, 'linhas_saida': 0,
+        })
+        etapa['chamadas'] += 1
+        etapa['erros'] += int(erro)
+        etapa['tempo_total'] += duracao
+        etapa['tempo_max'] = max(etapa['tempo_max'], duracao)
+        etapa['linhas_entrada'] += linhas_entrada or 0
+        etapa['linhas_saida'] += linhas_saida or 0
+
+# Mede uma etapa: tempo, linhas de entrada e de saída e erros.
+# Como decorador (@medir() ou @medir("nome")) as linhas de entrada são o tamanho do primeiro
+# argumento e as de saída o do retorno (DataFrame, lista ou dict); funções geradoras são
+# medidas até o fim da iteração, contando os itens entregues.
+# Como gerenciador de contexto, as linhas são informadas à mão:
+#   with medir("leitura") as medicao:
+#       ...
+#       medicao.linhas_saida = len(df)
+class medir:
+
+    def __init__(self, nome=None):
+        self.nome = nome
+        self.linhas_entrada = None
+        self.linhas_saida = None
+
+    def __enter__(self):
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, erro, rastro):
+        _registrar_etapa(self.nome, time.perf_counter() - self._inicio,
+                         self.linhas_entrada, self.linhas_saida, erro=tipo is not None)
+        return False
+
+    def __call__(self, funcao):
+        nome = self.nome or funcao.__name__
+
+        if inspect.isgeneratorfunction(funcao):
+            @functools.wraps(funcao)
+            def gerador_medido(*args, **kwargs):
+                inicio = time.perf_counter()
+                itens, erro = 0, False
+                gerador = funcao(*args, **kwargs)
+                try:
+                    for item in gerador:
+                        itens += 1
+                        yield item
+                except Exception:
+                    erro = True
+                    raise
+                finally:
+                    # Quem parou de consumir antes do fim fecha o gerador original na hora
+                    gerador.close()
+                    _registrar_etapa(nome, time.perf_counter() - inicio, None, itens, erro=erro)
+            return gerador_medido
+
+        @functools.wraps(funcao)
+        def funcao_medida(*args, **kwargs):
+            inicio = time.perf_counter()
+            entrada = _tamanho(args[0]) if args else None
+            try:
+                resultado = funcao(*args, **kwargs)
+            except Exception:
+                _registrar_etapa(nome, time.perf_counter() - inicio, entrada, None, erro=True)
+                raise
+            _registrar_etapa(nome, time.perf_counter() - inicio, entrada, _tamanho(resultado))
+            return resultado
+        return funcao_medida
+
+# Agrupa as URLs por endpoint: ids numéricos, ids longos (planilhas) e intervalos viram marcadores
+def _endpoint(url):
+    partes = urlsplit(url)
+    segmentos = []
+    anterior = None
+    for segmento in partes.path.split('/'):
+        base, dois_pontos, acao = segmento.partition(':')
+        if anterior == 'values' and base:
+            base = '{intervalo}'
+        elif base.isdigit() or len(base) >= 25:
+            base = '{id}'
+        segmentos.append(base + dois_pontos + acao)
+        anterior = segmento
+    return f"{partes.netloc}{'/'.join(segmentos)}"
+
+# Hook de resposta do requests: conta requisições, erros, bytes e latência por endpoint.
+# Uso: sessao.hooks['response'].append(registrar_resposta)
+def registrar_resposta(resposta, *args, **kwargs):
+    latencia = resposta.elapsed.total_seconds()
+    tamanho = resposta.headers.get('Content-Length')
+    tamanho = int(tamanho) if tamanho and tamanho.isdigit() else len(resposta.content or b'')
+    with _trava:
+        endpoint = _http.setdefault(_endpoint(resposta.url), {
+            'requisicoes': 0, 'erros': 0, 'bytes': 0, 'latencia_total': 0.0,
+            'latencia_buckets': [0] * len(LIMITES_LATENCIA),
+        })
+        endpoint['requisicoes'] += 1
+        endpoint['erros'] += int(resposta.status_code >= 400)
+        endpoint['bytes'] += tamanho
+        endpoint['latencia_total'] += latencia
+        for i, limite in enumerate(LIMITES_LATENCIA):
+            if latencia <= limite:
+                endpoint['latencia_buckets'][i] += 1
+    return resposta
+
+def contar_cache(nome, acertos=0, faltas=0):
+    with _trava:
+        cache = _caches.setdefault(nome, {'acertos': 0, 'faltas': 0})
+        cache['acertos'] += acertos
+        cache['faltas'] += faltas
+
+# Tudo o que foi medido desde o reiniciar(), num dict pronto para virar JSON
+def relatorio():
+    with _trava:
+        caches = {
+            nome: dict(c, taxa_acerto=(c['acertos'] / (c['acertos'] + c['faltas'])) if c['acertos'] + c['faltas'] else None)
+            for nome, c in _caches.items()
+        }
+        return {
+            'inicio': datetime.fromtimestamp(_inicio_execucao[0]).isoformat(timespec='seconds'),
+            'duracao_segundos': time.time() - _inicio_execucao[0],
+            'etapas': {nome: dict(e) for nome, e in _etapas.items()},
+            'http': {nome: dict(h, latencia_buckets=list(h['latencia_buckets'])) for nome, h in _http.items()},
+            'caches': caches,
+            'limites_latencia': LIMITES_LATENCIA,
+        }
+
+def _rotulo(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# Formato texto do Prometheus (para o textfile collector do node exporter)
+def _prometheus(dados):
+    linhas = []
+    def metrica(nome, tipo, ajuda, valores):
+        linhas.append(f"# HELP tp_academia_{nome} {ajuda}")
+        linhas.append(f"# TYPE tp_academia_{nome} {tipo}")
+        for rotulos, valor in valores:
+            texto = ",".join(f'{chave}="{_rotulo(v)}"' for chave, v in rotulos.items())
+            linhas.append(f"tp_academia_{nome}{{{texto}}} {valor}" if texto else f"tp_academia_{nome} {valor}")
+
+    inicio = datetime.fromisoformat(dados['inicio']).timestamp()
+    metrica("execucao_inicio_timestamp_segundos", "gauge", "Início da última execução", [({}, inicio)])
+    metrica("execucao_duracao_segundos", "gauge", "Duração da última execução", [({}, dados['duracao_segundos'])])
+
+    etapas = dados['etapas'].items()
+    metrica("etapa_duracao_segundos", "gauge", "Tempo total gasto na etapa",
+            [({'etapa': n}, e['tempo_total']) for n, e in etapas])
+    metrica("etapa_duracao_max_segundos", "gauge", "Maior tempo de uma chamada da etapa",
+            [({'etapa': n}, e['tempo_max']) for n, e in etapas])
+    metrica("etapa_chamadas", "gauge", "Chamadas da etapa", [({'etapa': n}, e['chamadas']) for n, e in etapas])
+    metrica("etapa_erros", "gauge", "Chamadas da etapa que terminaram em erro", [({'etapa': n}, e['erros']) for n, e in etapas])
+    metrica("etapa_linhas_entrada", "gauge", "Linhas recebidas pela etapa", [({'etapa': n}, e['linhas_entrada']) for n, e in etapas])
+    metrica("etapa_linhas_saida", "gauge", "Linhas devolvidas pela etapa", [({'etapa': n}, e['linhas_saida']) for n, e in etapas])
+
+    http = dados['http'].items()
+    metrica("http_requisicoes", "gauge", "Requisições HTTP por endpoint", [({'endpoint': n}, h['requisicoes']) for n, h in http])
+    metrica("http_erros", "gauge", "Respostas HTTP com status >= 400", [({'endpoint': n}, h['erros']) for n, h in http])
+    metrica("http_bytes", "gauge", "Bytes recebidos por endpoint", [({'endpoint': n}, h['bytes']) for n, h in http])
+
+    linhas.append("# HELP tp_academia_http_latencia_segundos Latência das requisições HTTP")
+    linhas.append("# TYPE tp_academia_http_latencia_segundos histogram")
+    for nome, h in http:
+        # Os buckets já são acumulados (cada requisição conta em todos os limites acima dela)
+        for limite, quantidade in zip(dados['limites_latencia'], h['latencia_buckets']):
+            linhas.append(f'tp_academia_http_latencia_segundos_bucket{{endpoint="{_rotulo(nome)}",le="{limite}"}} {quantidade}')
+        linhas.append(f'tp_academia_http_latencia_segundos_bucket{{endpoint="{_rotulo(nome)}",le="+Inf"}} {h["requisicoes"]}')
+        linhas.append(f'tp_academia_http_latencia_segundos_sum{{endpoint="{_rotulo(nome)}"}} {h["latencia_total"]}')
+        linhas.append(f'tp_academia_http_latencia_segundos_count{{endpoint="{_rotulo(nome)}"}} {h["requisicoes"]}')
+
+    caches = dados['caches'].items()
+    metrica("cache_acertos", "gauge", "Acertos do cache", [({'cache': n}, c['acertos']) for n, c in caches])
+    metrica("cache_faltas", "gauge", "Faltas do cache", [({'cache': n}, c['faltas']) for n, c in caches])
+    metrica("cache_taxa_acerto", "gauge", "Fração de acertos do cache",
+            [({'cache': n}, c['taxa_acerto']) for n, c in caches if c['taxa_acerto'] is not None])
+    return "\n".join(linhas) + "\n"
+
+# Grava o relatório JSON da execução em METRICAS_DIR e o textfile do Prometheus.
+# O textfile é escrito num temporário e renomeado, para o node exporter nunca ler pela metade.
+# Devolve o caminho do JSON.
+def exportar():
+    dados = relatorio()
+    pasta = Path(config.METRICAS_DIR)
+    pasta.mkdir(parents=True, exist_ok=True)
+
+    caminho_json = pasta / f"execucao-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    with open(caminho_json, "w", encoding="utf-8") as arquivo:
+        json.dump(dados, arquivo, indent=2, ensure_ascii=False)
+
+    caminho_prom = Path(config.METRICAS_PROMETHEUS_ARQUIVO)
+    caminho_prom.parent.mkdir(parents=True, exist_ok=True)
+    temporario = caminho_prom.with_suffix(caminho_prom.suffix + ".tmp")
+    with open(temporario, "w", encoding="utf-8") as arquivo:
+        arquivo.write(_prometheus(dados))
+    os.replace(temporario, caminho_prom)
+    return caminho_json
+
+# Resumo curto para o fim da execução
+def resumo():
+    dados = relatorio()
+    linhas = [f"Tempo total: {dados['duracao_segundos']:.1f}s"]
+    for nome, etapa in sorted(dados['etapas'].items(), key=lambda par: -par[1]['tempo_total']):
+        linhas.append(f"   {nome}: {etapa['tempo_total']:.2f}s em {etapa['chamadas']} chamada(s), "
+                      f"{etapa['linhas_entrada']} -> {etapa['linhas_saida']} linhas")
+    for nome, h in dados['http'].items():
+        media = h['latencia_total'] / h['requisicoes'] if h['requisicoes'] else 0
+        linhas.append(f"   HTTP {nome}: {h['requisicoes']} requisições, {h['bytes']} bytes, {media * 1000:.0f}ms em média")
+    for nome, c in dados['caches'].items():
+        if c['taxa_acerto'] is not None:
+            linhas.append(f"   Cache {nome}: {c['taxa_acerto']:.0%} de acertos")
+    return "\n".join(linhas)
@@ -0,0 +1,186 @@
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import config
+from . import metricas
+
+# Timeout (conexão, leitura) em segundos de cada endpoint, pelo começo do caminho
+TIMEOUTS = {
+    "/psec/treino-bi/": (5, 30),
+    "/psec/alunos/v2": (5, 20),
+    "/v1/cliente": (5, 10),
+}
+TIMEOUT_PADRAO = (5, 30)
+
+# Respostas que valem uma nova tentativa (o gateway limitando ou instável)
+STATUS_REPETIR = {429, 500, 502, 503, 504}
+
+# Espera entre tentativas: aleatória entre 0 e base * 2^tentativa (sem passar do máximo),
+# para as threads que falharam juntas não voltarem todas ao mesmo tempo
+ESPERA_BASE = 0.5
+ESPERA_MAXIMA = 10.0
+
+def _timeout(caminho):
+    for prefixo, timeout in TIMEOUTS.items():
+        if caminho.startswith(prefixo):
+            return timeout
+    return TIMEOUT_PADRAO
+
+# Balde de fichas com taxa adaptativa: cada requisição gasta uma ficha, e as fichas voltam
+# a 'taxa' por segundo. Quando o gateway responde 429 a taxa cai pela metade (uma vez por
+# segundo, por mais threads que recebam o 429 juntas) e, se ele mandar Retry-After, todo
+# mundo espera; a cada resposta boa a taxa sobe um pouco, até a taxa máxima.
+# taxa_maxima=0 deixa passar tudo.
+class LimitadorAdaptativo:
+
+    def __init__(self, taxa_maxima, taxa_minima=1.0):
+        self.taxa_maxima = taxa_maxima
+        self.taxa_minima = min(taxa_minima, taxa_maxima) if taxa_maxima else taxa_minima
+        self.taxa = taxa_maxima
+        self._fichas = max(1.0, taxa_maxima)
+        self._ultima_reposicao = time.monotonic()
+        self._ultima_reducao = 0.0
+        self._pausa_ate = 0.0
+        self._trava = threading.Lock()
+
+    def _repor(self, agora):
+        capacidade = max(1.0, self.taxa)
+        self._fichas = min(capacidade, self._fichas + (agora - self._ultima_reposicao) * self.taxa)
+        self._ultima_reposicao = agora
+
+    # Bloqueia até poder fazer a próxima requisição
+    def aguardar(self):
+        while True:
+            with self._trava:
+                agora = time.monotonic()
+                espera = self._pausa_ate - agora
+                if espera <= 0:
+                    if not self.taxa_maxima:
+                        return
+                    self._repor(agora)
+                    if self._fichas >= 1:
+                        self._fichas -= 1
+                        return
+                    espera = (1 - self._fichas) / self.taxa
+            time.sleep(espera)
+
+    def sucesso(self):
+        if not self.taxa_maxima:
+            return
+        with self._trava:
+            self.taxa = min(self.taxa_maxima, self.taxa + self.taxa_maxima / 100)
+
+    def limitado(self, pausa=None):
+        with self._trava:
+            agora = time.monotonic()
+            if pausa:
+                self._pausa_ate = max(self._pausa_ate, agora + pausa)
+            if self.taxa_maxima and agora - self._ultima_reducao >= 1:
+                self._repor(agora)
+                self.taxa = max(self.taxa_minima, self.taxa / 2)
+                self._fichas = min(self._fichas, 0.0)
+                self._ultima_reducao = agora
+
+# Segundos do cabeçalho Retry-After (None se não vier ou vier como data)
+def _retry_after(resposta):
+    valor = resposta.headers.get('Retry-After', '')
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        return None
+
+# Quantas requisições à Pacto o pipeline pode ter abertas ao mesmo tempo, nas etapas que rodam
+# em paralelo: as páginas em voo de cada par unidade/professor (em dobro quando os que faltaram
+# também são coletados), as páginas de contratos de cada unidade e as consultas de horário de
+# matrícula. Com um pool menor que isso o urllib3 descarta conexões ("Connection pool is full")
+# e abre outras, perdendo o keep-alive.
+def conexoes_simultaneas():
+    pares = min(len(config.EMPRESA_IDS) * len(config.PROFESSOR_IDS), config.PACTO_UNIDADES_EM_PARALELO)
+    unidades = min(len(config.EMPRESA_IDS), config.PACTO_UNIDADES_EM_PARALELO)
+    fontes = 2 if config.AGENDAMENTOS_INCLUIR_FALTAS else 1
+    return (
+        pares * fontes * config.PACTO_PAGINAS_EM_VOO
+        + unidades * config.PACTO_MAX_WORKERS
+        + config.PACTO_MAX_WORKERS
+    )
+
+# Cliente da API da Pacto. Uma sessão só, com as conexões TCP/TLS reaproveitadas entre as
+# chamadas e entre as threads (pool de 'tamanho_pool' conexões, por padrão PACTO_POOL_CONEXOES
+# ou, se ele for 0, conexoes_simultaneas()), os headers de autenticação
+# e as métricas (metricas.registrar_resposta) já configurados, e respostas em gzip.
+# get() passa pelo limitador, usa o timeout do endpoint e tenta de novo em 429/5xx e falhas
+# de rede. Devolve a última resposta (quem chama continua olhando o status_code) ou levanta
+# a exceção de rede da última tentativa.
+class ClientePacto:
+
+    def __init__(self, tamanho_pool=None, tentativas=None, taxa_maxima=None, taxa_minima=None):
+        tamanho_pool = tamanho_pool or config.PACTO_POOL_CONEXOES or conexoes_simultaneas()
+        self.tentativas = tentativas or config.PACTO_TENTATIVAS
+        self.limitador = LimitadorAdaptativo(
+            config.PACTO_TAXA_MAXIMA if taxa_maxima is None else taxa_maxima,
+            config.PACTO_TAXA_MINIMA if taxa_minima is None else taxa_minima,
+        )
+        self.sessao = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=tamanho_pool)
+        self.sessao.mount("https://", adaptador)
+        self.sessao.mount("http://", adaptador)
+        self.sessao.headers.update(config.HEADERS)
+        self.sessao.headers['Accept-Encoding'] = 'gzip, deflate'
+        self.sessao.hooks['response'].append(metricas.registrar_resposta)
+
+    def get(self, caminho, params=None, headers=None, timeout=None):
+        url = f"{config.URL_BASE}{caminho}"
+        timeout = timeout or _timeout(caminho)
+        for tentativa in range(self.tentativas):
+            ultima = tentativa == self.tentativas - 1
+            self.limitador.aguardar()
+            try:
+                resposta = self.sessao.get(url, params=params, headers=headers, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if ultima:
+                    raise
+                print(f"   [Aviso] Falha de rede em {caminho} ({e.__class__.__name__}), tentando de novo...")
+                time.sleep(self._espera(tentativa))
+                continue
+
+            if resposta.status_code not in STATUS_REPETIR:
+                self.limitador.sucesso()
+                return resposta
+
+            pausa = _retry_after(resposta)
+            if resposta.status_code == 429:
+                self.limitador.limitado(pausa)
+            if ultima:
+                return resposta
+            print(f"   [Aviso] {caminho} respondeu {resposta.status_code}, tentando de novo...")
+            time.sleep(max(pausa or 0, self._espera(tentativa)))
+
+    def _espera(self, tentativa):
+        return random.uniform(0, min(ESPERA_MAXIMA, ESPERA_BASE * 2 ** tentativa))
+
+    def fechar(self):
+        self.sessao.close()
+
+_cliente = None
+_trava_cliente = threading.Lock()
+
+# Cliente compartilhado por todo o extract (criado na primeira chamada)
+def cliente():
+    global _cliente
+    with _trava_cliente:
+        if _cliente is None:
+            _cliente = ClientePacto()
+        return _cliente
+
+# Fecha as conexões do cliente compartilhado; o próximo cliente() cria outro
+# (com a configuração que estiver valendo)
+def fechar():
+    global _cliente
+    with _trava_cliente:
+        if _cliente is not None:
+            _cliente.fechar()
+            _cliente = None
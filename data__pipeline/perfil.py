@@ -0,0 +1,188 @@
+import cProfile
+import io
+import pstats
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+from . import config
+
+# Perfil de CPU (cProfile) e memória (tracemalloc) de cada etapa do pipeline (main.py --profile).
+# Cada etapa gera um <etapa>.pstats na pasta PERFIL_DIR/AAAAMMDD-HHMMSS, que pode ser aberto
+# com pstats/snakeviz, e no fim sai um resumo.txt com as funções que mais gastaram tempo
+# acumulado, o pico de memória de cada etapa (com os pontos que mais ocupavam memória no pico)
+# e a memória que ela deixou retida (com os pontos que mais retiveram).
+# As etapas precisam rodar uma de cada vez: o tracemalloc é global e o cProfile só vê a própria thread.
+class PerfilEtapas:
+
+    def __init__(self, pasta=None, top_funcoes=15, top_alocacoes=10, intervalo_pico=0.1):
+        self.pasta = Path(pasta) if pasta else Path(config.PERFIL_DIR) / datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.top_funcoes = top_funcoes
+        self.top_alocacoes = top_alocacoes
+        self.intervalo_pico = intervalo_pico
+        self.etapas = []
+
+    # Devolve 'funcao' embrulhada para ser perfilada como a etapa 'nome'
+    # (no formato que o agendador.executar_etapas espera em 'envolver')
+    def envolver(self, nome, funcao):
+        def funcao_perfilada(*args, **kwargs):
+            return self.executar(nome, funcao, *args, **kwargs)
+        return funcao_perfilada
+
+    def executar(self, nome, funcao, *args, **kwargs):
+        self.pasta.mkdir(parents=True, exist_ok=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        # As estatísticas vêm antes da medida inicial e do reset_peak, para o snapshot
+        # temporário que elas usam não entrar no pico da etapa
+        antes = _memoria_por_linha()
+        tracemalloc.reset_peak()
+        memoria_inicial = tracemalloc.get_traced_memory()[0]
+
+        amostrador = _AmostradorPico(memoria_inicial, self.intervalo_pico)
+        amostrador.start()
+        perfil = cProfile.Profile()
+        inicio = time.perf_counter()
+        try:
+            return perfil.runcall(funcao, *args, **kwargs)
+        finally:
+            duracao = time.perf_counter() - inicio
+            amostrador.parar()
+            # Pico: o máximo que a etapa chegou a usar. Retida: o que continuou alocado no fim.
+            memoria_final, pico = amostrador.medir()
+            depois = _memoria_por_linha()
+            caminho = self.pasta / f"{nome}.pstats"
+            perfil.dump_stats(str(caminho))
+
+            # Etapa rápida demais para o amostrador (ou que terminou no pico): o fim é o pico
+            no_pico = amostrador.estatisticas
+            if no_pico is None or memoria_final >= amostrador.memoria_estatisticas:
+                no_pico = depois
+
+            self.etapas.append({
+                'nome': nome,
+                'duracao': duracao,
+                # As medidas do pico disputam o GIL com a etapa e entram na duração dela
+                'tempo_medicao_memoria': amostrador.tempo_snapshots,
+                'pico_memoria': pico - memoria_inicial,
+                'memoria_retida': memoria_final - memoria_inicial,
+                'pstats': caminho,
+                'alocacoes_pico': self._maiores_alocacoes(antes, no_pico),
+                'alocacoes': self._maiores_alocacoes(antes, depois),
+            })
+
+    # Linhas que mais cresceram entre as duas medidas de _memoria_por_linha
+    def _maiores_alocacoes(self, antes, depois):
+        alocacoes = []
+        for linha, (tamanho, blocos) in depois.items():
+            tamanho_antes, blocos_antes = antes.get(linha, (0, 0))
+            if tamanho > tamanho_antes:
+                alocacoes.append(tracemalloc.StatisticDiff(linha, tamanho, tamanho - tamanho_antes, blocos, blocos - blocos_antes))
+        alocacoes.sort(key=lambda a: -a.size_diff)
+        return alocacoes[:self.top_alocacoes]
+
+    def _funcoes_mais_caras(self, caminho):
+        saida = io.StringIO()
+        estatisticas = pstats.Stats(str(caminho), stream=saida)
+        estatisticas.strip_dirs().sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top_funcoes)
+        # Só a tabela (sem o cabeçalho com o nome do arquivo e o total de chamadas)
+        linhas = saida.getvalue().splitlines()
+        inicio = next((i for i, linha in enumerate(linhas) if linha.lstrip().startswith('ncalls')), 0)
+        return [linha for linha in linhas[inicio:] if linha.strip()]
+
+    # Texto com as etapas da mais lenta para a mais rápida
+    def resumo(self):
+        linhas = [f"Perfil da execução ({len(self.etapas)} etapas) - arquivos .pstats em {self.pasta}", ""]
+        for etapa in sorted(self.etapas, key=lambda e: -e['duracao']):
+            linhas.append(
+                f"=== {etapa['nome']}: {etapa['duracao']:.2f}s, pico de memória {etapa['pico_memoria'] / 1024 / 1024:.1f} MB,"
+                f" memória retida {etapa['memoria_retida'] / 1024 / 1024:.1f} MB"
+                f" (medição da memória no pico: {etapa['tempo_medicao_memoria']:.2f}s) ==="
+            )
+            linhas.append("Funções por tempo acumulado:")
+            linhas.extend("  " + linha for linha in self._funcoes_mais_caras(etapa['pstats']))
+            if etapa['alocacoes_pico']:
+                linhas.append("Memória no pico por linha (o que estava alocado quando a etapa mais usou memória):")
+                linhas.extend(self._linhas_alocacoes(etapa['alocacoes_pico']))
+            if etapa['alocacoes']:
+                linhas.append("Memória retida por linha (o que continuou alocado ao fim da etapa, não o pico):")
+                linhas.extend(self._linhas_alocacoes(etapa['alocacoes']))
+            linhas.append("")
+        return "\n".join(linhas)
+
+    def _linhas_alocacoes(self, alocacoes):
+        linhas = []
+        for alocacao in alocacoes:
+            quadro = alocacao.traceback[0]
+            linhas.append(f"  {alocacao.size_diff / 1024:.1f} KB em {alocacao.count_diff} blocos - {quadro.filename}:{quadro.lineno}")
+        return linhas
+
+    # Grava o resumo.txt, para o tracemalloc e devolve o caminho do resumo
+    def salvar_resumo(self):
+        self.pasta.mkdir(parents=True, exist_ok=True)
+        caminho = self.pasta / "resumo.txt"
+        with open(caminho, "w", encoding="utf-8") as arquivo:
+            arquivo.write(self.resumo())
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        return caminho
+
+# Memória rastreada agora, por linha: {traceback: (bytes, blocos)}, sem o próprio tracemalloc e
+# o perfil. Só o resumo por linha fica guardado (o snapshot, do tamanho da lista de traces, é
+# descartado), então guardar a medida do pico não pesa na memória da etapa.
+def _memoria_por_linha():
+    # Filtrar depois de agrupar: o filter_traces passa por cada trace e custa mais que o snapshot
+    ignorados = {tracemalloc.__file__, __file__}
+    estatisticas = tracemalloc.take_snapshot().statistics('lineno')
+    return {e.traceback: (e.size, e.count) for e in estatisticas if e.traceback[0].filename not in ignorados}
+
+# Thread que acompanha a memória rastreada durante uma etapa e mede a memória por linha sempre
+# que ela passa da última medida (no começo, 'base') em mais de 'margem' (10%), para o resumo
+# mostrar onde estava a memória no pico e não só no fim. O snapshot custa proporcional a tudo o
+# que está rastreado, não só ao que a etapa alocou, por isso a margem é sobre o total e o tempo
+# gasto nas medidas fica limitado a 'fracao_tempo' (10%) do tempo da etapa; a medida do pico
+# pode ser de um pouco antes dele. O pico do tracemalloc é zerado depois de cada medida para não
+# contar o snapshot temporário.
+class _AmostradorPico(threading.Thread):
+
+    def __init__(self, base, intervalo, margem=0.1, fracao_tempo=0.1):
+        super().__init__(daemon=True)
+        self.intervalo = intervalo
+        self.margem = margem
+        self.fracao_tempo = fracao_tempo
+        self.inicio = time.perf_counter()
+        self.tempo_snapshots = 0.0
+        self.estatisticas = None
+        self.memoria_estatisticas = base
+        self.pico = 0
+        self._lock = threading.Lock()
+        self._parado = threading.Event()
+
+    def run(self):
+        while not self._parado.wait(self.intervalo):
+            atual, _ = self.medir()
+            cresceu = atual > self.memoria_estatisticas * (1 + self.margem)
+            no_limite = self.tempo_snapshots <= self.fracao_tempo * (time.perf_counter() - self.inicio)
+            if cresceu and no_limite:
+                self._medir_por_linha(atual)
+
+    # Memória atual e o maior pico visto desde o início da etapa
+    def medir(self):
+        with self._lock:
+            atual, pico = tracemalloc.get_traced_memory()
+            self.pico = max(self.pico, pico)
+            return atual, self.pico
+
+    def _medir_por_linha(self, atual):
+        inicio = time.perf_counter()
+        estatisticas = _memoria_por_linha()
+        with self._lock:
+            tracemalloc.reset_peak()
+        self.estatisticas, self.memoria_estatisticas = estatisticas, atual
+        self.tempo_snapshots += time.perf_counter() - inicio
+
+    def parar(self):
+        self._parado.set()
+        self.join()
@@ -0,0 +1,216 @@
+import threading
+
+import gspread
+from gspread.utils import rowcol_to_a1
+
+from . import config
+from . import metricas
+
+# Sessão única com o Google Sheets para a execução inteira do pipeline.
+# Autentica uma vez só, guarda as planilhas e abas já abertas e acumula as escritas
+# de várias abas, que só vão para a API no enviar(): um batch_update com as mudanças
+# de estrutura (limpar, redimensionar, anexar linhas) e um values_batch_update com os
+# valores, por planilha. Abas grandes regravadas inteiras vão depois, em blocos de linhas.
+class SessaoGoogleSheets:
+
+    # 'cliente' permite usar um cliente já autenticado (ou o falso dos benchmarks)
+    def __init__(self, caminho_credenciais=None, cliente=None):
+        self.caminho_credenciais = caminho_credenciais or config.GOOGLE_CREDENTIALS_PATH
+        self._cliente = cliente
+        self._planilhas = {}
+        self._abas = {}
+        self._linhas_previstas = {}
+        self._requisicoes = {}
+        self._valores = {}
+        self._blocos = {}
+        self._copias = {}
+        # As etapas do pipeline rodam em threads e usam a mesma sessão
+        self._trava = threading.RLock()
+
+    # Cliente autenticado, criado na primeira vez que for preciso (None se a autenticação falhar)
+    def cliente(self):
+        with self._trava:
+            if self._cliente is None:
+                try:
+                    self._cliente = gspread.service_account(filename=str(self.caminho_credenciais))
+                    self._cliente.http_client.session.hooks['response'].append(metricas.registrar_resposta)
+                except Exception as e:
+                    print(f"ERRO: Falha na autenticação do Google: {e}")
+                    return None
+            return self._cliente
+
+    def planilha(self, chave):
+        with self._trava:
+            if chave not in self._planilhas:
+                cliente = self.cliente()
+                if cliente is None:
+                    return None
+                self._planilhas[chave] = cliente.open_by_key(chave)
+            return self._planilhas[chave]
+
+    # Devolve (aba, aba_nova). Com criar=True a aba é criada se não existir;
+    # sem criar, a falta da aba sobe como gspread.WorksheetNotFound.
+    def aba(self, chave, nome, criar=False, linhas=1000, colunas=20):
+        with self._trava:
+            if (chave, nome) in self._abas:
+                return self._abas[(chave, nome)], False
+            planilha = self.planilha(chave)
+            if planilha is None:
+                return None, False
+            try:
+                worksheet = planilha.worksheet(nome)
+                aba_nova = False
+            except gspread.WorksheetNotFound:
+                if not criar:
+                    raise
+                print(f"Aba '{nome}', não encontrada... Criando uma nova!")
+                worksheet = planilha.add_worksheet(title=nome, rows=linhas, cols=colunas)
+                aba_nova = True
+            self._abas[(chave, nome)] = worksheet
+            self._linhas_previstas[(chave, nome)] = worksheet.row_count
+            return worksheet, aba_nova
+
+    def _preparar_requisicao(self, chave, requisicao):
+        with self._trava:
+            self._requisicoes.setdefault(chave, []).append(requisicao)
+
+    # Apaga o conteúdo da aba (mantém formatação), igual ao worksheet.clear()
+    def preparar_limpeza(self, chave, worksheet):
+        self._preparar_requisicao(chave, {
+            'updateCells': {'range': {'sheetId': worksheet.id}, 'fields': 'userEnteredValue'}
+        })
+
+    # Garante que a aba tenha pelo menos 'linhas' linhas (e 'colunas' colunas) antes de gravar os valores
+    def preparar_linhas(self, chave, worksheet, linhas, colunas=None):
+        with self._trava:
+            previstas = self._linhas_previstas.get((chave, worksheet.title), worksheet.row_count)
+            propriedades = {}
+            if linhas > previstas:
+                self._linhas_previstas[(chave, worksheet.title)] = linhas
+                propriedades['rowCount'] = linhas
+            if colunas and colunas > worksheet.col_count:
+                propriedades['columnCount'] = colunas
+            if not propriedades:
+                return
+            self._preparar_requisicao(chave, {
+                'updateSheetProperties': {
+                    'properties': {'sheetId': worksheet.id, 'gridProperties': propriedades},
+                    'fields': ','.join(f"gridProperties.{campo}" for campo in propriedades),
+                }
+            })
+
+    # Acrescenta as linhas depois da última linha preenchida da aba (como o append_rows)
+    def preparar_anexo(self, chave, worksheet, linhas):
+        self._preparar_requisicao(chave, {
+            'appendCells': {
+                'sheetId': worksheet.id,
+                'rows': [
+                    {'values': [{'userEnteredValue': {'stringValue': str(valor)}} for valor in linha]}
+                    for linha in linhas
+                ],
+                'fields': 'userEnteredValue',
+            }
+        })
+
+    # Copia a aba 'origem' (de qualquer planilha) para a aba 'destino' sem baixar os dados.
+    # Nada vai para o Google agora: no enviar() a origem é copiada para uma aba temporária da
+    # planilha 'chave', só os valores dela são colados por cima do destino (que mantém o mesmo
+    # id, sem fórmulas nem formatação da origem) e a temporária é apagada, mesmo se o envio falhar.
+    def preparar_copia(self, chave, origem, destino):
+        with self._trava:
+            self._copias.setdefault(chave, []).append((origem, destino))
+
+    # Faz a cópia para a aba temporária e prepara a colagem e a exclusão dela.
+    # Devolve o id da aba temporária.
+    def _copiar_para_temporaria(self, chave, origem, destino):
+        copia = origem.copy_to(chave)
+        grade = copia.get('gridProperties', {})
+        self.preparar_linhas(chave, destino, grade.get('rowCount', 0), grade.get('columnCount'))
+        self.preparar_limpeza(chave, destino)
+        self._preparar_requisicao(chave, {
+            'copyPaste': {
+                'source': {'sheetId': copia['sheetId']},
+                'destination': {'sheetId': destino.id},
+                'pasteType': 'PASTE_VALUES',
+            }
+        })
+        self._preparar_requisicao(chave, {'deleteSheet': {'sheetId': copia['sheetId']}})
+        return copia['sheetId']
+
+    # Apaga as abas temporárias de cópias que não chegaram a ser coladas (envio com erro)
+    def _apagar_temporarias(self, chave, ids):
+        try:
+            self.planilha(chave).batch_update({'requests': [{'deleteSheet': {'sheetId': id}} for id in ids]})
+        except Exception as e:
+            print(f"ERRO ao apagar as abas temporárias da cópia: {e}")
+
+    # Grava 'valores' a partir do intervalo (ex.: 'A1' ou 'A5:C9') da aba
+    def preparar_valores(self, chave, worksheet, intervalo, valores):
+        with self._trava:
+            titulo = worksheet.title.replace("'", "''")
+            self._valores.setdefault(chave, []).append({'range': f"'{titulo}'!{intervalo}", 'values': valores})
+
+    # Grava os blocos de linhas de 'blocos' (gerador de listas de linhas) um embaixo do outro,
+    # a partir de 'linha_inicial'. Os blocos só são gerados no enviar(), um de cada vez,
+    # então só um bloco convertido fica na memória. A aba já deve ter sido redimensionada.
+    def preparar_blocos(self, chave, worksheet, linha_inicial, blocos):
+        with self._trava:
+            self._blocos.setdefault(chave, []).append((worksheet.title, linha_inicial, blocos))
+
+    def pendente(self):
+        return bool(self._requisicoes) or bool(self._valores) or bool(self._blocos) or bool(self._copias)
+
+    def _enviar_blocos(self, planilha, titulo, linha_inicial, blocos):
+        titulo = titulo.replace("'", "''")
+        linha = linha_inicial
+        for bloco in blocos:
+            if not bloco:
+                continue
+            fim = rowcol_to_a1(linha + len(bloco) - 1, len(bloco[0]))
+            planilha.values_update(
+                f"'{titulo}'!A{linha}:{fim}",
+                params={'valueInputOption': 'RAW'},
+                body={'values': bloco}
+            )
+            linha += len(bloco)
+
+    # Manda tudo o que foi preparado. Retorna True se todas as planilhas foram gravadas.
+    def enviar(self):
+        with self._trava:
+            if not self.pendente():
+                return True
+            chaves = list(dict.fromkeys(list(self._requisicoes) + list(self._valores) + list(self._blocos) + list(self._copias)))
+            temporarias = {}
+            try:
+                for chave in chaves:
+                    planilha = self.planilha(chave)
+                    if planilha is None:
+                        return False
+                    for origem, destino in self._copias.pop(chave, []):
+                        temporarias.setdefault(chave, []).append(self._copiar_para_temporaria(chave, origem, destino))
+                    requisicoes = self._requisicoes.pop(chave, [])
+                    valores = self._valores.pop(chave, [])
+                    blocos = self._blocos.pop(chave, [])
+                    print(f"Enviando {len(requisicoes)} mudanças de estrutura e {len(valores)} intervalos de valores...")
+                    if requisicoes:
+                        planilha.batch_update({'requests': requisicoes})
+                    # A exclusão das temporárias foi junto do batch_update
+                    temporarias.pop(chave, None)
+                    if valores:
+                        planilha.values_batch_update({'valueInputOption': 'RAW', 'data': valores})
+                    for titulo, linha_inicial, gerador in blocos:
+                        self._enviar_blocos(planilha, titulo, linha_inicial, gerador)
+                return True
+            except Exception as e:
+                print(f"ERRO ao salvar a planilha: {e}")
+                return False
+            finally:
+                for chave, ids in temporarias.items():
+                    self._apagar_temporarias(chave, ids)
+                self._requisicoes.clear()
+                self._valores.clear()
+                self._blocos.clear()
+                self._copias.clear()
+                # Depois de enviar (ou falhar), o tamanho real das abas é lido de novo na próxima vez
+                self._abas.clear()
+                self._linhas_previstas.clear()
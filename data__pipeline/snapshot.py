@@ -0,0 +1,113 @@
+import json
+import shutil
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from . import config
+from .cache import chave_horario
+# Campos dos agendamentos usados no transform (os mesmos guardados no estado local)
+from .transform import CAMPOS_AGENDAMENTO
+
+def _agendamentos_para_df(agendamentos):
+    df = pd.DataFrame(list(agendamentos))
+    return df.reindex(columns=CAMPOS_AGENDAMENTO)
+
+def _df_para_agendamentos(df):
+    df = df.astype(object).where(df.notna(), None)
+    return df.to_dict('records')
+
+# Grava os dados brutos de uma execução (o que veio da Pacto e da planilha de marketing)
+# numa pasta de snapshots/AAAAMMDD-HHMMSS, em Parquet, para rodar o transform de novo
+# depois sem chamar nenhuma API (main.py --replay).
+# Os horários de matrícula são gravados conforme o pipeline pede: use gravador.busca_horas
+# no lugar de extract.get_horarios_matriculas.
+class GravadorSnapshot:
+
+    def __init__(self, busca_horas, pasta=None):
+        self._busca_horas = busca_horas
+        self.pasta = Path(pasta) if pasta else Path(config.SNAPSHOTS_DIR) / datetime.now().strftime("%Y%m%d-%H%M%S")
+        self._horas = {}
+        self._trava = threading.Lock()
+
+    def busca_horas(self, matriculas):
+        horas = self._busca_horas(matriculas)
+        with self._trava:
+            self._horas.update({chave_horario(m): dia for m, dia in horas.items()})
+        return horas
+
+    # Salva o que tiver (None fica de fora) e devolve a pasta do snapshot
+    def salvar(self, agendamentos=None, agendamentos_historico=None, contratos=None, leads=None):
+        self.pasta.mkdir(parents=True, exist_ok=True)
+        if agendamentos is not None:
+            _agendamentos_para_df(agendamentos).to_parquet(self.pasta / "agendamentos.parquet", index=False)
+        if agendamentos_historico is not None:
+            _agendamentos_para_df(agendamentos_historico).to_parquet(self.pasta / "agendamentos_historico.parquet", index=False)
+        if contratos is not None:
+            contratos.to_parquet(self.pasta / "contratos.parquet", index=False)
+        if leads is not None:
+            leads.to_parquet(self.pasta / "leads.parquet", index=False)
+        with self._trava:
+            horas = pd.DataFrame({'matricula': list(self._horas), 'dia': list(self._horas.values())}, dtype=object)
+        horas.to_parquet(self.pasta / "horas.parquet", index=False)
+        with open(self.pasta / "info.json", "w", encoding="utf-8") as arquivo:
+            json.dump({'criado_em': datetime.now().isoformat(timespec='seconds')}, arquivo)
+        _apagar_antigos(config.SNAPSHOTS_MANTER)
+        return self.pasta
+
+# Snapshots guardados, do mais antigo para o mais recente
+def listar_snapshots():
+    pasta = Path(config.SNAPSHOTS_DIR)
+    if not pasta.exists():
+        return []
+    return sorted(p for p in pasta.iterdir() if (p / "info.json").exists())
+
+# Mantém só os 'manter' snapshots mais recentes (0 mantém todos)
+def _apagar_antigos(manter):
+    if manter <= 0:
+        return
+    for pasta in listar_snapshots()[:-manter]:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+# Aceita o caminho da pasta, o nome dela dentro de SNAPSHOTS_DIR ou 'ultimo'
+def _resolver(snapshot):
+    if snapshot == 'ultimo':
+        snapshots = listar_snapshots()
+        if not snapshots:
+            raise FileNotFoundError(f"Nenhum snapshot em {config.SNAPSHOTS_DIR}")
+        return snapshots[-1]
+    pasta = Path(snapshot)
+    if not pasta.exists():
+        pasta = Path(config.SNAPSHOTS_DIR) / snapshot
+    if not (pasta / "info.json").exists():
+        raise FileNotFoundError(f"Snapshot não encontrado: {snapshot}")
+    return pasta
+
+# Lê um snapshot gravado pelo GravadorSnapshot. Devolve um dict com 'agendamentos' e
+# 'agendamentos_historico' (listas de dicts, como vêm da API/estado), 'contratos' e 'leads'
+# (DataFrames) e 'busca_horas', que responde pelos horários gravados sem chamar a Pacto.
+def carregar_snapshot(snapshot):
+    pasta = _resolver(snapshot)
+
+    def ler(nome):
+        caminho = pasta / f"{nome}.parquet"
+        return pd.read_parquet(caminho) if caminho.exists() else None
+
+    agendamentos = ler("agendamentos")
+    historico = ler("agendamentos_historico")
+    horas = ler("horas")
+    horas = {} if horas is None else dict(zip(horas['matricula'], horas['dia']))
+
+    def busca_horas(matriculas):
+        return {m: horas.get(chave_horario(m)) for m in matriculas if not pd.isna(m)}
+
+    return {
+        'pasta': pasta,
+        'agendamentos': [] if agendamentos is None else _df_para_agendamentos(agendamentos),
+        'agendamentos_historico': None if historico is None else _df_para_agendamentos(historico),
+        'contratos': ler("contratos"),
+        'leads': ler("leads"),
+        'busca_horas': busca_horas,
+    }
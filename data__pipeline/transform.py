@@ -1,59 +1,78 @@
+import numpy as np
 import pandas as pd
 import re
 from datetime import datetime
 from rapidfuzz import process, fuzz, utils 
 
+from . import config
+from . import matching
+from . import metricas
+from .cache import chave_horario
+
+# Campos dos agendamentos usados no transform; o resto do JSON da API nem entra no DataFrame
+CAMPOS_AGENDAMENTO = ['matricula', 'nomeAluno', 'evento', 'inicio', 'unidade', 'status']
+
 # funçao para remover duplicatas e formata os dados.
-# Retorna um DataFrame do pandas com os dados limpos e formatados
+# 'data' pode ser a lista do extract ou qualquer iterável de agendamentos (ex.: um gerador).
+# Retorna um DataFrame do pandas com os dados limpos: TIPO DE TREINO, ATENDENTE, UNIDADE e
+# STATUS são categóricas, e DATA/HORA ficam como datetime (o texto dd/mm/aaaa e HH:MM só é
+# gerado no load, em load._em_texto).
+@metricas.medir()
 def getAgendamentosLimpos(data):
     
-    if not data:
+    agendamentos_df = pd.DataFrame(list(data) if data is not None else [], columns=CAMPOS_AGENDAMENTO)
+
+    if agendamentos_df.empty:
         print("Zero dados retornados do extract.py")
         return pd.DataFrame()
-    
-    agendamentos_df = pd.DataFrame(data)
 
     # Converter a coluna 'inicio' para o formato datetime
     agendamentos_df['inicio'] = pd.to_datetime(agendamentos_df['inicio'])
 
-    colunas_planilha = ['matricula', 'nomeAluno', 'evento', 'Data', 'Hora']
+    # Com várias unidades configuradas, a mesma matrícula pode existir em mais de uma: a dedup é
+    # por unidade e a coluna UNIDADE sempre sai, mesmo que este lote só tenha linhas de uma delas
+    # (senão a chave do HISTORICO mudaria de uma execução para outra)
+    varias_unidades = len(config.EMPRESA_IDS) > 1
+    if varias_unidades:
+        agendamentos_df['unidade'] = agendamentos_df['unidade'].fillna('').astype(str)
+    chaves = ['unidade', 'matricula', 'evento'] if varias_unidades else ['matricula', 'evento']
+
+    # Com os que faltaram junto (coluna 'status'), um treino executado vale mais que uma
+    # falta do mesmo treino, mesmo que a falta seja mais recente
+    com_status = agendamentos_df['status'].notna().any()
+    if com_status:
+        agendamentos_df['status'] = agendamentos_df['status'].fillna('EXECUTOU')
+        agendamentos_df['_executou'] = agendamentos_df['status'] != 'FALTOU'
+    ordem = ['_executou', 'inicio'] if com_status else ['inicio']
 
     agendamentos_df = (
         agendamentos_df
-        .sort_values(by='inicio', ascending=True)
-        .drop_duplicates(subset=['matricula', 'evento'], keep='last')
-        .assign(
-            Data = lambda df: df['inicio'].dt.strftime('%d/%m/%Y'),
-            Hora = lambda df: df['inicio'].dt.strftime('%H:%M')
-        )
+        .sort_values(by=ordem, ascending=True)
+        .drop_duplicates(subset=chaves, keep='last')
     )
-        
-    colunas_padrao = {
-        "matricula": "MATRICULA",
-        "nomeAluno": "ALUNO",
-        "evento": "TIPO DE TREINO",
-        "Data": "DATA",
-        "Hora": "HORA"
+
+    inicio = agendamentos_df['inicio']
+    colunas = {
+        "MATRICULA": agendamentos_df['matricula'],
+        "ALUNO": agendamentos_df['nomeAluno'],
+        "TIPO DE TREINO": agendamentos_df['evento'].astype('category'),
+        "ATENDENTE": pd.Categorical(
+            np.where(inicio.dt.hour < 12, "ATENDENTE 1", "ATENDENTE 2"),
+            categories=["ATENDENTE 1", "ATENDENTE 2"]
+        ),
+        "DATA": inicio.dt.normalize(),
+        "HORA": inicio,
     }
-    
-    agendamentos_df = agendamentos_df.rename(columns=colunas_padrao)
-    
-    agendamentos_df["ATENDENTE"] = agendamentos_df["HORA"].apply(
-        lambda h: "ATENDENTE 1" if int(h[:2]) < 12 else "ATENDENTE 2"
-    )
-    
-    colunas_ordenadas = [
-        "MATRICULA",
-        "ALUNO",
-        "TIPO DE TREINO",
-        "ATENDENTE",
-        "DATA",
-        "HORA"
-    ]
+    if varias_unidades:
+        colunas = {"UNIDADE": agendamentos_df['unidade'].astype('category'), **colunas}
+    if com_status:
+        colunas["STATUS"] = pd.Categorical(agendamentos_df['status'], categories=['EXECUTOU', 'FALTOU'])
+
+    agendamentos_df = pd.DataFrame(colunas, index=agendamentos_df.index)
 
     print(f"Processamento concluído. Total de agendamentos válidos: {len(agendamentos_df)}")
-    print(agendamentos_df[colunas_ordenadas])
-    return agendamentos_df[colunas_ordenadas]
+    print(agendamentos_df)
+    return agendamentos_df
 
 #Poderia ser uma lista 
 def _get_nome_mes(mes_numero):
@@ -62,18 +81,28 @@ def _get_nome_mes(mes_numero):
     return meses[mes_numero] if 1 <= mes_numero <= 12 else None
 
 # função Auxiliar para Fuzzy Matching
+# lista_alunos_pacto pode ser a lista de nomes ou um matching.IndiceNomes já montado
+# (quando a mesma lista é usada para muitos nomes, o índice evita comparar com todo mundo)
 def obter_nomes_cruzados(nome_mkt, lista_alunos_pacto, corte=85):
     if not nome_mkt or not lista_alunos_pacto:
         return nome_mkt
         
     # token_set_ratio para lidar com nomes abreviados ou nomes do meio extras
-    resultado = process.extractOne(
-        nome_mkt, 
-        lista_alunos_pacto, 
-        scorer=fuzz.token_set_ratio, 
-        processor=utils.default_process,
-        score_cutoff=corte
-    )
+    if isinstance(lista_alunos_pacto, matching.IndiceNomes):
+        resultado = lista_alunos_pacto.extrair_um(
+            nome_mkt,
+            scorer=fuzz.token_set_ratio,
+            processor=utils.default_process,
+            score_cutoff=corte
+        )
+    else:
+        resultado = process.extractOne(
+            nome_mkt, 
+            lista_alunos_pacto, 
+            scorer=fuzz.token_set_ratio, 
+            processor=utils.default_process,
+            score_cutoff=corte
+        )
     
     if resultado:
         nome_encontrado, score, _ = resultado
@@ -83,8 +112,25 @@ def obter_nomes_cruzados(nome_mkt, lista_alunos_pacto, corte=85):
             
     return nome_mkt
 
+# Regex para limpar datas junto com o nome (compiladas uma vez só)
+_RE_NUMEROS_NOME = re.compile(r'[0-9].*') # Remove números/datas
+_RE_TRACOS_NOME = re.compile(r'[-/].*') # Remove traços
+_NOMES_INVALIDOS = ['0', '-', 'NAN', 'NONE']
+
+# Coluna de nomes agendados da planilha -> vendedora responsável
+_COLUNAS_VENDEDORAS = {
+    'Nomes agendados (Daniela Dalla)': 'Daniela Dalla',
+    'Nomes agendados (Daniela Teixeira)': 'Daniela Teixeira'
+}
+
+# Colunas da aba "Diária" usadas no process_leads_marketing; o extract só baixa essas
+COLUNAS_LEADS = ['Data', 'Mês', 'Origem', 'Origem_2'] + list(_COLUNAS_VENDEDORAS)
+
 #Regex, filtra mês atual e identifica VENDEDORA_AGENDAMENTO.
 #Recebe o DF bruto do Extract
+# Tudo é feito em colunas: as duas colunas de nomes viram linhas (melt), cada célula é
+# quebrada por linha (split + explode) e a limpeza/filtro roda na coluna inteira.
+@metricas.medir()
 def process_leads_marketing(df_bruto):
 
     if df_bruto.empty:
@@ -102,115 +148,169 @@ def process_leads_marketing(df_bruto):
     # sem  o filtro de mês para ler o histórico completo
     # filtro_mes = df_bruto['Mês'].astype(str).str.strip().str.upper()
     # df_filtrado = df_bruto[filtro_mes == nome_mes_atual.upper()].copy()
-    df_filtrado = df_bruto.copy()
-    
-    leads_limpos = []
+    df_filtrado = df_bruto.reset_index(drop=True)
+
+    def coluna(nome, padrao):
+        return df_filtrado[nome] if nome in df_filtrado.columns else pd.Series(padrao, index=df_filtrado.index)
+
+    # Pega o mês da própria linha para referência 
+    col_mes = next((c for c in df_filtrado.columns if 'Mês' in c or 'Mes' in c), None)
+
+    # Dados de cada linha da planilha, que são repetidos para cada nome da linha.
+    # Origens e mês têm poucos valores diferentes: como categóricas, cada linha guarda só um código
+    df_linhas = pd.DataFrame({
+        'ORIGEM': coluna('Origem', 'Desconhecido').astype('category'),
+        'ORIGEM_2': coluna('Origem_2', 'Desconhecido').astype('category'),
+        'DATA': coluna('Data', '').astype(str).str.strip(),
+        'MES_REFERENCIA': (df_filtrado[col_mes].astype(str).str.strip() if col_mes else pd.Series(nome_mes_atual, index=df_filtrado.index)).astype('category')
+    })
+
+    df_nomes = pd.DataFrame({col: coluna(col, '').astype(str) for col in _COLUNAS_VENDEDORAS})
+    df_nomes['LINHA'] = df_filtrado.index
+
+    # Uma linha por (linha da planilha, vendedora) e depois uma por nome dentro da célula.
+    # A ordenação estável por LINHA mantém a ordem original: Dalla antes de Teixeira, e os
+    # nomes na ordem em que aparecem na célula.
+    df_longo = df_nomes.melt(id_vars='LINHA', var_name='COLUNA', value_name='ALUNO')
+    df_longo['ALUNO'] = df_longo['ALUNO'].str.split('\n')
+    df_longo = df_longo.explode('ALUNO').sort_values('LINHA', kind='stable')
+
+    df_longo['ALUNO'] = (
+        df_longo['ALUNO']
+        .str.replace(_RE_NUMEROS_NOME, '', regex=True)
+        .str.replace(_RE_TRACOS_NOME, '', regex=True)
+        .str.strip()
+        .str.upper()
+    )
+    df_longo = df_longo[(df_longo['ALUNO'].str.len() > 2) & ~df_longo['ALUNO'].isin(_NOMES_INVALIDOS)]
 
-    for _, row in df_filtrado.iterrows():
-        origem = row.get('Origem', 'Desconhecido')
-        origem_2 = row.get('Origem_2', 'Desconhecido')
-        
-        data_lead = str(row.get('Data', '')).strip()
-        
-        # Pega o mês da própria linha para referência 
-        col_mes = next((c for c in df_bruto.columns if 'Mês' in c or 'Mes' in c), None)
-        mes_ref = str(row.get(col_mes, '')).strip() if col_mes else nome_mes_atual
+    if df_longo.empty:
+        return pd.DataFrame()
+
+    df_leads = df_linhas.loc[df_longo['LINHA']].reset_index(drop=True)
+    df_leads.insert(0, 'ALUNO', df_longo['ALUNO'].to_numpy())
+    df_leads.insert(4, 'VENDEDORA_AGENDAMENTO', pd.Categorical(
+        df_longo['COLUNA'].map(_COLUNAS_VENDEDORAS), categories=list(dict.fromkeys(_COLUNAS_VENDEDORAS.values()))
+    ))
+
+    return df_leads
+# A data de matrícula vem como timestamp (em segundos ou milissegundos)
+def _formatar_data_matricula(timestamp):
+    if pd.isna(timestamp) or not timestamp:
+        return '-'
+
+    # Se o valor for muito grande, assumimos que está em milissegundos
+    if timestamp > 1e10: 
+        timestamp = timestamp / 1000.0
+
+    try:
+        return datetime.fromtimestamp(float(timestamp)).strftime('%d/%m/%Y')
+    except (ValueError, OSError) as e:
+        print(f"Erro ao formatar data: {e}")
+        return '-'
+
+# Nenhum contrato ativo veio do extract (ou a extração falhou)
+def _sem_contratos(contratos_ativos):
+    return contratos_ativos is None or len(contratos_ativos) == 0
 
-        mapa_vendedoras = [
-            (str(row.get('Nomes agendados (Daniela Dalla)', '')), 'Daniela Dalla'),
-            (str(row.get('Nomes agendados (Daniela Teixeira)', '')), 'Daniela Teixeira')
-        ]
-        
-        for nomes_sujos, nome_vendedora in mapa_vendedoras:
-            for nome_sujo in nomes_sujos.split('\n'):
-                # Regex para limpar datas junto com o nome
-                nome_limpo = re.sub(r'[0-9].*', '', nome_sujo) # Remove números/datas
-                nome_limpo = re.sub(r'[-/].*', '', nome_limpo).strip().upper() # Remove traços
-                
-                if nome_limpo and len(nome_limpo) > 2 and nome_limpo not in ['0', '-', 'NAN', 'NONE']:
-                    leads_limpos.append({
-                        'ALUNO': nome_limpo,
-                        'ORIGEM': origem,
-                        'ORIGEM_2': origem_2,
-                        'DATA': data_lead,
-                        'VENDEDORA_AGENDAMENTO': nome_vendedora,
-                        'MES_REFERENCIA': mes_ref
-                    })
-    
-    return pd.DataFrame(leads_limpos)
 #Funçaõ pra pegar os contratos e o nome das pessoas, pra nao repetir codigo
-def processar_contratos(lista_contratos_brutos):
-    if not lista_contratos_brutos:
+# Recebe o DataFrame de colunas do extract.get_todos_contratos_ativos
+# Retorna o df_contratos indexado por posição (0..n-1) e a lista de nomes na mesma ordem,
+# então o índice que o rapidfuzz devolve já é a linha do contrato: df_contratos.iloc[indice].
+# Nomes repetidos ficam só com o primeiro contrato (era o que o .iloc[0] do filtro por nome pegava).
+# CHAVE_HORARIO é o que vai para o busca_horas: a matrícula, ou unidade + matrícula quando os
+# contratos vêm de várias unidades (coluna 'empresaId').
+def processar_contratos(contratos_ativos):
+    if _sem_contratos(contratos_ativos):
         return pd.DataFrame(), []
 
-    contratos = []
-    for c in lista_contratos_brutos:
-        timestamp = c.get('dataMatriculaZW')
-        data_formatada = '-'
-        if timestamp:
-            # Se o valor for muito grande, assumimos que está em milissegundos
-            if timestamp > 1e10: 
-                timestamp = timestamp / 1000.0
-
-            try:
-                data_formatada = datetime.fromtimestamp(timestamp).strftime('%d/%m/%Y')
-            except (ValueError, OSError) as e:
-                print(f"Erro ao formatar data: {e}")
-                data_formatada = '-'
-
-        contratos.append({
-            'NOME_SISTEMA': str(c.get('nome', '')).upper().strip(),
-            'PLANO_SISTEMA': c.get('planoZW', {}).get('nome', 'Sem Plano'),
-            'DATA_MATR_SISTEMA': data_formatada,
-            'MATRICULA_ZW': c.get('matriculaZW') 
-        })
-
-    df_contratos = pd.DataFrame(contratos)
+    df_contratos = pd.DataFrame({
+        'NOME_SISTEMA': contratos_ativos['nome'].astype(str).str.upper().str.strip(),
+        'PLANO_SISTEMA': contratos_ativos['plano'].astype(object).fillna('Sem Plano'),
+        'DATA_MATR_SISTEMA': [_formatar_data_matricula(ts) for ts in contratos_ativos['dataMatriculaZW']],
+        'MATRICULA_ZW': contratos_ativos['matriculaZW']
+    })
+    if 'empresaId' in contratos_ativos.columns:
+        df_contratos['CHAVE_HORARIO'] = [
+            m if pd.isna(m) else chave_horario(m, u)
+            for m, u in zip(contratos_ativos['matriculaZW'], contratos_ativos['empresaId'])
+        ]
+    else:
+        df_contratos['CHAVE_HORARIO'] = df_contratos['MATRICULA_ZW']
+
+    repetidos = df_contratos['NOME_SISTEMA'].duplicated(keep='first')
+    if repetidos.any():
+        print(f"   [Aviso] {int(repetidos.sum())} contratos com nome repetido, usando o primeiro de cada nome.")
+        df_contratos = df_contratos[~repetidos]
+
+    df_contratos = df_contratos.reset_index(drop=True)
 
     return df_contratos, df_contratos['NOME_SISTEMA'].tolist()
 
-def validar_vendas_com_lista(df_mkt, lista_contratos_brutos, busca_hora=None):
+# Converte os horários UTC retornados pela Pacto para o horário de Brasília, todos de uma vez.
+# O fuso que vier na string é descartado depois de ler (fica a hora "de parede", como antes).
+def _horarios_brasilia(valores_utc):
+    serie = pd.Series(list(valores_utc), dtype=object)
+    serie = serie.where(serie.astype(bool), None)
+
+    try:
+        datas = pd.to_datetime(serie, format='ISO8601', errors='coerce')
+        if datas.dt.tz is not None:
+            datas = datas.dt.tz_localize(None)
+    except (ValueError, TypeError, AttributeError):
+        # Fusos diferentes misturados: lê um por um
+        datas = pd.Series([pd.to_datetime(v) if v else pd.NaT for v in serie])
+        datas = pd.to_datetime(datas.map(lambda d: d.tz_localize(None) if getattr(d, 'tzinfo', None) else d))
+
+    return datas - pd.Timedelta(hours=3)
+
+# Hora exata e vendedora do fechamento para uma lista de horários UTC (None = sem hora)
+def _horas_e_vendedoras(valores_utc):
+    datas_br = _horarios_brasilia(valores_utc)
+    sem_hora = datas_br.isna().to_numpy()
+
+    horas = np.where(sem_hora, '-', datas_br.dt.strftime('%H:%M').fillna('-').to_numpy())
+    vendedoras = np.where(sem_hora, 'Sistema/Sem Hora', _vendedoras_por_escala(datas_br))
+    return horas, vendedoras
+
+# busca_horas recebe a lista de matrículas e devolve um dict {matricula: data UTC},
+# assim os horários são buscados em lote depois do cruzamento (ex: extract.get_horarios_matriculas)
+@metricas.medir()
+def validar_vendas_com_lista(df_mkt, contratos_ativos, busca_horas=None):
     
-    if not lista_contratos_brutos or df_mkt.empty:
+    if _sem_contratos(contratos_ativos) or df_mkt.empty:
         return df_mkt
 
-    print(f"Validando vendas localmente contra {len(lista_contratos_brutos)} contratos...")
+    print(f"Validando vendas localmente contra {len(contratos_ativos)} contratos...")
     
-    df_contratos, nomes_sistema = processar_contratos(lista_contratos_brutos)
-
-    resultados = []
-    for _, row in df_mkt.iterrows():
-        lead_dict = row.to_dict()
-        nome_lead = str(row['ALUNO']).upper().strip()
-        match = process.extractOne(nome_lead, nomes_sistema, scorer=fuzz.token_set_ratio, score_cutoff=85)
-
-        if match:
-            nome_encontrado, _, _ = match
-            dados_v = df_contratos[df_contratos['NOME_SISTEMA'] == nome_encontrado].iloc[0]
-            
-            data_utc_str = busca_hora(dados_v.get('MATRICULA_ZW')) if busca_hora else None
-            hora_exata, vendedora_fechamento = '-', 'Sistema/Sem Hora'
-            
-            if data_utc_str:
-                dt_br = pd.to_datetime(data_utc_str) - pd.Timedelta(hours=3)
-                hora_exata = dt_br.strftime('%H:%M')
-                vendedora_fechamento = calcular_vendedora_por_escala(dt_br.strftime('%d/%m/%Y'), hora_exata)
-
-            lead_dict.update({
-                'COMPROU?': 'SIM', 
-                'PLANO': dados_v['PLANO_SISTEMA'], 
-                'DATA_MATRICULA': dados_v['DATA_MATR_SISTEMA'],
-                'HORA_MATRICULA': hora_exata,
-                'VENDEDORA_FECHAMENTO': vendedora_fechamento
-            })
-        else:
-            lead_dict.update({
-                'COMPROU?': 'NÃO', 'PLANO': 'Nenhum', 'DATA_MATRICULA': '-',
-                'HORA_MATRICULA': '-', 'VENDEDORA_FECHAMENTO': '-'
-            })
-        resultados.append(lead_dict)
-
-    df_vendas = pd.DataFrame(resultados)
+    df_contratos, nomes_sistema = processar_contratos(contratos_ativos)
+
+    # Todos os leads são comparados com todos os contratos de uma vez só
+    nomes_leads = matching.normalizar_nomes(df_mkt['ALUNO'])
+    indices_match, _ = matching.IndiceNomes(nomes_sistema).melhores(nomes_leads, corte=85)
+    comprou = indices_match >= 0
+
+    # Linha do contrato de cada lead (0 para quem não comprou, só pra indexar; é descartado pelo np.where)
+    linha_contrato = np.where(comprou, indices_match, 0)
+
+    df_vendas = df_mkt.reset_index(drop=True)
+    df_vendas['COMPROU?'] = np.where(comprou, 'SIM', 'NÃO')
+    df_vendas['PLANO'] = np.where(comprou, df_contratos['PLANO_SISTEMA'].to_numpy()[linha_contrato], 'Nenhum')
+    df_vendas['DATA_MATRICULA'] = np.where(comprou, df_contratos['DATA_MATR_SISTEMA'].to_numpy()[linha_contrato], '-')
+    df_vendas['HORA_MATRICULA'] = '-'
+    df_vendas['VENDEDORA_FECHAMENTO'] = np.where(comprou, 'Sistema/Sem Hora', '-')
+
+    # (posição no df_vendas, matrícula) de quem comprou, pra buscar a hora depois
+    posicoes_venda = np.flatnonzero(comprou)
+    matriculas_venda = df_contratos['CHAVE_HORARIO'].to_numpy()[indices_match[posicoes_venda]]
+    vendas_encontradas = list(zip(posicoes_venda, matriculas_venda))
+
+    # Uma única busca em lote para todas as vendas encontradas
+    if busca_horas and vendas_encontradas:
+        horarios = busca_horas([matricula for _, matricula in vendas_encontradas])
+        horas, vendedoras = _horas_e_vendedoras([horarios.get(matricula) for _, matricula in vendas_encontradas])
+        df_vendas.loc[posicoes_venda, 'HORA_MATRICULA'] = horas
+        df_vendas.loc[posicoes_venda, 'VENDEDORA_FECHAMENTO'] = vendedoras
 
     # Lógica Categórica para garantir a hierarquia na ordenação
     df_vendas['COMPROU?'] = pd.Categorical(df_vendas['COMPROU?'], categories=['NÃO', 'SIM'], ordered=True)
@@ -222,10 +322,21 @@ def validar_vendas_com_lista(df_mkt, lista_contratos_brutos, busca_hora=None):
 
     return df_vendas
 
+# fillna numa coluna categórica só aceita valores que já são categorias
+def _preencher_categoria(serie, valor):
+    serie = serie.astype('category')
+    if valor not in serie.cat.categories:
+        serie = serie.cat.add_categories([valor])
+    return serie.fillna(valor)
+
 # Recebe os dados limpos da Pacto e do Marketing e realiza o cruzamento.
 # Retorna o DataFrame final pronto para salvar.
-def consolidar_dados(df_pacto, df_mkt, lista_contratos_brutos=None, busca_hora=None):
+# Com a coluna STATUS (os que faltaram também coletados), o relatório fica só com quem compareceu.
+@metricas.medir()
+def consolidar_dados(df_pacto, df_mkt, contratos_ativos=None, busca_horas=None):
 
+    if 'STATUS' in df_pacto.columns:
+        df_pacto = df_pacto[df_pacto['STATUS'] != 'FALTOU'].drop(columns=['STATUS'])
     if df_pacto.empty: return pd.DataFrame()
     df_pacto_copy = df_pacto.copy()
     
@@ -241,9 +352,9 @@ def consolidar_dados(df_pacto, df_mkt, lista_contratos_brutos=None, busca_hora=N
             df_mkt_copy[col] = df_mkt_copy[col].astype(str)
 
     if 'ALUNO' in df_pacto_copy.columns:
-        lista_alunos_catraca = df_pacto_copy['ALUNO'].dropna().unique().tolist()
+        indice_catraca = matching.IndiceNomes(df_pacto_copy['ALUNO'].dropna().unique().tolist())
         df_mkt_copy['ALUNO'] = df_mkt_copy['ALUNO'].apply(
-            lambda x: obter_nomes_cruzados(x, lista_alunos_catraca, corte=85)
+            lambda x: obter_nomes_cruzados(x, indice_catraca, corte=85)
         )
 
     df_pacto_copy['CHAVE_TEMP'] = df_pacto_copy['ALUNO'].astype(str).str.strip().str.upper()
@@ -256,8 +367,8 @@ def consolidar_dados(df_pacto, df_mkt, lista_contratos_brutos=None, busca_hora=N
 
     df_final = pd.merge(df_pacto_copy, df_mkt_copy[colunas_existentes], on='CHAVE_TEMP', how='left')
 
-    df_final['ORIGEM'] = df_final['ORIGEM'].fillna('Orgânico/Outros').astype(str)
-    df_final['VENDEDORA_AGENDAMENTO'] = df_final['VENDEDORA_AGENDAMENTO'].fillna('Recepção/Sistema').astype(str)
+    df_final['ORIGEM'] = _preencher_categoria(df_final['ORIGEM'], 'Orgânico/Outros')
+    df_final['VENDEDORA_AGENDAMENTO'] = _preencher_categoria(df_final['VENDEDORA_AGENDAMENTO'], 'Recepção/Sistema')
     df_final['COMPROU?'] = df_final['COMPROU?'].fillna('NÃO').astype(str)
     df_final['PLANO'] = df_final['PLANO'].fillna('Nenhum').astype(str)
     df_final['DATA_MATRICULA'] = df_final['DATA_MATRICULA'].fillna('-').astype(str)
@@ -267,60 +378,75 @@ def consolidar_dados(df_pacto, df_mkt, lista_contratos_brutos=None, busca_hora=N
 
     
     # repescagem para garantir que todas as não vendas estao corretas.
-    # acabou que botei dentro do if, mas da pra fazer uma funçao pra isso
-    if lista_contratos_brutos:
-        print("   Iniciando repescagem de Vendas Orgânicas e correção de colisões...")
-        
-        df_contratos, nomes_sistema = processar_contratos(lista_contratos_brutos)
-
-        # Varre todo o mundo que está como 'NÃO' no Relatório
-        repescados = 0
-        for idx, row in df_final.iterrows():
-            if row['COMPROU?'] == 'NÃO':
-                nome_catraca = str(row['ALUNO']).upper().strip()
-                
-                # Pega as 3 melhores opções de match para não errar
-                matches = process.extract(nome_catraca, nomes_sistema, scorer=fuzz.token_set_ratio, limit=3)
-                
-                for match_nome, score, _ in matches:
-                    if score >= 85:
-                        # Verifica as iniciais abreviadas
-                        # Ex: Se a catraca é "MARCIA S. MULLER", extrai o ['S']
-                        letras_abrev = re.findall(r'\b([A-Z])\.', nome_catraca)
-                        iniciais_completo = [p[0] for p in match_nome.split()] # Iniciais do contrato
-                        
-                        valido = True
-                        if letras_abrev:
-                            # Garante que todas as letras abreviadas existam no nome completo
-                            # A Marcia da (S)ilva passa. A Marcia (R)ejane reprova.
-                            valido = all(letra in iniciais_completo for letra in letras_abrev)
-                        
-                        if valido:
-                            dados_v = df_contratos[df_contratos['NOME_SISTEMA'] == match_nome].iloc[0]
-                            
-                            data_utc_str = busca_hora(dados_v.get('MATRICULA_ZW')) if busca_hora else None
-                            hora_exata, vendedora_fechamento = '-', 'Sistema/Sem Hora'
-                            
-                            if data_utc_str:
-                                dt_br = pd.to_datetime(data_utc_str) - pd.Timedelta(hours=3)
-                                hora_exata = dt_br.strftime('%H:%M')
-                                vendedora_fechamento = calcular_vendedora_por_escala(dt_br.strftime('%d/%m/%Y'), hora_exata)
-                                
-                            df_final.at[idx, 'COMPROU?'] = 'SIM'
-                            df_final.at[idx, 'PLANO'] = dados_v['PLANO_SISTEMA']
-                            df_final.at[idx, 'DATA_MATRICULA'] = dados_v['DATA_MATR_SISTEMA']
-                            df_final.at[idx, 'HORA_MATRICULA'] = hora_exata
-                            df_final.at[idx, 'VENDEDORA_FECHAMENTO'] = vendedora_fechamento
-                            repescados += 1
-                            break # Achou o aluno certo, ignora os outros matches
-        
-        print(f" Repescagem concluída: {repescados} vendas recuperadas com precisão.")
+    if not _sem_contratos(contratos_ativos):
+        df_final = _repescar_vendas(df_final, contratos_ativos, busca_horas)
 
     matches = len(df_final[df_final['ORIGEM'] != 'Orgânico/Outros'])
     print(f"   [Transform] Cruzamento finalizado. {matches} atribuições encontradas.")
     
     return df_final
 
+# Letras A-Z de cada lista viram bits de um inteiro, para comparar conjuntos de letras em NumPy
+def _mascara_letras(letras_por_linha, tamanho):
+    letras = letras_por_linha.dropna()
+    letras = letras[letras.str.fullmatch(r'[A-Z]')]
+    mascara = np.zeros(tamanho, dtype=np.int64)
+
+    if not letras.empty:
+        bits = np.left_shift(1, letras.map(ord).to_numpy(dtype=np.int64) - ord('A'))
+        por_linha = pd.Series(bits, index=letras.index.get_level_values(0)).groupby(level=0).agg(np.bitwise_or.reduce)
+        mascara[por_linha.index.to_numpy()] = por_linha.to_numpy()
+
+    return mascara
+
+# Repescagem: todo mundo que está como 'NÃO' no Relatório é comparado de uma vez com os
+# contratos (top 3 de cada um, acima de 85), para pegar vendas orgânicas e colisões de nome.
+def _repescar_vendas(df_final, contratos_ativos, busca_horas=None):
+    print("   Iniciando repescagem de Vendas Orgânicas e correção de colisões...")
+
+    df_contratos, nomes_sistema = processar_contratos(contratos_ativos)
+    indice_contratos = matching.IndiceNomes(nomes_sistema)
+
+    posicoes_nao = np.flatnonzero((df_final['COMPROU?'] == 'NÃO').to_numpy())
+    nomes_catraca = pd.Series(matching.normalizar_nomes(df_final['ALUNO'].to_numpy()[posicoes_nao]), dtype=object)
+
+    # Pega as 3 melhores opções de match para não errar
+    candidatos, _ = indice_contratos.melhores_k(nomes_catraca.tolist(), k=3, corte=85, scorer=fuzz.token_set_ratio)
+
+    # Verifica as iniciais abreviadas
+    # Ex: Se a catraca é "MARCIA S. MULLER", extrai o ['S'], e todas as letras abreviadas precisam
+    # ser iniciais de alguma palavra do contrato. A Marcia da (S)ilva passa. A Marcia (R)ejane reprova.
+    abreviadas = _mascara_letras(nomes_catraca.str.extractall(r'\b([A-Z])\.')[0], len(nomes_catraca))
+    iniciais_contrato = _mascara_letras(
+        pd.Series(nomes_sistema, dtype=object).str.extractall(r'(?<!\S)(\S)')[0], len(nomes_sistema)
+    )
+
+    tem_candidato = candidatos >= 0
+    iniciais_candidato = iniciais_contrato[np.where(tem_candidato, candidatos, 0)]
+    valido = tem_candidato & ((abreviadas[:, None] & ~iniciais_candidato) == 0)
+
+    # Fica com o primeiro candidato válido de cada linha (achou o aluno certo, ignora os outros)
+    achou = valido.any(axis=1)
+    escolhido = candidatos[np.arange(len(candidatos)), valido.argmax(axis=1)][achou]
+
+    linhas_repescadas = df_final.index[posicoes_nao[achou]]
+    df_final.loc[linhas_repescadas, 'COMPROU?'] = 'SIM'
+    df_final.loc[linhas_repescadas, 'PLANO'] = df_contratos['PLANO_SISTEMA'].to_numpy()[escolhido]
+    df_final.loc[linhas_repescadas, 'DATA_MATRICULA'] = df_contratos['DATA_MATR_SISTEMA'].to_numpy()[escolhido]
+    df_final.loc[linhas_repescadas, 'HORA_MATRICULA'] = '-'
+    df_final.loc[linhas_repescadas, 'VENDEDORA_FECHAMENTO'] = 'Sistema/Sem Hora'
+
+    # Uma única busca em lote para todos os repescados
+    if busca_horas and len(linhas_repescadas):
+        matriculas = df_contratos['CHAVE_HORARIO'].to_numpy()[escolhido]
+        horarios = busca_horas(list(matriculas))
+        horas, vendedoras = _horas_e_vendedoras([horarios.get(matricula) for matricula in matriculas])
+        df_final.loc[linhas_repescadas, 'HORA_MATRICULA'] = horas
+        df_final.loc[linhas_repescadas, 'VENDEDORA_FECHAMENTO'] = vendedoras
+
+    print(f" Repescagem concluída: {len(linhas_repescadas)} vendas recuperadas com precisão.")
+    return df_final
+
 #Função pra ordernar por data
 #Pode ser removida, usei na main
 def ordenar_por_data_recente(df, coluna_data='DATA'):
@@ -336,44 +462,76 @@ def ordenar_por_data_recente(df, coluna_data='DATA'):
     df_copy = df_copy.sort_values(by='DATA_TEMP', ascending=False)
     return df_copy.drop(columns=['DATA_TEMP'])
 
+# Escala do config convertida uma vez para minutos desde a meia-noite
+def _minutos(hora_str):
+    hora, minuto = map(int, hora_str.split(':'))
+    return hora * 60 + minuto
+
+_TURNOS_SEMANA = [(_minutos(inicio), _minutos(fim), vendedora) for inicio, fim, vendedora in config.ESCALA_SEMANA]
+_SABADO_REFERENCIA = pd.to_datetime(config.ESCALA_SABADO_REFERENCIA, dayfirst=True)
+
+# Vendedora pela escala para uma coluna de datas/horas (datetime) inteira de uma vez:
+# dia da semana, minutos desde a meia-noite e paridade do revezamento de sábado em NumPy.
+# Os minutos podem vir à parte (quando a hora vem de outra coluna).
+# Linhas sem data (NaT) voltam como "Data Inválida".
+def _vendedoras_por_escala(datas_horas, minutos=None):
+    datas_horas = pd.Series(pd.to_datetime(datas_horas)).reset_index(drop=True)
+    sem_data = datas_horas.isna().to_numpy()
+
+    dia_semana = datas_horas.dt.weekday.fillna(-1).to_numpy() # 0=Seg ... 5=Sáb
+    if minutos is None:
+        minutos = (datas_horas.dt.hour * 60 + datas_horas.dt.minute).fillna(-1).to_numpy()
+
+    # Sábado: a diferença de semanas para o sábado de referência diz de quem é a vez
+    dias_ref = (datas_horas.dt.normalize() - _SABADO_REFERENCIA).dt.days.fillna(0).to_numpy().astype(np.int64)
+    revezamento = np.array(config.ESCALA_SABADO_REVEZAMENTO, dtype=object)
+    vez_sabado = revezamento[(dias_ref // 7) % len(revezamento)]
+
+    turno_semana = np.select(
+        [(minutos >= inicio) & (minutos < fim) for inicio, fim, _ in _TURNOS_SEMANA],
+        [vendedora for _, _, vendedora in _TURNOS_SEMANA],
+        default="Fora do Turno"
+    ).astype(object)
+
+    return np.select(
+        [sem_data, dia_semana <= 4, dia_semana == 5],
+        [np.full(len(datas_horas), "Data Inválida", dtype=object), turno_semana, vez_sabado],
+        default="Domingo"
+    )
+
+# Versão para colunas inteiras de data ('%d/%m/%Y') e hora ('%H:%M') em texto.
+# Mesmas regras e mensagens do calcular_vendedora_por_escala.
+def calcular_vendedoras_por_escala(datas, horas):
+    datas = pd.Series(list(datas), dtype=object)
+    horas = pd.Series(list(horas), dtype=object)
+
+    texto_hora = horas.astype(str).str.strip()
+    sem_horario = (horas.isna() | texto_hora.isin(['-', ''])).to_numpy()
+
+    # Garante a leitura correta da data no padrão BR
+    datas_obj = pd.to_datetime(datas, format='%d/%m/%Y', errors='coerce')
+    outros_formatos = datas_obj.isna() & datas.notna()
+    if outros_formatos.any():
+        datas_obj[outros_formatos] = [pd.to_datetime(d, dayfirst=True, errors='coerce') for d in datas[outros_formatos]]
+
+    partes_hora = texto_hora.str.extract(r'^(\d+)\s*:\s*(\d+)$').astype(float)
+    hora_valida = partes_hora.notna().all(axis=1).to_numpy()
+    minutos = (partes_hora[0] * 60 + partes_hora[1]).fillna(-1).to_numpy()
+
+    vendedoras = _vendedoras_por_escala(datas_obj.dt.normalize(), minutos)
+
+    dia_util = (datas_obj.dt.weekday <= 4).to_numpy()
+    erro_hora = np.char.add("Erro: hora inválida ", texto_hora.to_numpy().astype(str)).astype(object)
+
+    return np.select(
+        [sem_horario, dia_util & ~hora_valida],
+        [np.full(len(datas), "Sem Horário", dtype=object), erro_hora],
+        default=vendedoras
+    )
+
+# Versão de uma linha só, para quem tem uma data e uma hora avulsas
 def calcular_vendedora_por_escala(data_str, hora_str):
     try:
-        if pd.isna(hora_str) or str(hora_str).strip() in ['-', '']: 
-            return "Sem Horário"
-        
-        # Garante a leitura correta da data no padrão BR
-        data_obj = pd.to_datetime(data_str, dayfirst=True, errors='coerce')
-        
-        if pd.isna(data_obj): 
-            return "Data Inválida"
-            
-        dia_semana = data_obj.weekday() # 0=Seg ... 5=Sáb
-
-        if dia_semana <= 4: # Segunda a Sexta
-            hora, minuto = map(int, str(hora_str).split(':'))
-            # Regra dos turnos durante a semana
-            if (hora > 6 or (hora == 6 and minuto >= 0)) and (hora < 14 or (hora == 14 and minuto < 30)):
-                return "Daniela Teixeira"
-            elif (hora > 14 or (hora == 14 and minuto >= 30)) and (hora <= 22):
-                return "Daniela Dalla"
-            else:
-                return "Fora do Turno"
-        
-        elif dia_semana == 5: # Sábado (Lógica de Alternância)
-            # Data de referência: Sábado, 14/03/2026 - Daniela Dalla
-            data_ref = pd.to_datetime('14/03/2026', dayfirst=True)
-            
-            # Calcula a diferença de semanas
-            semanas_dif = (data_obj - data_ref).days // 7
-            
-            # Se a diferença for par (0, 2, 4...), é a Dalla. Se for ímpar, é a Teixeira.
-            if semanas_dif % 2 == 0:
-                return "Daniela Dalla"
-            else:
-                return "Daniela Teixeira"
-            
-        else: # Domingo
-            return "Domingo"
-            
+        return calcular_vendedoras_por_escala([data_str], [hora_str])[0]
     except Exception as e:
-        return f"Erro: {str(e)}"
\ No newline at end of file
+        return f"Erro: {str(e)}"
@@ -1,56 +1,225 @@
-import os
+import argparse
+import pandas as pd
 from dotenv import load_dotenv
 
 from data__pipeline import extract
 from data__pipeline import transform
 from data__pipeline import load
+from data__pipeline.estado import HistoricoAgendamentos, HistoricoLeads
+from data__pipeline import config
+from data__pipeline.sheets import SessaoGoogleSheets
+from data__pipeline.agendador import Etapa, executar_etapas
+from data__pipeline import snapshot
+from data__pipeline import metricas
+from data__pipeline import pacto
+from data__pipeline.perfil import PerfilEtapas
 
-def run():
+# full_refresh=True ignora o watermark e baixa o histórico completo de agendamentos
+# replay='<snapshot>' (ou 'ultimo') refaz transform e load com os dados brutos gravados
+# numa execução anterior, sem chamar a Pacto nem ler a planilha de marketing. O replay é
+# sempre um dry-run: os dados do snapshot são antigos e não podem sobrescrever as abas.
+# profile=True perfila cada etapa (cProfile + tracemalloc), rodando uma etapa de cada vez,
+# e grava os .pstats e um resumo em PERFIL_DIR.
+# dry_run=True não grava nada no Google Sheets nem no estado local: as tabelas finais
+# vão para a pasta dry_run do snapshot, em Parquet, para comparar entre execuções.
+# O pipeline é montado em etapas (agendador.Etapa), cada uma dizendo de quais outras depende.
+# As que não dependem umas das outras (Pacto, contratos, planilha de marketing) rodam ao mesmo
+# tempo, e se uma falha só as que dependem dela deixam de rodar.
+def run(full_refresh=False, replay=None, dry_run=False, profile=False):
   
   load_dotenv()
-  # Aqui eu crio uma variável que extrai e filtra os dados no extract.py
-  dados = extract.getAgendamentosFiltrados() 
-  # Passo os 'dados' por parâmetro e executo a função para tratar os dados e jogo para a variável 'df_filtrado'
-  df_filtrado = transform.getAgendamentosLimpos(dados)
-  
-  
-  # Completo o ETL carregando os dados no banco de dados (planilha Google)
-  load.save_in_database(df_filtrado, nome_da_aba="HISTORICO")
-  
-  print("\n--- MARKETING (Leads) ---")
-    
-  # Extract: Lê bruto da planilha
-  df_mkt_bruto = extract.get_leads()
-  contratos_brutos = extract.get_todos_contratos_ativos()
+  metricas.reiniciar()
+  dry_run = dry_run or bool(replay)
+  historico = HistoricoAgendamentos() if not replay else None
+  # Uma autenticação só no Google; as gravações de todas as abas vão juntas no final
+  sessao = SessaoGoogleSheets()
+  # Abas do Google ou armazém local (LOAD_BACKEND); no dry-run nada é gravado
+  destino = load.criar_destino(sessao) if not dry_run else None
+
+  if replay:
+      dados_replay = snapshot.carregar_snapshot(replay)
+      pasta_snapshot = dados_replay['pasta']
+      print(f"Refazendo a execução gravada em {pasta_snapshot}")
+      incremental = dados_replay['agendamentos_historico'] is not None
+      busca_horas = dados_replay['busca_horas']
+
+      def extrair_agendamentos():
+          return dados_replay['agendamentos']
+
+      def montar_agendamentos_completos(dados):
+          return dados_replay['agendamentos_historico'] if incremental else dados
+
+      def extrair_leads():
+          return dados_replay['leads'] if dados_replay['leads'] is not None else pd.DataFrame()
+
+      def extrair_contratos():
+          return dados_replay['contratos']
+  else:
+      incremental = not full_refresh and historico.possui_watermark()
+      # No dry-run os horários vêm direto da Pacto, sem ler nem gravar o cache local
+      if dry_run:
+          gravador = snapshot.GravadorSnapshot(lambda matriculas: extract.get_horarios_matriculas(matriculas, usar_cache=False))
+      else:
+          gravador = snapshot.GravadorSnapshot(extract.get_horarios_matriculas)
+      pasta_snapshot = gravador.pasta
+      busca_horas = gravador.busca_horas
+
+      # Aqui eu crio uma variável que extrai e filtra os dados no extract.py
+      # No modo incremental só vem o que é novo desde a última execução
+      def extrair_agendamentos():
+          return extract.getAgendamentosFiltrados(historico if incremental else None)
+
+      # O relatório final usa o histórico completo, remontado do estado local (com os novos por cima)
+      # sem chamar a API de novo
+      def montar_agendamentos_completos(dados):
+          return historico.listar(pendentes=dados) if incremental else dados
+
+      # Extract: Lê bruto da planilha, só as colunas usadas e só as linhas novas (o resto vem do estado local)
+      # No dry-run a planilha é lida inteira, sem avançar o estado local dos leads
+      def extrair_leads():
+          print("\n--- MARKETING (Leads) ---")
+          if dry_run:
+              return extract.get_leads(sessao, colunas=transform.COLUNAS_LEADS)
+          historico_leads = HistoricoLeads()
+          try:
+              return extract.get_leads(sessao, colunas=transform.COLUNAS_LEADS, historico=historico_leads, incremental=not full_refresh)
+          finally:
+              historico_leads.fechar()
+
+      extrair_contratos = extract.get_todos_contratos_ativos
+
+  # Completo o ETL carregando os dados no banco de dados (planilha Google ou armazém local)
+  # O envio para o Google só acontece no destino.finalizar() do final; o watermark só avança
+  # se ele der certo, senão os mesmos dados voltam na próxima execução
+  def gravar(df, nome_da_aba, modo="delta"):
+      if df.empty:
+          return False
+      if dry_run:
+          pasta = pasta_snapshot / "dry_run"
+          pasta.mkdir(parents=True, exist_ok=True)
+          df.to_parquet(pasta / f"{nome_da_aba}.parquet", index=False)
+          print(f"   [dry-run] {len(df)} linhas da aba '{nome_da_aba}' gravadas em {pasta}")
+          return True
+      return destino.gravar(df, nome_da_aba, modo=modo)
+
+  def carregar_historico(dados, df_novos):
+      # Se só tem agendamento novo, basta anexar no fim da aba; se algum atualiza uma
+      # linha que já está lá (mesma matrícula e treino), o delta corrige só essas linhas
+      modo = "anexar" if historico and incremental and historico.contar_atualizacoes(dados) == 0 else "delta"
+      return gravar(df_novos, "HISTORICO", modo=modo)
+
+  def montar_historico_completo(agendamentos_completos, df_novos):
+      return transform.getAgendamentosLimpos(agendamentos_completos) if incremental else df_novos
 
   # SALVAMENTO DO CLONE LITERAL: Movido para antes da transformação
-  if not df_mkt_bruto.empty:
-      load.save_in_database(df_mkt_bruto, nome_da_aba="MKT_CLONE")
-    
-  # Transform: Limpa regex, filtra mês e vendedora
-  df_mkt = transform.process_leads_marketing(df_mkt_bruto)
-
-  if not df_mkt.empty:
-      df_mkt_com_vendas = transform.validar_vendas_com_lista(df_mkt, contratos_brutos, busca_hora=extract.get_horario_matricula)
-      load.save_in_database(df_mkt_com_vendas, nome_da_aba="VENDAS_MKT")
+  # A cópia é feita direto no Google, a aba inteira não passa pelo pipeline
+  def clonar_leads(df_mkt_bruto):
+      if not df_mkt_bruto.empty and not dry_run and destino.exporta_sheets:
+          return load.clone_in_database(config.GOOGLE_SHEETS_MKT, "Diária", nome_da_aba="MKT_CLONE", sessao=sessao)
+      return False
+
+  def validar_vendas(df_mkt, contratos_ativos):
+      if df_mkt.empty:
+          print("   Aviso: Nenhum lead encontrado na planilha para este mês.")
+          return df_mkt
+      df_mkt_com_vendas = transform.validar_vendas_com_lista(df_mkt, contratos_ativos, busca_horas=busca_horas)
       print(f"   Sucesso! {len(df_mkt)} leads processados e limpos.")
       print(df_mkt)
-  else:
-      print("   Aviso: Nenhum lead encontrado na planilha para este mês.")
+      return df_mkt_com_vendas
 
+  def carregar_vendas(df_mkt_com_vendas):
+      return gravar(df_mkt_com_vendas, "VENDAS_MKT")
 
   # CRUZAMENTO
   # Aqui usamos a função consolidar_dados que criamos no transform.py
-  print("\n--- CONSOLIDAÇÃO ---")
-  
-  if not df_filtrado.empty:
+  def consolidar(df_filtrado, df_mkt_com_vendas, contratos_ativos):
+      print("\n--- CONSOLIDAÇÃO ---")
+      if df_filtrado.empty:
+          print("   Sem dados da Pacto para gerar relatório.")
+          return df_filtrado
       # Cruza Pacto (df_filtrado) com Marketing (df_mkt)
-      df_final = transform.consolidar_dados(df_filtrado, df_mkt_com_vendas, contratos_brutos, busca_hora=extract.get_horario_matricula)
+      df_final = transform.consolidar_dados(df_filtrado, df_mkt_com_vendas, contratos_ativos, busca_horas=busca_horas)
       print(df_final)
-      # Salva o relatório final
-      load.save_in_database(df_final, nome_da_aba="RELATORIO_FINAL")
+      return df_final
+
+  # Salva o relatório final
+  def carregar_relatorio(df_final):
+      return gravar(df_final, "RELATORIO_FINAL")
+
+  etapas = [
+      Etapa("agendamentos", extrair_agendamentos),
+      # Passo os 'dados' por parâmetro e executo a função para tratar os dados
+      Etapa("df_novos", transform.getAgendamentosLimpos, ["agendamentos"]),
+      Etapa("carga_historico", carregar_historico, ["agendamentos", "df_novos"]),
+      Etapa("agendamentos_completos", montar_agendamentos_completos, ["agendamentos"]),
+      Etapa("df_filtrado", montar_historico_completo, ["agendamentos_completos", "df_novos"]),
+      Etapa("leads", extrair_leads),
+      Etapa("contratos", extrair_contratos),
+      Etapa("clone_leads", clonar_leads, ["leads"]),
+      # Transform: Limpa regex, filtra mês e vendedora
+      Etapa("df_mkt", transform.process_leads_marketing, ["leads"]),
+      Etapa("vendas_mkt", validar_vendas, ["df_mkt", "contratos"]),
+      Etapa("carga_vendas", carregar_vendas, ["vendas_mkt"]),
+      Etapa("relatorio", consolidar, ["df_filtrado", "vendas_mkt", "contratos"]),
+      Etapa("carga_relatorio", carregar_relatorio, ["relatorio"]),
+  ]
+  # No perfil as etapas rodam uma de cada vez, senão os tempos e a memória de uma
+  # se misturam com os das outras
+  perfil = PerfilEtapas() if profile else None
+  if perfil:
+      resultados, falhas = executar_etapas(etapas, max_workers=1, envolver=perfil.envolver)
   else:
-      print("   Sem dados da Pacto para gerar relatório.")
+      resultados, falhas = executar_etapas(etapas)
+  if falhas:
+      print(f"\nEtapas que não terminaram: {', '.join(falhas)}")
+  # Nenhuma etapa chama mais a Pacto daqui para frente
+  pacto.fechar()
+
+  if not replay:
+      # Guarda os dados brutos desta execução para poder refazer o transform com --replay
+      try:
+          pasta = gravador.salvar(
+              agendamentos=resultados.get("agendamentos"),
+              agendamentos_historico=resultados.get("agendamentos_completos") if incremental else None,
+              contratos=resultados.get("contratos"),
+              leads=resultados.get("leads"),
+          )
+          print(f"Snapshot dos dados brutos gravado em {pasta}")
+      except Exception as e:
+          print(f"Aviso: não foi possível gravar o snapshot: {e}")
+
+  # Envia de uma vez tudo o que foi preparado para as abas
+  with metricas.medir("envio_planilhas"):
+      enviado = False
+      if destino:
+          enviar = perfil.envolver("envio_planilhas", destino.finalizar) if perfil else destino.finalizar
+          enviado = enviar()
+          destino.fechar()
+  if enviado and historico and resultados.get("carga_historico"):
+      historico.registrar(resultados["agendamentos"], substituir=not incremental)
+  if historico:
+      historico.fechar()
+
+  if perfil:
+      print(f"\nResumo do perfil gravado em {perfil.salvar_resumo()}")
+
+  # Relatório de tempos, linhas, HTTP e cache da execução (JSON + textfile do Prometheus)
+  print("\n--- MÉTRICAS ---")
+  print(metricas.resumo())
+  try:
+      print(f"Relatório de métricas gravado em {metricas.exportar()}")
+  except Exception as e:
+      print(f"Aviso: não foi possível gravar as métricas: {e}")
 
 if __name__ == "__main__":
-  run()
\ No newline at end of file
+  parser = argparse.ArgumentParser(description="Pipeline ETL da TP Academia")
+  parser.add_argument("--full-refresh", action="store_true",
+                      help="ignora o watermark local e baixa o histórico completo de agendamentos")
+  parser.add_argument("--replay", metavar="SNAPSHOT",
+                      help="refaz transform e load a partir de um snapshot gravado (pasta, nome ou 'ultimo'), sem chamar as APIs e sem gravar nada (implica --dry-run)")
+  parser.add_argument("--dry-run", action="store_true",
+                      help="não grava no Google Sheets nem no estado local; as tabelas finais vão para a pasta do snapshot")
+  parser.add_argument("--profile", action="store_true",
+                      help="perfila CPU e memória de cada etapa (roda as etapas uma de cada vez)")
+  args = parser.parse_args()
+  run(full_refresh=args.full_refresh, replay=args.replay, dry_run=args.dry_run, profile=args.profile)
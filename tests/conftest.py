@@ -0,0 +1,48 @@
+import pytest
+
+from data__pipeline import config
+from data__pipeline import metricas
+from data__pipeline import pacto
+
+from benchmarks.servidor_pacto import ServidorPacto
+from benchmarks.planilha_falsa import ClienteFalso
+
+# Os testes usam os mesmos dublês do benchmark: a Pacto é o servidor_pacto (HTTP local, sem
+# latência) e o Google Sheets é a planilha_falsa (em memória). Nada sai para a rede.
+
+@pytest.fixture(autouse=True)
+def configuracao(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "EMPRESA_IDS", [None])
+    monkeypatch.setattr(config, "PROFESSOR_IDS", [1])
+    monkeypatch.setattr(config, "AGENDAMENTOS_INCLUIR_FALTAS", False)
+    # Sem limite de taxa e sem novas tentativas: uma página que falha falha de vez, sem esperar
+    monkeypatch.setattr(config, "PACTO_TAXA_MAXIMA", 0)
+    monkeypatch.setattr(config, "PACTO_TENTATIVAS", 1)
+    monkeypatch.setattr(config, "CACHE_DB_PATH", tmp_path / "cache.sqlite3")
+    monkeypatch.setattr(config, "ESTADO_DB_PATH", tmp_path / "estado.sqlite3")
+    monkeypatch.setattr(config, "ARMAZEM_DB_PATH", tmp_path / "armazem.sqlite3")
+    metricas.reiniciar()
+    pacto.fechar()
+    yield
+    pacto.fechar()
+
+# Sobe um servidor falso da Pacto com os 'dados' (DadosSinteticos ou parecido) e aponta o
+# cliente compartilhado para ele; os servidores são parados no fim do teste
+@pytest.fixture
+def servidor_pacto(monkeypatch):
+    servidores = []
+
+    def iniciar(dados):
+        servidor = ServidorPacto(dados, latencia=0).iniciar()
+        servidores.append(servidor)
+        monkeypatch.setattr(config, "URL_BASE", servidor.url)
+        pacto.fechar()
+        return servidor
+
+    yield iniciar
+    for servidor in servidores:
+        servidor.parar()
+
+@pytest.fixture
+def cliente_sheets():
+    return ClienteFalso(latencia=0)
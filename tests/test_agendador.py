@@ -0,0 +1,54 @@
+import threading
+
+import pytest
+
+from data__pipeline.agendador import Etapa, executar_etapas
+
+def _falhar():
+    raise RuntimeError("Pacto fora do ar")
+
+# Pacto falha: as etapas que dependem dela (direta ou indiretamente) são canceladas, e o
+# ramo da planilha de marketing, que não depende, roda até o fim
+def test_falha_cancela_so_as_dependentes():
+    etapas = [
+        Etapa("pacto", _falhar),
+        Etapa("historico", lambda agendamentos: len(agendamentos), entradas=["pacto"]),
+        Etapa("carga_historico", lambda historico: historico, entradas=["historico"]),
+        Etapa("leads", lambda: ["ANA", "JOAO"]),
+        Etapa("vendas", lambda leads: len(leads), entradas=["leads"]),
+    ]
+    resultados, falhas = executar_etapas(etapas, max_workers=2)
+
+    assert resultados == {"leads": ["ANA", "JOAO"], "vendas": 2}
+    assert set(falhas) == {"pacto", "historico", "carga_historico"}
+    assert isinstance(falhas["pacto"], RuntimeError)
+    assert falhas["historico"] == "cancelada (depende de 'pacto')"
+    assert falhas["carga_historico"] == "cancelada (depende de 'historico')"
+
+# Cada etapa recebe os resultados das entradas na ordem de 'entradas'
+def test_entradas_chegam_na_ordem():
+    etapas = [
+        Etapa("a", lambda: "a"),
+        Etapa("b", lambda: "b"),
+        Etapa("ab", lambda primeira, segunda: primeira + segunda, entradas=["b", "a"]),
+    ]
+    resultados, falhas = executar_etapas(etapas, max_workers=2)
+    assert resultados["ab"] == "ba"
+    assert falhas == {}
+
+# Etapas independentes rodam ao mesmo tempo: cada uma só termina quando a outra já começou
+def test_etapas_independentes_rodam_juntas():
+    comecaram = threading.Barrier(2, timeout=5)
+    etapas = [Etapa("pacto", comecaram.wait), Etapa("marketing", comecaram.wait)]
+    resultados, falhas = executar_etapas(etapas, max_workers=2)
+    assert set(resultados) == {"pacto", "marketing"}
+    assert falhas == {}
+
+@pytest.mark.parametrize("etapas, mensagem", [
+    ([Etapa("a", lambda b: b, entradas=["b"])], "depende de 'b', que não existe"),
+    ([Etapa("a", lambda b: b, entradas=["b"]), Etapa("b", lambda a: a, entradas=["a"])], "Ciclo"),
+    ([Etapa("a", lambda: 1), Etapa("a", lambda: 2)], "Etapa repetida"),
+])
+def test_grafo_invalido_nao_roda(etapas, mensagem):
+    with pytest.raises(ValueError, match=mensagem):
+        executar_etapas(etapas, max_workers=2)
@@ -0,0 +1,107 @@
+import pandas as pd
+import pytest
+
+from data__pipeline import config
+from data__pipeline import load
+from data__pipeline.armazem import ArmazemSQLite
+from data__pipeline.sheets import SessaoGoogleSheets
+
+from benchmarks.planilha_falsa import PlanilhaFalsa
+
+CHAVE_BANCO = "banco-teste"
+CHAVES = ["MATRICULA", "TIPO DE TREINO"]
+COLUNAS = ["MATRICULA", "TIPO DE TREINO", "NOME"]
+
+@pytest.fixture
+def armazem(tmp_path):
+    armazem = ArmazemSQLite(caminho=tmp_path / "armazem.sqlite3")
+    yield armazem
+    armazem.fechar()
+
+@pytest.fixture
+def sessao(monkeypatch, cliente_sheets):
+    cliente_sheets.criar_planilha(CHAVE_BANCO)
+    monkeypatch.setattr(config, "TP_ACADEMIA_DB_ID", CHAVE_BANCO)
+    return SessaoGoogleSheets(cliente=cliente_sheets)
+
+def _df(linhas):
+    return pd.DataFrame(linhas, columns=COLUNAS)
+
+def _aba(cliente, titulo="HISTORICO"):
+    return cliente.planilhas[CHAVE_BANCO].abas[titulo].get_all_values()
+
+def test_upsert_devolve_so_o_que_mudou(armazem):
+    mudancas, qtd_novas, qtd_alteradas = armazem.gravar("HISTORICO", _df([
+        ["1", "Aula Experimental", "ANA"],
+        ["2", "Aula Experimental", "JOAO"],
+        ["3", "Aula Experimental", "MARIA"],
+    ]), CHAVES)
+    assert (qtd_novas, qtd_alteradas) == (3, 0)
+    assert mudancas['_linha'].tolist() == [2, 3, 4]
+
+    # Uma alterada, uma igual e uma nova: a alterada fica na mesma linha, a nova vai para o fim
+    mudancas, qtd_novas, qtd_alteradas = armazem.gravar("HISTORICO", _df([
+        ["2", "Aula Experimental", "JOAO PEDRO"],
+        ["3", "Aula Experimental", "MARIA"],
+        ["4", "Aula Experimental", "LUIZA"],
+    ]), CHAVES)
+    assert (qtd_novas, qtd_alteradas) == (1, 1)
+    assert mudancas[['_linha', 'NOME']].values.tolist() == [[3, "JOAO PEDRO"], [5, "LUIZA"]]
+    assert armazem.ler("HISTORICO")['NOME'].tolist() == ["ANA", "JOAO PEDRO", "MARIA", "LUIZA"]
+
+    # Gravar de novo o mesmo conteúdo não muda nada
+    mudancas, qtd_novas, qtd_alteradas = armazem.gravar("HISTORICO", _df([["2", "Aula Experimental", "JOAO PEDRO"]]), CHAVES)
+    assert (len(mudancas), qtd_novas, qtd_alteradas) == (0, 0, 0)
+
+def test_substituir_troca_a_aba_inteira(armazem):
+    armazem.substituir("MKT_CLONE", pd.DataFrame({"Nomes": ["ANA", "JOAO"]}))
+    armazem.substituir("MKT_CLONE", pd.DataFrame({"Nomes": ["MARIA"], "Origem": ["Site"]}))
+    assert armazem.ler("MKT_CLONE").to_dict('records') == [{"Nomes": "MARIA", "Origem": "Site"}]
+
+# Primeira exportação para uma aba que já tinha dados no Google: o histórico entra no armazém
+# antes, e a aba recebe só a linha nova no fim
+def test_primeira_gravacao_traz_o_historico_da_aba(armazem, sessao, cliente_sheets):
+    cliente_sheets.planilhas[CHAVE_BANCO].criar_aba("HISTORICO", [COLUNAS, ["1", "Aula Experimental", "ANA"]])
+    destino = load.DestinoArmazem(armazem, sessao)
+
+    assert destino.gravar(_df([["2", "Aula Experimental", "JOAO"]]), "HISTORICO")
+    assert destino.finalizar()
+    assert _aba(cliente_sheets) == [COLUNAS, ["1", "Aula Experimental", "ANA"], ["2", "Aula Experimental", "JOAO"]]
+    assert armazem.exportada("HISTORICO")
+
+# O armazém é a fonte da verdade: se o envio ao Google falha, os dados ficam no armazém, a aba
+# fica marcada como não exportada e a exportação seguinte regrava a aba inteira
+def test_envio_que_falha_deixa_a_aba_para_regravar(armazem, sessao, cliente_sheets, monkeypatch):
+    destino = load.DestinoArmazem(armazem, sessao)
+    assert destino.gravar(_df([["1", "Aula Experimental", "ANA"]]), "HISTORICO")
+    assert destino.finalizar()
+
+    values_batch_update = PlanilhaFalsa.values_batch_update
+    def falhar(planilha, corpo):
+        raise RuntimeError("falha no Google")
+    monkeypatch.setattr(PlanilhaFalsa, "values_batch_update", falhar)
+    assert destino.gravar(_df([["2", "Aula Experimental", "JOAO"]]), "HISTORICO")
+    assert destino.finalizar()
+    assert not armazem.exportada("HISTORICO")
+    assert armazem.ler("HISTORICO")['NOME'].tolist() == ["ANA", "JOAO"]
+    assert _aba(cliente_sheets) == [COLUNAS, ["1", "Aula Experimental", "ANA"]]
+
+    monkeypatch.setattr(PlanilhaFalsa, "values_batch_update", values_batch_update)
+    assert destino.gravar(_df([["3", "Aula Experimental", "MARIA"]]), "HISTORICO")
+    assert destino.finalizar()
+    assert armazem.exportada("HISTORICO")
+    assert _aba(cliente_sheets) == [
+        COLUNAS,
+        ["1", "Aula Experimental", "ANA"],
+        ["2", "Aula Experimental", "JOAO"],
+        ["3", "Aula Experimental", "MARIA"],
+    ]
+
+# Sem conseguir ler a aba do Google, nada é gravado: exportar só o armazém apagaria o histórico
+def test_falha_ao_trazer_a_aba_nao_grava(armazem, sessao, cliente_sheets):
+    cliente_sheets.planilhas[CHAVE_BANCO].criar_aba("HISTORICO", [["NOME", "NOME"], ["ANA", "ANA"]])
+    destino = load.DestinoArmazem(armazem, sessao)
+
+    assert not destino.gravar(_df([["2", "Aula Experimental", "JOAO"]]), "HISTORICO")
+    assert armazem.colunas("HISTORICO") == []
+    assert not sessao.pendente()
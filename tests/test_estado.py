@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+
+from data__pipeline.estado import HistoricoAgendamentos
+
+@pytest.fixture
+def historico(tmp_path):
+    historico = HistoricoAgendamentos(caminho=tmp_path / "estado.sqlite3")
+    yield historico
+    historico.fechar()
+
+def _agendamento(matricula, inicio, unidade=None, evento="Aula Experimental", status=None):
+    agendamento = {'matricula': matricula, 'evento': evento, 'inicio': inicio, 'nomeAluno': f"ALUNO {matricula}"}
+    if unidade is not None:
+        agendamento['unidade'] = unidade
+    if status is not None:
+        agendamento['status'] = status
+    return agendamento
+
+# O watermark é o maior 'inicio' de cada unidade e nunca volta para trás
+def test_watermark_por_unidade_so_avanca(historico):
+    assert historico.watermark() is None
+    assert not historico.possui_watermark()
+
+    historico.registrar([_agendamento(1, "2026-03-10T09:00:00", unidade=1), _agendamento(2, "2026-03-12T09:00:00", unidade=2)])
+    historico.registrar([_agendamento(3, "2026-03-05T09:00:00", unidade=1)])
+
+    assert historico.possui_watermark()
+    assert historico.watermark(1) == pd.Timestamp("2026-03-10T09:00:00")
+    assert historico.watermark(2) == pd.Timestamp("2026-03-12T09:00:00")
+
+def test_full_refresh_descarta_o_estado(historico):
+    historico.registrar([_agendamento(1, "2026-03-10T09:00:00")])
+    historico.registrar([_agendamento(2, "2026-03-01T09:00:00")], substituir=True)
+    assert historico.watermark() == pd.Timestamp("2026-03-01T09:00:00")
+    assert [a['matricula'] for a in historico.listar()] == ["2"]
+
+# Só passa o que não foi processado: chave nova ou 'inicio' mais recente, e uma falta nunca
+# substitui um treino executado
+def test_filtrar_novos(historico):
+    historico.registrar([_agendamento(1, "2026-03-10T09:00:00", status="EXECUTOU")])
+    recebidos = [
+        _agendamento(1, "2026-03-10T09:00:00", status="EXECUTOU"),
+        _agendamento(1, "2026-03-11T09:00:00", status="FALTOU"),
+        _agendamento(2, "2026-03-11T09:00:00", status="FALTOU"),
+    ]
+    assert historico.filtrar_novos(recebidos) == [recebidos[2]]
+    assert historico.contar_atualizacoes(recebidos) == 2
@@ -0,0 +1,64 @@
+import pytest
+
+from data__pipeline import extract
+from data__pipeline.estado import HistoricoAgendamentos
+
+from benchmarks.dados_sinteticos import DadosSinteticos
+
+CAMINHO_EXECUTADOS = "/psec/treino-bi/agendamento-executaram"
+
+# Os 750 agendamentos mais antigos de uma escala de 1000 (a primeira execução) e a escala
+# inteira (a execução seguinte, com 250 agendamentos novos)
+@pytest.fixture
+def dados():
+    todos = DadosSinteticos(1000)
+    todos.agendamentos.sort(key=lambda a: a['inicio'])
+    antigos = DadosSinteticos(1000)
+    antigos.agendamentos = todos.agendamentos[:750]
+    return antigos, todos
+
+def _chaves(agendamentos):
+    return sorted((a['matricula'], a['evento'], a['inicio']) for a in agendamentos)
+
+def test_coleta_completa_sem_falha(servidor_pacto, dados):
+    antigos, _ = dados
+    servidor_pacto(antigos)
+    agendamentos = extract.getAgendamentosFiltrados()
+    esperados = [a for a in antigos.agendamentos if a['evento'] in extract.EVENTOS_FILTRADOS]
+    assert _chaves(agendamentos) == _chaves(esperados)
+
+def test_pagina_com_falha_interrompe_a_coleta(servidor_pacto, dados):
+    antigos, _ = dados
+    servidor = servidor_pacto(antigos)
+    servidor.falhas = {CAMINHO_EXECUTADOS: {1}}
+    with pytest.raises(extract.ColetaIncompleta):
+        extract.getAgendamentosFiltrados()
+
+# A página que falha no meio da coleta incremental não pode virar um resultado parcial:
+# o watermark ficaria depois dela e os agendamentos dela nunca mais seriam buscados
+def test_falha_na_coleta_incremental_nao_perde_agendamentos(servidor_pacto, dados, tmp_path):
+    antigos, todos = dados
+    servidor_pacto(antigos)
+    primeira = extract.getAgendamentosFiltrados()
+
+    historico = HistoricoAgendamentos(caminho=tmp_path / "com_falha.sqlite3")
+    referencia = HistoricoAgendamentos(caminho=tmp_path / "sem_falha.sqlite3")
+    for estado in (historico, referencia):
+        estado.registrar(primeira, substituir=True)
+    watermark = historico.watermark()
+
+    servidor = servidor_pacto(todos)
+    servidor.falhas = {CAMINHO_EXECUTADOS: {1}}
+    with pytest.raises(extract.ColetaIncompleta):
+        extract.getAgendamentosFiltrados(historico)
+    assert historico.watermark() == watermark
+
+    # Na execução seguinte, sem falha, vem tudo o que uma coleta sem falha traria
+    servidor.falhas = {}
+    depois_da_falha = extract.getAgendamentosFiltrados(historico)
+    sem_falha = extract.getAgendamentosFiltrados(referencia)
+    assert len(sem_falha) > 100
+    assert _chaves(depois_da_falha) == _chaves(sem_falha)
+
+    historico.fechar()
+    referencia.fechar()
@@ -0,0 +1,95 @@
+import pandas as pd
+import pytest
+
+from data__pipeline import config
+from data__pipeline import load
+from data__pipeline.sheets import SessaoGoogleSheets
+
+from benchmarks.planilha_falsa import PlanilhaFalsa
+
+CHAVE_BANCO = "banco-teste"
+
+COLUNAS = ["MATRICULA", "TIPO DE TREINO", "NOME", "DATA"]
+HISTORICO = [
+    COLUNAS,
+    ["1", "Aula Experimental", "ANA SILVA", "01/03/2026"],
+    ["2", "Aula Experimental", "JOAO SOUZA", "02/03/2026"],
+    ["3", "Primeiro Treino sem A.E", "MARIA LIMA", "03/03/2026"],
+]
+
+@pytest.fixture
+def sessao(monkeypatch, cliente_sheets):
+    cliente_sheets.criar_planilha(CHAVE_BANCO).criar_aba("HISTORICO", HISTORICO)
+    monkeypatch.setattr(config, "TP_ACADEMIA_DB_ID", CHAVE_BANCO)
+    return SessaoGoogleSheets(cliente=cliente_sheets)
+
+# Intervalos gravados em cada values_batch_update, para conferir que o delta não regrava a aba
+@pytest.fixture
+def intervalos_gravados(monkeypatch):
+    gravados = []
+    values_batch_update = PlanilhaFalsa.values_batch_update
+    def registrar(planilha, corpo):
+        gravados.extend(dados['range'] for dados in corpo['data'])
+        return values_batch_update(planilha, corpo)
+    monkeypatch.setattr(PlanilhaFalsa, "values_batch_update", registrar)
+    return gravados
+
+def _df(linhas):
+    return pd.DataFrame(linhas, columns=COLUNAS)
+
+def test_calcular_delta_separa_novas_alteradas_e_iguais():
+    df = _df([
+        ["1", "Aula Experimental", "ANA SILVA", "01/03/2026"],
+        ["2", "Aula Experimental", "JOAO SOUZA", "09/03/2026"],
+        ["4", "Aula Experimental", "PEDRO ROCHA", "04/03/2026"],
+        ["5", "Aula Experimental", "LUIZA MOTA", "05/03/2026"],
+    ])
+    atualizacoes, qtd_novas, qtd_alteradas, ultima_linha = load._calcular_delta(HISTORICO, df, ["MATRICULA", "TIPO DE TREINO"])
+
+    assert (qtd_novas, qtd_alteradas, ultima_linha) == (2, 1, 6)
+    assert atualizacoes == [
+        {'range': "A3:D3", 'values': [["2", "Aula Experimental", "JOAO SOUZA", "09/03/2026"]]},
+        {'range': "A5:D6", 'values': [
+            ["4", "Aula Experimental", "PEDRO ROCHA", "04/03/2026"],
+            ["5", "Aula Experimental", "LUIZA MOTA", "05/03/2026"],
+        ]},
+    ]
+
+# Chave repetida no df fica com a última linha, como no drop_duplicates do modo completo
+def test_calcular_delta_com_chave_repetida_usa_a_ultima():
+    df = _df([
+        ["1", "Aula Experimental", "ANA SILVA", "07/03/2026"],
+        ["1", "Aula Experimental", "ANA SILVA", "08/03/2026"],
+    ])
+    atualizacoes, qtd_novas, qtd_alteradas, _ = load._calcular_delta(HISTORICO, df, ["MATRICULA", "TIPO DE TREINO"])
+    assert (qtd_novas, qtd_alteradas) == (0, 1)
+    assert atualizacoes == [{'range': "A2:D2", 'values': [["1", "Aula Experimental", "ANA SILVA", "08/03/2026"]]}]
+
+def test_save_delta_grava_so_as_linhas_novas_e_alteradas(sessao, cliente_sheets, intervalos_gravados):
+    df = _df([
+        ["3", "Primeiro Treino sem A.E", "MARIA LIMA", "10/03/2026"],
+        ["4", "Aula Experimental", "PEDRO ROCHA", "04/03/2026"],
+    ])
+    assert load.save_in_database(df, "HISTORICO", modo="delta", sessao=sessao)
+    assert sessao.enviar()
+
+    assert intervalos_gravados == ["'HISTORICO'!A4:D4", "'HISTORICO'!A5:D5"]
+    assert cliente_sheets.planilhas[CHAVE_BANCO].abas["HISTORICO"].get_all_values() == HISTORICO[:3] + [
+        ["3", "Primeiro Treino sem A.E", "MARIA LIMA", "10/03/2026"],
+        ["4", "Aula Experimental", "PEDRO ROCHA", "04/03/2026"],
+    ]
+
+def test_save_delta_sem_mudancas_nao_escreve(sessao, intervalos_gravados):
+    assert load.save_in_database(_df(HISTORICO[1:]), "HISTORICO", modo="delta", sessao=sessao)
+    assert sessao.enviar()
+    assert intervalos_gravados == []
+
+# Colunas diferentes das da aba: não dá para gravar linha a linha, a aba é regravada inteira
+def test_save_delta_com_colunas_novas_regrava_a_aba(sessao, cliente_sheets):
+    df = pd.DataFrame([["4", "Aula Experimental", "PEDRO ROCHA", "04/03/2026", "Instagram"]], columns=COLUNAS + ["ORIGEM"])
+    assert load.save_in_database(df, "HISTORICO", modo="delta", sessao=sessao)
+    assert sessao.enviar()
+
+    valores = cliente_sheets.planilhas[CHAVE_BANCO].abas["HISTORICO"].get_all_values()
+    assert valores[0] == COLUNAS + ["ORIGEM"]
+    assert valores[1:] == [linha + [""] for linha in HISTORICO[1:]] + [["4", "Aula Experimental", "PEDRO ROCHA", "04/03/2026", "Instagram"]]
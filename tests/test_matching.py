@@ -0,0 +1,49 @@
+import random
+
+import numpy as np
+
+from data__pipeline import matching
+
+from benchmarks.dados_sinteticos import DadosSinteticos, variacao_marketing
+
+def _nomes_e_leads(escala=2000, quantidade=400):
+    dados = DadosSinteticos(escala)
+    rnd = random.Random(7)
+    nomes = matching.normalizar_nomes([c['nome'] for c in dados.contratos])
+    leads = matching.normalizar_nomes([variacao_marketing(rnd, rnd.choice(dados.pessoas)) for _ in range(quantidade)])
+    return nomes, leads
+
+# O índice acha os mesmos scores que a varredura completa (em empate o nome pode ser outro)
+def test_melhores_com_indice_igual_a_varredura():
+    nomes, leads = _nomes_e_leads()
+    indice = matching.IndiceNomes(nomes, usar_blocos=True)
+
+    idx_indice, sc_indice = indice.melhores(leads)
+    idx_completo, sc_completo = matching.melhores_matches(leads, nomes)
+
+    assert (idx_completo >= 0).sum() > 100
+    assert ((idx_indice >= 0) == (idx_completo >= 0)).all()
+    assert np.allclose(sc_indice, sc_completo, atol=1e-3)
+    assert indice.medir_recall(leads)['recall'] == 1.0
+
+def test_melhores_k_com_indice_igual_a_varredura():
+    nomes, leads = _nomes_e_leads()
+    indice = matching.IndiceNomes(nomes, usar_blocos=True)
+
+    idx_indice, sc_indice = indice.melhores_k(leads, k=3)
+    idx_completo, sc_completo = matching.top_k_matches(leads, nomes, k=3)
+
+    assert ((idx_indice >= 0) == (idx_completo >= 0)).all()
+    assert np.allclose(sc_indice, sc_completo, atol=1e-3)
+
+# Tokens comuns demais não viram balde; quem só tem esses tokens cai na varredura completa
+def test_balde_de_token_comum_e_descartado():
+    nomes = [f"MARIA SILVA {chr(65 + i % 26)}{chr(65 + i // 26)}XX" for i in range(300)] + ["JOAO SOUZA"]
+    indice = matching.IndiceNomes(nomes, usar_blocos=True, balde_maximo=0.01)
+
+    assert "#MARIA" not in indice.baldes
+    assert "#JOAO" in indice.baldes
+
+    idx, scores = indice.melhores(["MARIA SILVA AAXX", "JOAO SOUSA"])
+    assert nomes[idx[0]] == "MARIA SILVA AAXX"
+    assert nomes[idx[1]] == "JOAO SOUZA"
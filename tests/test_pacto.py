@@ -0,0 +1,28 @@
+from data__pipeline import config
+from data__pipeline import pacto
+
+def _tamanho_pool(cliente):
+    return cliente.sessao.get_adapter("http://").poolmanager.connection_pool_kw['maxsize']
+
+# O pool padrão comporta as páginas de agendamentos, de contratos e as consultas de horário
+# que podem estar abertas ao mesmo tempo
+def test_pool_padrao_cobre_a_concorrencia(monkeypatch):
+    monkeypatch.setattr(config, "PACTO_POOL_CONEXOES", 0)
+    monkeypatch.setattr(config, "EMPRESA_IDS", [1, 2, 3, 4, 5])
+    monkeypatch.setattr(config, "PROFESSOR_IDS", [1, 2])
+    monkeypatch.setattr(config, "AGENDAMENTOS_INCLUIR_FALTAS", True)
+    monkeypatch.setattr(config, "PACTO_UNIDADES_EM_PARALELO", 4)
+    monkeypatch.setattr(config, "PACTO_PAGINAS_EM_VOO", 4)
+    monkeypatch.setattr(config, "PACTO_MAX_WORKERS", 8)
+
+    # 4 pares x 2 fontes x 4 páginas + 4 unidades x 8 páginas de contratos + 8 horários
+    assert pacto.conexoes_simultaneas() == 32 + 32 + 8
+    cliente = pacto.ClientePacto()
+    assert _tamanho_pool(cliente) == 72
+    cliente.fechar()
+
+def test_pool_configurado_tem_prioridade(monkeypatch):
+    monkeypatch.setattr(config, "PACTO_POOL_CONEXOES", 10)
+    cliente = pacto.ClientePacto()
+    assert _tamanho_pool(cliente) == 10
+    cliente.fechar()
@@ -0,0 +1,26 @@
+import time
+
+from data__pipeline.perfil import PerfilEtapas
+
+# Etapa que chega a ocupar uns 40 MB e devolve tudo antes de terminar
+def _etapa_com_pico():
+    blocos = [bytearray(1024 * 1024) for _ in range(40)]
+    time.sleep(0.3)
+    del blocos
+    return 'ok'
+
+def test_resumo_mostra_onde_estava_a_memoria_no_pico(tmp_path):
+    perfil = PerfilEtapas(pasta=tmp_path, intervalo_pico=0.02)
+    assert perfil.executar("etapa", _etapa_com_pico) == 'ok'
+
+    etapa = perfil.etapas[0]
+    assert etapa['pico_memoria'] > 35 * 1024 * 1024
+    assert etapa['memoria_retida'] < 1024 * 1024
+    maior = etapa['alocacoes_pico'][0]
+    assert maior.size_diff > 35 * 1024 * 1024
+    assert maior.traceback[0].filename == __file__
+
+    resumo = perfil.resumo()
+    assert "Memória no pico por linha" in resumo
+    assert (tmp_path / "etapa.pstats").exists()
+    perfil.salvar_resumo()
@@ -0,0 +1,57 @@
+import pytest
+
+from data__pipeline import config
+from data__pipeline import load
+from data__pipeline.sheets import SessaoGoogleSheets
+
+from benchmarks.planilha_falsa import PlanilhaFalsa
+
+CHAVE_BANCO = "banco-teste"
+CHAVE_MKT = "mkt-teste"
+
+DIARIA = [["Data", "Origem", "Nomes"], ["01/03/2026", "Instagram", "ANA SILVA"], ["02/03/2026", "Site", "JOAO SOUZA"]]
+
+@pytest.fixture
+def sessao(monkeypatch, cliente_sheets):
+    cliente_sheets.criar_planilha(CHAVE_BANCO)
+    cliente_sheets.criar_planilha(CHAVE_MKT).criar_aba("Diária", DIARIA)
+    monkeypatch.setattr(config, "TP_ACADEMIA_DB_ID", CHAVE_BANCO)
+    return SessaoGoogleSheets(cliente=cliente_sheets)
+
+def _abas(cliente, chave):
+    return sorted(cliente.planilhas[chave].abas)
+
+# A cópia só acontece no enviar(): uma execução que para antes não deixa aba temporária
+def test_clone_nao_copia_antes_do_envio(sessao, cliente_sheets):
+    assert load.clone_in_database(CHAVE_MKT, "Diária", sessao=sessao)
+    assert _abas(cliente_sheets, CHAVE_BANCO) == ["MKT_CLONE"]
+
+    assert sessao.enviar()
+    assert _abas(cliente_sheets, CHAVE_BANCO) == ["MKT_CLONE"]
+    assert cliente_sheets.planilhas[CHAVE_BANCO].abas["MKT_CLONE"].get_all_values() == DIARIA
+
+def test_clone_cola_so_os_valores(sessao, cliente_sheets, monkeypatch):
+    enviadas = []
+    batch_update = PlanilhaFalsa.batch_update
+    def registrar(planilha, corpo):
+        enviadas.extend(corpo['requests'])
+        return batch_update(planilha, corpo)
+    monkeypatch.setattr(PlanilhaFalsa, "batch_update", registrar)
+
+    load.clone_in_database(CHAVE_MKT, "Diária", sessao=sessao)
+    assert sessao.enviar()
+    colagens = [r['copyPaste'] for r in enviadas if 'copyPaste' in r]
+    assert [c['pasteType'] for c in colagens] == ['PASTE_VALUES']
+
+def test_aba_temporaria_e_apagada_quando_o_envio_falha(sessao, cliente_sheets, monkeypatch):
+    batch_update = PlanilhaFalsa.batch_update
+    def falhar_com_a_copia(planilha, corpo):
+        if any('copyPaste' in r for r in corpo['requests']):
+            raise RuntimeError("falha no Google")
+        return batch_update(planilha, corpo)
+    monkeypatch.setattr(PlanilhaFalsa, "batch_update", falhar_com_a_copia)
+
+    load.clone_in_database(CHAVE_MKT, "Diária", sessao=sessao)
+    assert not sessao.enviar()
+    assert _abas(cliente_sheets, CHAVE_BANCO) == ["MKT_CLONE"]
+    assert not sessao.pendente()
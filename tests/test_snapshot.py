@@ -0,0 +1,21 @@
+from data__pipeline import config
+from data__pipeline import snapshot
+
+# Os horários gravados respondem no replay pela mesma chave, venha a matrícula como int,
+# float (123.0, de coluna com NaN) ou texto, com ou sem unidade
+def test_horas_gravadas_voltam_no_replay(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "SNAPSHOTS_DIR", tmp_path / "snapshots")
+    respostas = {123.0: "2026-10-01T10:00:00Z", "2:45": "2026-10-02T11:00:00Z", 7: None}
+    gravador = snapshot.GravadorSnapshot(lambda matriculas: {m: respostas[m] for m in matriculas})
+
+    assert gravador.busca_horas([123.0, "2:45", 7]) == respostas
+    gravador.salvar()
+
+    busca_horas = snapshot.carregar_snapshot('ultimo')['busca_horas']
+    assert busca_horas([123, "123", "2:45", 7, 8]) == {
+        123: "2026-10-01T10:00:00Z",
+        "123": "2026-10-01T10:00:00Z",
+        "2:45": "2026-10-02T11:00:00Z",
+        7: None,
+        8: None,
+    }